@@ -1,3 +1,6 @@
 from .auth import router as auth_router
+from .health import router as health_router
+from .metrics import router as metrics_router
+from .profiling import router as profiling_router
 from .query import router as query_router
 from .upload import router as upload_router
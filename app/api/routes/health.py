@@ -0,0 +1,29 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.admission import get_admission_controller
+from app.core.model_registry import get_model_registry
+
+router = APIRouter()
+
+@router.get("/live")
+async def liveness():
+    return {"status": "ok"}
+
+@router.get("/ready")
+async def readiness():
+    """200 only after every model is loaded and warmed up"""
+    registry = get_model_registry()
+    if not registry.ready:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ready"}
+
+@router.get("/models")
+async def model_stats():
+    """Load time, warmup time and memory per loaded model"""
+    return get_model_registry().stats()
+
+@router.get("/admission")
+async def admission_stats():
+    """Queue depth, in-flight work and wait times per admission lane"""
+    return get_admission_controller().stats()
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core.metrics import render_latest
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def metrics():
+    """Prometheus exposition of stage histograms, LLM stream stats and gauges"""
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core.profiling import get_profiler
+
+router = APIRouter()
+
+def _session(profile_id: str):
+    get_profiler().expire()
+    session = get_profiler().sessions.get(profile_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    return session
+
+@router.post("/sample")
+async def sample_worker(
+    seconds: float = Query(10.0, gt=0, le=120),
+    interval_ms: float = Query(5.0, ge=1, le=100),
+    lag_threshold_ms: float = Query(50.0, ge=5),
+):
+    """
+    Sample every thread of this worker for `seconds` and report the hottest
+    frames plus every event-loop stall longer than `lag_threshold_ms`.
+    Download the flamegraph input from /admin/profile/{id}/collapsed.
+    """
+    try:
+        session = await get_profiler().sample(seconds, interval_ms / 1000, lag_threshold_ms / 1000)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return session.summary()
+
+@router.post("/requests", status_code=202)
+async def profile_requests(
+    route: str = Query(..., description="Request path, e.g. /query/stream"),
+    count: int = Query(10, ge=1, le=1000),
+    interval_ms: float = Query(5.0, ge=1, le=100),
+    lag_threshold_ms: float = Query(50.0, ge=5),
+    timeout_s: float = Query(300.0, gt=0, le=3600),
+):
+    """
+    Profile the next `count` requests to `route` on this worker. Samples are
+    only kept while at least one of them is in flight; poll /admin/profile/{id}.
+    `route` must equal the request path exactly. After `timeout_s` the
+    session ends with whatever it sampled, so a route that never gets
+    `count` requests does not block other profiles; cancel ends it sooner.
+    """
+    try:
+        session = get_profiler().arm(route, count, interval_ms / 1000, lag_threshold_ms / 1000, timeout_s)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return session.summary()
+
+@router.post("/{profile_id}/cancel")
+async def cancel_profile(profile_id: str):
+    """End an armed or running request profile now, keeping what it sampled"""
+    _session(profile_id)
+    try:
+        return get_profiler().cancel(profile_id).summary()
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("")
+async def list_profiles():
+    get_profiler().expire()
+    return [session.summary() for session in get_profiler().sessions.values()]
+
+@router.get("/{profile_id}")
+async def get_profile(profile_id: str):
+    return _session(profile_id).summary()
+
+@router.get("/{profile_id}/collapsed", response_class=PlainTextResponse)
+async def download_collapsed(profile_id: str):
+    """Collapsed stacks for flamegraph.pl, speedscope or inferno"""
+    session = _session(profile_id)
+    if session.status != "done":
+        raise HTTPException(status_code=409, detail=f"Profile {profile_id} is still {session.status}")
+    if session.sampler is None:
+        raise HTTPException(status_code=409, detail=f"Profile {profile_id} {session.ended} before any request")
+    return PlainTextResponse(
+        session.sampler.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.collapsed"'},
+    )
@@ -2,12 +2,14 @@ from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import JSONResponse, StreamingResponse
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 from app.api.routes.auth import get_current_user
+from app.core.admission import AdmissionRejected
 from app.dependencies.providers import get_embedding_provider
 from app.services.retrieval.retrieval_generation_service import \
     RetrievalGenerationService
+from app.services.retrieval.utils.pagination import InvalidCursor
 
 router = APIRouter()
 
@@ -15,6 +17,15 @@ class QueryRequest(BaseModel):
     message: str
     retrieve_only: bool = False
     limit: Optional[int] = 5
+    # Diversify the retrieved chunks; 1 keeps relevance order, lower favours variety
+    mmr_lambda: Optional[float] = Field(None, ge=0.0, le=1.0)
+    # Retrieve-only paging: `limit` results per page, continued by passing
+    # back the response's next_cursor
+    paginate: bool = False
+    cursor: Optional[str] = None
+    # Retrieve-only NDJSON stream of the whole ranking, or its first max_results matches
+    stream: bool = False
+    max_results: Optional[int] = Field(None, ge=1)
 
 async def get_rag_service() -> RetrievalGenerationService:
     embedding_provider = get_embedding_provider()
@@ -27,16 +38,42 @@ async def process_query(
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        if request.retrieve_only:
+        if request.retrieve_only and (request.paginate or request.cursor or request.stream):
+            if request.mmr_lambda is not None:
+                # Diversification reorders the ranking the cursor walks
+                raise HTTPException(status_code=400, detail="mmr_lambda cannot be used with paged results")
+            if request.stream:
+                lines = await rag_service.stream_documents(
+                    request.message, user_id=current_user["id"],
+                    cursor=request.cursor, max_results=request.max_results,
+                )
+                return StreamingResponse(lines, media_type="application/x-ndjson")
+            page = await rag_service.retrieve_page(
+                request.message, request.limit or 5, user_id=current_user["id"], cursor=request.cursor,
+            )
+            return JSONResponse(content=page)
+        elif request.retrieve_only:
             # Just retrieve documents
-            docs = await rag_service.retrieve_documents(request.message, request.limit)
+            docs = await rag_service.retrieve_documents(
+                request.message, request.limit, user_id=current_user["id"],
+                mmr_lambda=request.mmr_lambda,
+            )
             return JSONResponse(content={"documents": docs})
         else:
             # Full RAG pipeline with streaming response
-            generator = await rag_service.process_query(request.message)
+            generator = await rag_service.process_query(
+                request.message, user_id=current_user["id"], mmr_lambda=request.mmr_lambda
+            )
             return StreamingResponse(
                 generator,
                 media_type="text/event-stream"
             )
+    except AdmissionRejected:
+        # Handled by the app-level handler (fast 429/503 with Retry-After)
+        raise
+    except HTTPException:
+        raise
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -8,13 +8,14 @@ from uuid import UUID
 import requests
 from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
 from fastapi.responses import JSONResponse
-from langchain.docstore.document import Document as LangchainDocument
 from pydantic import BaseModel
-from pypdf import PdfReader
 
-from app.contracts.document import DocumentResponse
+from app.contracts.document import (BulkIngestRequest, BulkIngestResponse,
+                                    DocumentDeleteResponse, DocumentResponse)
 from app.dependencies.auth import get_current_user
 from app.dependencies.rag import get_document_service
+from app.services.indexing.bulk_ingestion import BulkIngestionService
+from app.models.documents import Document
 from app.services.indexing.document_service import DocumentService
 
 router = APIRouter()
@@ -38,12 +39,15 @@ async def upload_pdf_document(
     1. Frontend uploads document directly to database (creates document record)
     2. Frontend sends document_id + document_url to this endpoint  
     3. Backend downloads PDF, processes it (chunks + embeddings)
-    4. Backend stores chunks that reference the existing document_id
+    4. Backend stores chunks that reference the existing document_id,
+       replacing any from an earlier upload
     """
     
     # Validate file type
     if not document_url.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    # Uploading replaces the document's chunks, so only its owner may do it
+    await _owned_document(document_id, user, document_service)
     
     try:
         # Process existing document through RAG pipeline
@@ -63,3 +67,71 @@ async def upload_pdf_document(
         # Processing or database errors
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/upload-pdfs", response_model=BulkIngestResponse)
+async def upload_pdf_documents(
+    request: BulkIngestRequest,
+    user = Depends(get_current_user),
+    document_service: DocumentService = Depends(get_document_service)
+):
+    """
+    Process many existing PDF documents in one call
+    
+    Documents are downloaded and parsed concurrently and their chunks are
+    embedded together in full batches. A failing document does not stop the
+    others; check each entry's status and failed_stage in the response, or
+    the document's processing_status. Documents of other users fail at
+    "download" and are left untouched.
+    """
+    service = BulkIngestionService(document_service)
+    return await service.ingest(
+        request.documents,
+        user_id=user["id"],
+        chunk_size=request.chunk_size,
+        concurrency=request.concurrency,
+    )
+
+async def _owned_document(document_id: UUID, user, document_service: DocumentService) -> Document:
+    document = await document_service.db.get(Document, document_id)
+    if not document or str(document.user_id) != str(user["id"]):
+        raise HTTPException(status_code=404, detail=f"Document {document_id} not found")
+    return document
+
+@router.post("/documents/{document_id}/reprocess", response_model=DocumentResponse)
+async def reprocess_document(
+    document_id: UUID,
+    chunk_size: int = 1000,
+    user = Depends(get_current_user),
+    document_service: DocumentService = Depends(get_document_service)
+):
+    """
+    Re-run the pipeline on a document's stored PDF
+    
+    The new chunks replace the old ones once they are inserted, so searches
+    keep finding the document while it is reprocessed.
+    """
+    document = await _owned_document(document_id, user, document_service)
+    try:
+        return await document_service.process_pdf_complete(
+            document_url=document.storage_url,
+            document_id=document_id,
+            user_id=user["id"],
+            chunk_size=chunk_size,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/documents/{document_id}", response_model=DocumentDeleteResponse)
+async def delete_document_chunks(
+    document_id: UUID,
+    user = Depends(get_current_user),
+    document_service: DocumentService = Depends(get_document_service)
+):
+    """
+    Remove a document from search: its chunks and ingestion checkpoints are
+    deleted and the document row is marked "deleted"
+    """
+    await _owned_document(document_id, user, document_service)
+    deleted = await document_service.delete_document(document_id)
+    return DocumentDeleteResponse(document_id=document_id, deleted_chunks=deleted)
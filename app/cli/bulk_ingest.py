@@ -0,0 +1,68 @@
+"""
+Bulk-ingest PDFs whose document rows already exist.
+
+    python -m app.cli.bulk_ingest documents.json --user-id <uuid>
+
+documents.json is a list of {"document_id": ..., "document_url": ...}
+objects. Prints the per-document results and throughput summary as JSON and
+exits with status 1 if any document failed. With checkpoints enabled, running
+it again (or app.cli.resume_ingestion) skips the pages, chunking and
+embedding batches that finished before a failure or crash.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from uuid import UUID
+
+from app.contracts.document import BulkIngestRequest
+from app.core.embeddings import create_embedding_provider
+from app.core.storage import PostgresVectorStore
+from app.db.session import async_session
+from app.services.indexing.bulk_ingestion import BulkIngestionService
+from app.services.indexing.checkpoints import get_checkpoint_store
+from app.services.indexing.document_service import DocumentService
+
+
+async def run(request: BulkIngestRequest, user_id: UUID, batch_size: int):
+    embedding_provider = await asyncio.to_thread(create_embedding_provider)
+    async with async_session() as session:
+        document_service = DocumentService(
+            db=session,
+            embedding_provider=embedding_provider,
+            storage_provider=PostgresVectorStore(session),
+            checkpoint_store=get_checkpoint_store(),
+        )
+        service = BulkIngestionService(document_service, batch_size=batch_size)
+        return await service.ingest(
+            request.documents,
+            user_id=user_id,
+            chunk_size=request.chunk_size,
+            concurrency=request.concurrency,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("documents", help="JSON file with document_id/document_url pairs")
+    parser.add_argument("--user-id", type=UUID, required=True)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=4, help="Documents downloaded and parsed at once")
+    parser.add_argument("--batch-size", type=int, default=32, help="Chunks per embedding batch")
+    args = parser.parse_args()
+
+    with open(args.documents) as f:
+        request = BulkIngestRequest(
+            documents=json.load(f),
+            chunk_size=args.chunk_size,
+            concurrency=args.concurrency,
+        )
+
+    result = asyncio.run(run(request, args.user_id, args.batch_size))
+    print(result.model_dump_json(indent=2))
+    if result.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Fit (or refit) the reduced-dimension projection used by two-stage search.
+
+    python -m app.cli.fit_projection --dim 256                 # fit, save, backfill
+    python -m app.cli.fit_projection --backfill-only           # tag/reduce chunks with the saved projection
+    python -m app.cli.fit_projection --backfill-only --index   # ... then fix the dimension and build the HNSW index
+    python -m app.cli.fit_projection --report-only --report-dims 64 128 256 512
+
+Samples chunk embeddings from the database and fits a PCA projection (or
+truncation for Matryoshka models), saves it to search_projection_path and
+recomputes embedding_reduced for every chunk not yet reduced with it.
+Workers reload the file on their next search and only compare chunks
+tagged with its version, so until the backfill finishes the first stage
+covers the chunks done so far; an interrupted backfill resumes where it
+stopped. Set search_reduced_dim to enable two-stage search.
+
+embedding_reduced has no declared dimension, so the reduced first stage is
+a sequential scan until --index gives the column the projection's
+dimension and builds an HNSW index on it. Declaring the dimension rewrites
+the table under an exclusive lock, once per dimension change; the index is
+then built concurrently (partition by partition on a partitioned table).
+A refit to another dimension drops the index before the backfill. Every
+run reports whether the first stage is indexed.
+
+The report holds out part of the sample as queries and, for each dimension,
+measures recall@k of reduced search + full rescoring against exact full
+search, and the per-query latency of both over the in-memory sample.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from sqlalchemy import func, or_, select, text, update
+
+from app.config import get_settings
+from app.core.projection import Projection, default_method
+from app.db.session import async_session, get_engine
+from app.models.chunks import DocumentChunk
+
+REDUCED_INDEX = "ix_document_chunks_embedding_reduced"
+
+
+async def load_sample(limit: int) -> np.ndarray:
+    async with async_session() as session:
+        result = await session.execute(
+            select(DocumentChunk.embedding)
+            .where(DocumentChunk.embedding.isnot(None))
+            .order_by(func.random())
+            .limit(limit)
+        )
+        return np.asarray([row[0] for row in result], dtype=np.float32)
+
+
+async def backfill(projection: Projection, batch_size: int) -> int:
+    """Recompute embedding_reduced for every embedded chunk of another projection, in primary key order"""
+    updated = 0
+    last_id = None
+    async with async_session() as session:
+        while True:
+            query = (
+                select(DocumentChunk.id, DocumentChunk.embedding)
+                .where(DocumentChunk.embedding.isnot(None))
+                .where(or_(
+                    DocumentChunk.embedding_reduced_version.is_(None),
+                    DocumentChunk.embedding_reduced_version != projection.version,
+                ))
+                .order_by(DocumentChunk.id)
+                .limit(batch_size)
+            )
+            if last_id is not None:
+                query = query.where(DocumentChunk.id > last_id)
+            rows = (await session.execute(query)).all()
+            if not rows:
+                return updated
+            reduced = projection.transform(np.asarray([row.embedding for row in rows]))
+            await session.execute(
+                update(DocumentChunk),
+                [
+                    {"id": row.id, "embedding_reduced": vector.tolist(), "embedding_reduced_version": projection.version}
+                    for row, vector in zip(rows, reduced)
+                ],
+            )
+            await session.commit()
+            updated += len(rows)
+            last_id = rows[-1].id
+
+
+async def first_stage() -> Dict[str, Any]:
+    """The declared dimension of embedding_reduced and whether an HNSW index serves it"""
+    async with get_engine().connect() as conn:
+        typmod = (await conn.execute(text(
+            "SELECT atttypmod FROM pg_attribute "
+            "WHERE attrelid = 'document_chunks'::regclass AND attname = 'embedding_reduced'"
+        ))).scalar()
+        indexed = (await conn.execute(
+            text("SELECT 1 FROM pg_indexes WHERE tablename = 'document_chunks' AND indexname = :name"),
+            {"name": REDUCED_INDEX},
+        )).first() is not None
+    dim = typmod if typmod and typmod > 0 else None
+    return {"dim": dim, "indexed": indexed, "scan": "hnsw" if indexed else "sequential"}
+
+
+async def drop_dimension() -> None:
+    """Back to an undimensioned column, so a backfill can write another dimension"""
+    async with get_engine().begin() as conn:
+        await conn.execute(text(f"DROP INDEX IF EXISTS {REDUCED_INDEX}"))
+        # Dropping the type modifier is a catalog change; no rewrite
+        await conn.execute(text("ALTER TABLE document_chunks ALTER COLUMN embedding_reduced TYPE vector"))
+
+
+async def build_index(projection: Projection) -> None:
+    """Declare the projection's dimension on embedding_reduced and index it with HNSW"""
+    if (await first_stage())["dim"] != projection.dim:
+        async with get_engine().begin() as conn:
+            # Left over from workers that had not reloaded the projection yet
+            await conn.execute(
+                text(
+                    "UPDATE document_chunks SET embedding_reduced = NULL, embedding_reduced_version = NULL "
+                    "WHERE embedding_reduced IS NOT NULL AND embedding_reduced_version IS DISTINCT FROM :version"
+                ),
+                {"version": projection.version},
+            )
+            await conn.execute(text(
+                f"ALTER TABLE document_chunks ALTER COLUMN embedding_reduced TYPE vector({int(projection.dim)})"
+            ))
+    definition = "USING hnsw (embedding_reduced vector_cosine_ops)"
+    async with get_engine().connect() as conn:
+        # CREATE INDEX CONCURRENTLY refuses to run inside a transaction
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        partitions = [row.name for row in await conn.execute(text(
+            "SELECT relid::regclass::text AS name FROM pg_partition_tree('document_chunks'::regclass) "
+            "WHERE isleaf AND level > 0 ORDER BY 1"
+        ))]
+        if not partitions:
+            await conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {REDUCED_INDEX} ON document_chunks {definition}"))
+            return
+        # A partitioned table takes no concurrent index: build each partition's, then attach
+        await conn.execute(text(f"CREATE INDEX IF NOT EXISTS {REDUCED_INDEX} ON ONLY document_chunks {definition}"))
+        for partition in partitions:
+            local = f"{partition}_embedding_reduced"
+            await conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {local} ON {partition} {definition}"))
+            attached = (await conn.execute(
+                text("SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(:index AS regclass)"),
+                {"index": local},
+            )).first()
+            if not attached:
+                await conn.execute(text(f"ALTER INDEX {REDUCED_INDEX} ATTACH PARTITION {local}"))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def report(
+    sample: np.ndarray,
+    dims: List[int],
+    method: str,
+    k: int,
+    candidates: int,
+    queries: int,
+) -> List[Dict[str, float]]:
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(sample))
+    held_out, corpus = sample[order[:queries]], sample[order[queries:]]
+    corpus_n, held_out_n = _normalize(corpus), _normalize(held_out)
+
+    start = time.perf_counter()
+    exact = [np.argsort(-(corpus_n @ q))[:k] for q in held_out_n]
+    full_ms = (time.perf_counter() - start) / len(held_out) * 1000
+
+    rows = [{"dim": corpus.shape[1], "recall_at_k": 1.0, "query_ms": round(full_ms, 3)}]
+    for dim in dims:
+        projection = Projection.truncation(dim) if method == "truncate" else Projection.fit_pca(corpus, dim)
+        reduced_corpus = projection.transform(corpus)
+        reduced_queries = projection.transform(held_out)
+
+        start = time.perf_counter()
+        found = []
+        for q, rq in zip(held_out_n, reduced_queries):
+            first = np.argpartition(-(reduced_corpus @ rq), min(candidates, len(corpus) - 1))[:candidates]
+            found.append(first[np.argsort(-(corpus_n[first] @ q))[:k]])
+        two_stage_ms = (time.perf_counter() - start) / len(held_out) * 1000
+
+        recall = np.mean([len(set(e) & set(f)) / k for e, f in zip(exact, found)])
+        rows.append({"dim": dim, "recall_at_k": round(float(recall), 4), "query_ms": round(two_stage_ms, 3)})
+    return rows
+
+
+async def run(args) -> None:
+    settings = get_settings()
+    if args.backfill_only:
+        projection = Projection.load(args.output)
+        await _backfill_and_index(projection, args)
+        return
+    sample = await load_sample(args.sample)
+    if not len(sample):
+        raise SystemExit("No chunk embeddings in the database")
+    print(f"Loaded {len(sample)} embeddings")
+
+    if args.report_dims:
+        rows = report(sample, args.report_dims, args.method, args.k, args.candidates, args.queries)
+        print(json.dumps({"k": args.k, "candidates": args.candidates, "method": args.method, "results": rows}, indent=2))
+    if args.report_only:
+        print(f"First stage: {json.dumps(await first_stage())}")
+        return
+
+    if args.method == "truncate":
+        projection = Projection.truncation(args.dim)
+    else:
+        projection = Projection.fit_pca(sample, args.dim)
+    projection.save(args.output)
+    print(f"Saved {args.method} projection {projection.version} to {args.dim} dimensions in {args.output}")
+
+    if not args.no_backfill:
+        await _backfill_and_index(projection, args)
+    if settings.search_reduced_dim != args.dim:
+        print(f"Set SEARCH_REDUCED_DIM={args.dim} to enable two-stage search")
+
+
+async def _backfill_and_index(projection: Projection, args) -> None:
+    column = await first_stage()
+    if column["dim"] not in (None, projection.dim):
+        print(f"Dropping the {column['dim']}-dimension declaration and index of embedding_reduced")
+        await drop_dimension()
+    updated = await backfill(projection, args.batch_size)
+    print(f"Backfilled embedding_reduced for {updated} chunks with projection {projection.version}")
+    if args.index:
+        started = time.perf_counter()
+        await build_index(projection)
+        print(f"Indexed embedding_reduced at {projection.dim} dimensions in {time.perf_counter() - started:.1f}s")
+    column = await first_stage()
+    print(f"First stage: {json.dumps(column)}")
+    if not column["indexed"]:
+        print("The reduced first stage is a sequential scan; rerun with --index to build its HNSW index")
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dim", type=int, default=settings.search_reduced_dim or 256)
+    parser.add_argument("--method", choices=["pca", "truncate"], default=default_method(settings.embedding_model))
+    parser.add_argument("--sample", type=int, default=50000, help="Embeddings sampled for fitting")
+    parser.add_argument("--output", default=settings.search_projection_path)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per backfill update")
+    parser.add_argument("--no-backfill", action="store_true")
+    parser.add_argument("--backfill-only", action="store_true", help="Backfill with the saved projection, without refitting")
+    parser.add_argument("--index", action="store_true", help="After the backfill, declare the dimension and build the HNSW index")
+    parser.add_argument("--report-dims", type=int, nargs="*", default=[], help="Defaults to 64 128 256 512 with --report-only")
+    parser.add_argument("--report-only", action="store_true")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=settings.search_rescore_candidates)
+    parser.add_argument("--queries", type=int, default=200, help="Held-out sample rows used as queries")
+    args = parser.parse_args()
+    if args.report_only and not args.report_dims:
+        args.report_dims = [64, 128, 256, 512]
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Build and maintain the memory-mapped index snapshot.
+
+    python -m app.cli.index_snapshot build                 # full snapshot of document_chunks
+    python -m app.cli.index_snapshot catch-up              # append newer chunks to the delta log
+    python -m app.cli.index_snapshot refresh --max-delta 0.05
+    python -m app.cli.index_snapshot build --degree 32     # ... with the neighbour graph
+    python -m app.cli.index_snapshot verify --queries 100
+
+build streams every embedded chunk in id order into a new file and swaps
+it in by rename, then carries the old delta log's tombstones over to the
+new snapshot's log and drops the old one; workers remap on their next
+lookup. catch-up appends chunks created after the snapshot (or the last
+delta record) to the delta log, which workers pick up on their next
+lookup. It pages on (created_at, id), since a document's chunks share one
+created_at, and re-reads --overlap seconds behind that point for chunks
+whose transaction committed late. refresh rebuilds once the delta holds
+more than --max-delta of the snapshot's rows, and catches up otherwise. verify checks the checksum and measures recall@k of the graph
+search against exact search.
+
+Serving only reads vectors from the snapshot (for MMR), so the neighbour
+graph, whose exact build is quadratic in the chunk count, is skipped unless
+--degree asks for it to evaluate graph search with verify.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import UTC, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, select, tuple_
+
+from app.config import get_settings
+from app.core.index_snapshot import (DeltaLog, IndexSnapshot, delta_path,
+                                     read_header, write_snapshot)
+from app.db.session import async_session
+from app.models.chunks import DocumentChunk
+
+
+def _meta(row) -> dict:
+    return {"document_id": str(row.document_id), "chunk_index": row.chunk_index, "metadata": row.chunk_metadata}
+
+
+async def build(path: str, degree: int, batch_size: int) -> dict:
+    loop = asyncio.get_running_loop()
+    old_header = read_header(path) if os.path.exists(path) else None
+    async with async_session() as session:
+        # One consistent view for the count and the scan
+        await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        embedded = DocumentChunk.embedding.isnot(None)
+        high_water = (await session.execute(select(func.max(DocumentChunk.created_at)).where(embedded))).scalar()
+        scope = [embedded]
+        if high_water is not None:
+            # Anything newer is left to the delta log
+            scope.append(DocumentChunk.created_at <= high_water)
+        count = (await session.execute(select(func.count()).where(*scope))).scalar()
+
+        last_id = None
+
+        async def next_batch():
+            nonlocal last_id
+            query = (
+                select(
+                    DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.chunk_index,
+                    DocumentChunk.chunk_metadata, DocumentChunk.embedding,
+                )
+                .where(*scope)
+                .order_by(DocumentChunk.id)
+                .limit(batch_size)
+            )
+            if last_id is not None:
+                query = query.where(DocumentChunk.id > last_id)
+            rows = (await session.execute(query)).all()
+            if rows:
+                last_id = rows[-1].id
+            return rows
+
+        def batches():
+            # The writer runs in a thread and pulls each batch from the event loop
+            rows = first
+            while rows:
+                yield (
+                    [row.id for row in rows],
+                    np.asarray([row.embedding for row in rows], dtype=np.float32),
+                    [_meta(row) for row in rows],
+                )
+                rows = asyncio.run_coroutine_threadsafe(next_batch(), loop).result()
+
+        first = await next_batch()
+        dim = len(first[0].embedding) if first else 0
+        header = await asyncio.to_thread(write_snapshot, path, batches(), count, dim, degree, high_water)
+    if old_header is not None:
+        old_delta = DeltaLog(delta_path(path, old_header), old_header["dim"])
+        old_delta.reload()
+        # Chunks deleted while the scan ran may be in the new snapshot
+        if old_delta.deleted and header["dim"] == old_header["dim"]:
+            DeltaLog(delta_path(path, header), header["dim"]).append_deletions(old_delta.deleted)
+        if os.path.exists(old_delta.path):
+            os.unlink(old_delta.path)
+    return header
+
+
+async def catch_up(path: str, batch_size: int, overlap: float = 600.0) -> int:
+    snapshot = IndexSnapshot(path)
+    delta = snapshot.delta
+    since = (
+        datetime.fromtimestamp(delta.last_key[0], UTC).replace(tzinfo=None)
+        if delta.last_key is not None else snapshot.high_water
+    )
+    # created_at is stamped before commit, so a slow transaction can land
+    # behind rows already logged; look back and skip what is already held
+    lower = since - timedelta(seconds=overlap) if since is not None else None
+    known = set(delta.ids) | delta.deleted
+    after = None
+    appended = 0
+    async with async_session() as session:
+        while True:
+            query = (
+                select(
+                    DocumentChunk.id, DocumentChunk.document_id, DocumentChunk.chunk_index,
+                    DocumentChunk.chunk_metadata, DocumentChunk.embedding, DocumentChunk.created_at,
+                )
+                .where(DocumentChunk.embedding.isnot(None))
+                .order_by(DocumentChunk.created_at, DocumentChunk.id)
+                .limit(batch_size)
+            )
+            if lower is not None:
+                query = query.where(DocumentChunk.created_at > lower)
+            if after is not None:
+                # Keyset: chunks of one document share created_at, so the id breaks the tie
+                query = query.where(tuple_(DocumentChunk.created_at, DocumentChunk.id) > after)
+            rows = (await session.execute(query)).all()
+            if not rows:
+                break
+            after = (rows[-1].created_at, rows[-1].id)
+            records = [
+                (row.id, row.created_at.replace(tzinfo=UTC), np.asarray(row.embedding, dtype=np.float32), _meta(row))
+                for row in rows
+                if str(row.id) not in known and snapshot.row_of(row.id) is None
+            ]
+            if records:
+                await asyncio.to_thread(delta.append, records)
+                appended += len(records)
+    snapshot.close()
+    return appended
+
+
+def verify(path: str, k: int, queries: int, ef: int) -> dict:
+    start = time.perf_counter()
+    snapshot = IndexSnapshot(path, verify=True)
+    report = {**snapshot.header, "checksum_ok": True, "open_seconds": round(time.perf_counter() - start, 3)}
+    del report["sections"]
+    report["delta_rows"] = len(snapshot.delta.ids)
+    if snapshot.count and snapshot.degree:
+        rng = np.random.default_rng(0)
+        sample = rng.choice(snapshot.count, min(queries, snapshot.count), replace=False)
+        recalls, graph_ms, exact_ms = [], 0.0, 0.0
+        for row in sample:
+            query = np.asarray(snapshot.vectors[row])
+            t = time.perf_counter()
+            exact = np.argsort(-(snapshot.vectors @ query))[:k]
+            exact_ms += time.perf_counter() - t
+            exact_ids = {snapshot.chunk_id(i) for i in exact}
+            t = time.perf_counter()
+            found = snapshot.search(query, k, ef)
+            graph_ms += time.perf_counter() - t
+            recalls.append(len({chunk_id for chunk_id, _ in found} & exact_ids) / k)
+        report.update(
+            recall_at_k=round(float(np.mean(recalls)), 4),
+            graph_query_ms=round(graph_ms / len(sample) * 1000, 3),
+            exact_query_ms=round(exact_ms / len(sample) * 1000, 3),
+        )
+    snapshot.close()
+    return report
+
+
+async def run(args) -> None:
+    if args.command == "build":
+        header = await build(args.path, args.degree, args.batch_size)
+        print(f"Wrote {header['count']} chunks ({header['dim']} dimensions, degree {header['degree']}) to {args.path}")
+    elif args.command == "catch-up":
+        print(f"Appended {await catch_up(args.path, args.batch_size, args.overlap)} chunks to the delta log of {args.path}")
+    elif args.command == "refresh":
+        if not os.path.exists(args.path):
+            header = await build(args.path, args.degree, args.batch_size)
+            print(f"Wrote {header['count']} chunks to {args.path}")
+            return
+        appended = await catch_up(args.path, args.batch_size, args.overlap)
+        snapshot = IndexSnapshot(args.path)
+        delta_rows, count = len(snapshot.delta.ids), snapshot.count
+        snapshot.close()
+        if delta_rows > args.max_delta * max(count, 1):
+            header = await build(args.path, args.degree, args.batch_size)
+            print(f"Delta held {delta_rows} chunks; rebuilt with {header['count']}")
+        else:
+            print(f"Appended {appended} chunks; delta holds {delta_rows}")
+    elif args.command == "verify":
+        print(json.dumps(await asyncio.to_thread(verify, args.path, args.k, args.queries, args.ef), indent=2))
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build", "catch-up", "refresh", "verify"])
+    parser.add_argument("--path", default=settings.index_snapshot_path or ".cache/index.snapshot")
+    parser.add_argument("--degree", type=int, default=0,
+                        help="Graph neighbours per chunk, for IndexSnapshot.search; 0 (the default) skips the graph")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per database read")
+    parser.add_argument("--overlap", type=float, default=600.0, help="Seconds re-read behind the last logged chunk, for late commits")
+    parser.add_argument("--max-delta", type=float, default=0.05, help="Delta size, as a fraction of the snapshot, that triggers a rebuild")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--ef", type=int, default=64, help="Graph search beam width")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
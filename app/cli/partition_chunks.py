@@ -0,0 +1,333 @@
+"""
+Move document_chunks to a table hash-partitioned by owner, without downtime.
+
+    python -m app.cli.partition_chunks backfill           # owner_id on existing chunks
+    python -m app.cli.partition_chunks prepare --partitions 16
+    python -m app.cli.partition_chunks copy
+    python -m app.cli.partition_chunks index
+    python -m app.cli.partition_chunks verify
+    python -m app.cli.partition_chunks swap
+    python -m app.cli.partition_chunks drop-old            # once the new table has served a while
+
+backfill sets owner_id from documents.user_id in batches; it is all that is
+needed to scope searches by owner on the unpartitioned table. prepare
+creates document_chunks_partitioned with its partitions, primary key
+(id, owner_id) and btree indexes, and a trigger that mirrors every write
+on document_chunks into it from then on. copy moves the existing rows in
+primary-key batches, parents before children, each batch locking its
+source rows so a concurrent update is either copied or mirrored. index
+builds the HNSW and GIN indexes partition by partition, concurrently, and
+attaches them to the parent's. swap renames the tables under a short
+exclusive lock. Until swap, abort drops the new table and the trigger.
+
+After swap, set chunk_owner_routing so queries name the owner and the
+planner prunes them to one partition.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from app.config import get_settings
+from app.db.session import get_engine
+
+TABLE = "document_chunks"
+NEW_TABLE = "document_chunks_partitioned"
+OLD_TABLE = "document_chunks_unpartitioned"
+MIRROR = "document_chunks_mirror"
+
+# Indexes on the new parent table, created under a temporary name and given
+# the canonical one at swap: name -> (method, columns, built during copy)
+INDEXES: Dict[str, tuple] = {
+    "ix_document_chunks_document_id": ("btree", "document_id, chunk_index", True),
+    "ix_document_chunks_parent_id": ("btree", "parent_id", True),
+    # Each partition still holds many owners
+    "ix_document_chunks_owner_id": ("btree", "owner_id", True),
+    "ix_document_chunks_content_tsv": ("gin", "content_tsv", False),
+    "ix_document_chunks_embedding": ("hnsw", "embedding vector_cosine_ops", False),
+}
+
+
+def _staged(name: str) -> str:
+    return f"{name}_part"
+
+
+async def _columns(conn) -> List[str]:
+    """Writable columns of document_chunks; generated ones are recomputed by the new table"""
+    result = await conn.execute(
+        text(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = 'public' AND table_name = :table AND is_generated = 'NEVER' "
+            "ORDER BY ordinal_position"
+        ),
+        {"table": TABLE},
+    )
+    return [row.column_name for row in result]
+
+
+async def _partitions(conn) -> List[str]:
+    result = await conn.execute(
+        text(
+            "SELECT relid::regclass::text AS name FROM pg_partition_tree(CAST(:table AS regclass)) "
+            "WHERE isleaf ORDER BY 1"
+        ),
+        {"table": NEW_TABLE},
+    )
+    return [row.name for row in result]
+
+
+def _owner_of(row: str) -> str:
+    # Rows written before the backfill reached them take the document's owner
+    return f"coalesce({row}.owner_id, (SELECT user_id FROM documents WHERE id = {row}.document_id))"
+
+
+async def backfill(batch_size: int) -> int:
+    updated = 0
+    while True:
+        async with get_engine().begin() as conn:
+            result = await conn.execute(
+                text(
+                    f"UPDATE {TABLE} c SET owner_id = d.user_id FROM documents d "
+                    f"WHERE c.id IN (SELECT id FROM {TABLE} WHERE owner_id IS NULL "
+                    "LIMIT :limit FOR UPDATE SKIP LOCKED) "
+                    "AND d.id = c.document_id"
+                ),
+                {"limit": batch_size},
+            )
+        if not result.rowcount:
+            return updated
+        updated += result.rowcount
+
+
+async def prepare(partitions: int) -> None:
+    async with get_engine().begin() as conn:
+        columns = await _columns(conn)
+        await conn.execute(text(
+            f"CREATE TABLE {NEW_TABLE} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE) "
+            "PARTITION BY HASH (owner_id)"
+        ))
+        await conn.execute(text(f"ALTER TABLE {NEW_TABLE} ALTER COLUMN owner_id SET NOT NULL"))
+        # Unique constraints on a partitioned table must include the partition key
+        await conn.execute(text(f"ALTER TABLE {NEW_TABLE} ADD PRIMARY KEY (id, owner_id)"))
+        await conn.execute(text(
+            f"ALTER TABLE {NEW_TABLE} ADD FOREIGN KEY (document_id) REFERENCES documents (id)"
+        ))
+        # A parent and its children share a document, and so an owner
+        await conn.execute(text(
+            f"ALTER TABLE {NEW_TABLE} ADD FOREIGN KEY (parent_id, owner_id) "
+            f"REFERENCES {NEW_TABLE} (id, owner_id) ON DELETE CASCADE"
+        ))
+        for remainder in range(partitions):
+            await conn.execute(text(
+                f"CREATE TABLE {TABLE}_p{remainder:02d} PARTITION OF {NEW_TABLE} "
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            ))
+        # Lookup indexes go in now so mirrored deletes and cascades stay cheap;
+        # the search indexes are built after the copy
+        for name, (method, definition, early) in INDEXES.items():
+            if early:
+                await conn.execute(text(
+                    f"CREATE INDEX {_staged(name)} ON {NEW_TABLE} USING {method} ({definition})"
+                ))
+
+        copied = [column for column in columns if column != "owner_id"]
+        assignments = ", ".join(f"{column} = EXCLUDED.{column}" for column in copied)
+        await conn.execute(text(f"""
+            CREATE FUNCTION {MIRROR}() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP = 'DELETE' THEN
+                    DELETE FROM {NEW_TABLE} WHERE id = OLD.id AND owner_id = {_owner_of('OLD')};
+                    RETURN OLD;
+                END IF;
+                IF TG_OP = 'UPDATE' AND NOT EXISTS (
+                    SELECT 1 FROM {NEW_TABLE} WHERE id = NEW.id AND owner_id = {_owner_of('NEW')}
+                ) THEN
+                    -- Not copied yet; the copy reads the updated row
+                    RETURN NEW;
+                END IF;
+                INSERT INTO {NEW_TABLE} ({", ".join(copied)}, owner_id)
+                VALUES ({", ".join(f"NEW.{column}" for column in copied)}, {_owner_of('NEW')})
+                ON CONFLICT (id, owner_id) DO UPDATE SET {assignments};
+                RETURN NEW;
+            END
+            $$
+        """))
+        await conn.execute(text(
+            f"CREATE TRIGGER {MIRROR} AFTER INSERT OR UPDATE OR DELETE ON {TABLE} "
+            f"FOR EACH ROW EXECUTE FUNCTION {MIRROR}()"
+        ))
+
+
+async def copy(batch_size: int) -> int:
+    async with get_engine().connect() as conn:
+        columns = [column for column in await _columns(conn) if column != "owner_id"]
+    source = ", ".join(f"c.{column}" for column in columns)
+    copied = 0
+    # Parents first, so every child's parent is already there
+    for scope in ("c.parent_id IS NULL", "c.parent_id IS NOT NULL"):
+        after = None
+        while True:
+            async with get_engine().begin() as conn:
+                # FOR SHARE: a concurrent update or delete of a row in the batch
+                # waits for this copy, and its mirror then finds the row
+                row = (await conn.execute(
+                    text(f"""
+                        WITH batch AS (
+                            SELECT {source}, {_owner_of('c')} AS owner_id
+                            FROM {TABLE} c
+                            WHERE {scope} AND (CAST(:after AS uuid) IS NULL OR c.id > CAST(:after AS uuid))
+                            ORDER BY c.id
+                            LIMIT :limit
+                            FOR SHARE OF c
+                        ),
+                        inserted AS (
+                            INSERT INTO {NEW_TABLE} ({", ".join(columns)}, owner_id)
+                            SELECT * FROM batch
+                            ON CONFLICT (id, owner_id) DO NOTHING
+                        )
+                        SELECT (SELECT count(*) FROM batch) AS rows,
+                               (SELECT id FROM batch ORDER BY id DESC LIMIT 1) AS last_id
+                    """),
+                    {"after": after, "limit": batch_size},
+                )).one()
+            if not row.rows:
+                break
+            copied += row.rows
+            after = row.last_id
+    return copied
+
+
+async def build_indexes() -> List[str]:
+    built = []
+    async with get_engine().connect() as conn:
+        # CREATE INDEX CONCURRENTLY refuses to run inside a transaction
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        partitions = await _partitions(conn)
+        for name, (method, definition, early) in INDEXES.items():
+            if early:
+                continue
+            # Partition-local indexes first, without blocking the mirrored writes,
+            # then the parent's index, which is valid once all are attached
+            await conn.execute(text(
+                f"CREATE INDEX IF NOT EXISTS {_staged(name)} ON ONLY {NEW_TABLE} USING {method} ({definition})"
+            ))
+            for partition in partitions:
+                local = f"{partition}_{name.removeprefix('ix_document_chunks_')}"
+                started = time.perf_counter()
+                await conn.execute(text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {local} ON {partition} USING {method} ({definition})"
+                ))
+                attached = (await conn.execute(
+                    text("SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(:index AS regclass)"),
+                    {"index": local},
+                )).first()
+                if not attached:
+                    await conn.execute(text(f"ALTER INDEX {_staged(name)} ATTACH PARTITION {local}"))
+                print(f"Built {local} in {time.perf_counter() - started:.1f}s")
+                built.append(local)
+    return built
+
+
+async def verify() -> dict:
+    async with get_engine().connect() as conn:
+        counts = {
+            table: (await conn.execute(text(f"SELECT count(*) FROM {table}"))).scalar()
+            for table in (TABLE, NEW_TABLE)
+        }
+        missing_owner = (await conn.execute(text(f"SELECT count(*) FROM {TABLE} WHERE owner_id IS NULL"))).scalar()
+        sizes = {
+            partition: (await conn.execute(text(f"SELECT count(*) FROM {partition}"))).scalar()
+            for partition in await _partitions(conn)
+        }
+        invalid = (await conn.execute(
+            text(
+                "SELECT count(*) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE i.indrelid = CAST(:table AS regclass) AND NOT i.indisvalid"
+            ),
+            {"table": NEW_TABLE},
+        )).scalar()
+        built = (await conn.execute(
+            text("SELECT count(*) FROM pg_indexes WHERE tablename = :table"),
+            {"table": NEW_TABLE},
+        )).scalar()
+    return {
+        "rows": counts,
+        "in_sync": counts[TABLE] == counts[NEW_TABLE],
+        "chunks_without_owner": missing_owner,
+        "partition_rows": sizes,
+        # Primary key plus the staged indexes
+        "indexes_ready": built == len(INDEXES) + 1 and not invalid,
+    }
+
+
+async def swap() -> None:
+    report = await verify()
+    if not (report["in_sync"] and report["indexes_ready"]):
+        raise SystemExit(f"Not ready to swap: {json.dumps(report)}")
+    async with get_engine().begin() as conn:
+        # Queue behind running queries only briefly rather than stall new ones
+        await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+        await conn.execute(text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE"))
+        await conn.execute(text(f"DROP TRIGGER {MIRROR} ON {TABLE}"))
+        await conn.execute(text(f"ALTER TABLE {TABLE} RENAME TO {OLD_TABLE}"))
+        await conn.execute(text(f"ALTER TABLE {NEW_TABLE} RENAME TO {TABLE}"))
+        for name in INDEXES:
+            await conn.execute(text(f"ALTER INDEX IF EXISTS {name} RENAME TO {name}_old"))
+        for name in INDEXES:
+            await conn.execute(text(f"ALTER INDEX {_staged(name)} RENAME TO {name}"))
+        await conn.execute(text(f"DROP FUNCTION {MIRROR}()"))
+
+
+async def abort() -> None:
+    async with get_engine().begin() as conn:
+        await conn.execute(text(f"DROP TRIGGER IF EXISTS {MIRROR} ON {TABLE}"))
+        await conn.execute(text(f"DROP FUNCTION IF EXISTS {MIRROR}()"))
+        await conn.execute(text(f"DROP TABLE IF EXISTS {NEW_TABLE}"))
+
+
+async def drop_old() -> None:
+    async with get_engine().begin() as conn:
+        await conn.execute(text(f"DROP TABLE {OLD_TABLE}"))
+
+
+async def run(args) -> None:
+    if args.command == "backfill":
+        print(f"Set owner_id on {await backfill(args.batch_size)} chunks")
+    elif args.command == "prepare":
+        await prepare(args.partitions)
+        print(f"Created {NEW_TABLE} with {args.partitions} partitions; writes to {TABLE} are mirrored")
+    elif args.command == "copy":
+        print(f"Copied {await copy(args.batch_size)} chunks into {NEW_TABLE}")
+    elif args.command == "index":
+        print(f"Built {len(await build_indexes())} partition indexes")
+    elif args.command == "verify":
+        print(json.dumps(await verify(), indent=2))
+    elif args.command == "swap":
+        await swap()
+        print(f"{TABLE} is now partitioned; the old table is kept as {OLD_TABLE}")
+    elif args.command == "abort":
+        await abort()
+        print(f"Dropped {NEW_TABLE} and the mirror trigger")
+    elif args.command == "drop-old":
+        await drop_old()
+        print(f"Dropped {OLD_TABLE}")
+    await get_engine().dispose()
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "command", choices=["backfill", "prepare", "copy", "index", "verify", "swap", "abort", "drop-old"]
+    )
+    parser.add_argument("--partitions", type=int, default=settings.chunk_partitions)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per transaction")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Retry documents whose ingestion failed or was interrupted.
+
+    python -m app.cli.resume_ingestion                  # failed, or stuck for 30+ minutes
+    python -m app.cli.resume_ingestion --stale-minutes 0 --dry-run
+
+Each document is reprocessed from its storage_url, whether it was first
+ingested alone or in bulk; with checkpoints enabled the retry skips the
+pages, chunking and embedding batches that finished before the failure.
+Exits with status 1 if any document fails again.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import or_, select
+
+from app.core.admission import Priority
+from app.core.embeddings import create_embedding_provider
+from app.core.storage import PostgresVectorStore
+from app.db.session import async_session
+from app.models.documents import Document
+from app.services.indexing.checkpoints import get_checkpoint_store
+from app.services.indexing.document_service import DocumentService
+
+
+async def find_unfinished(stale_minutes: float):
+    cutoff = datetime.now(UTC) - timedelta(minutes=stale_minutes)
+    async with async_session() as session:
+        result = await session.execute(
+            select(Document.id, Document.user_id, Document.storage_url, Document.processing_status)
+            .where(or_(
+                Document.processing_status.like("failed:%"),
+                # A worker that died mid-pipeline never recorded the failure
+                Document.processing_status.like("processing:%") & (Document.updated_at < cutoff),
+            ))
+            .order_by(Document.created_at)
+        )
+        return result.all()
+
+
+async def run(args) -> int:
+    documents = await find_unfinished(args.stale_minutes)
+    for document in documents:
+        print(f"{document.id}  {document.processing_status}")
+    if args.dry_run or not documents:
+        return 0
+
+    embedding_provider = await asyncio.to_thread(create_embedding_provider)
+    failed = 0
+    for document in documents:
+        async with async_session() as session:
+            service = DocumentService(
+                db=session,
+                embedding_provider=embedding_provider,
+                storage_provider=PostgresVectorStore(session),
+                checkpoint_store=get_checkpoint_store(),
+            )
+            try:
+                await service.process_pdf_complete(
+                    document.storage_url,
+                    document.id,
+                    user_id=document.user_id,
+                    chunk_size=args.chunk_size,
+                    priority=Priority.BULK,
+                )
+                print(f"{document.id}  completed")
+            except Exception as e:
+                failed += 1
+                print(f"{document.id}  {e}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stale-minutes", type=float, default=30.0,
+                        help="How long a document may sit in a processing stage before it counts as interrupted")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Only list the documents")
+    args = parser.parse_args()
+    if asyncio.run(run(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ class Settings(BaseSettings):
     deepseek_api_key: str
     supabase_db_url: str
     embedding_model: str
+    embedding_backend: str = "torch"  # "torch", "onnx" or "server"
     supabase_anon_key: str = ""  # Optional
     supabase_db_password: str = ""  # Optional
     frontend_url: str = "http://localhost:3000"  # Optional with default
@@ -16,6 +17,134 @@ class Settings(BaseSettings):
     # Also accept openai_api_key as an alias for deepseek_api_key
     openai_api_key: str = ""  # Optional, can use deepseek_api_key instead
 
+    # Database connection pool
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 10.0  # Seconds to wait for a free connection
+    db_pool_recycle: int = 1800  # Seconds before a connection is replaced
+    db_pool_pre_ping: bool = True
+    db_query_cache_size: int = 500  # SQLAlchemy compiled statement cache
+    db_prepared_statement_cache_size: int = 100  # Per connection, 0 behind pgbouncer
+    db_migrate_on_startup: bool = True
+
+    # Ingestion preprocessing
+    preprocess_strip_repeated_lines: bool = True  # Running headers, footers, page numbers
+    preprocess_repeated_line_ratio: float = 0.6  # Fraction of pages a line must repeat on
+
+    # Resumable ingestion: extracted pages, chunks and embedding batches are
+    # checkpointed per document and content hash, so a retried job skips
+    # finished work. Removed on success, or after the retention period
+    ingest_checkpoints_enabled: bool = True
+    ingest_checkpoint_backend: str = "local"  # "local" or "supabase" (Storage bucket)
+    ingest_checkpoint_dir: str = ".cache/ingest-checkpoints"
+    ingest_checkpoint_bucket: str = "ingest-checkpoints"
+    ingest_checkpoint_retention_hours: float = 72.0
+    ingest_checkpoint_page_interval: int = 20  # Pages extracted between checkpoint writes
+    # Seconds between updated_at bumps while a document embeds, so
+    # resume_ingestion does not take a long embed stage for a dead worker
+    ingest_heartbeat_seconds: float = 60.0
+
+    # Chunk deletion and index upkeep: deletes go in primary-key batches, and
+    # document_chunks is vacuumed (ANN indexes rebuilt) once dead tuples
+    # pass the ratio
+    chunk_delete_batch_size: int = 1000
+    chunk_insert_batch_size: int = 500  # Rows per bulk INSERT when a document's chunks are written
+    maintenance_dead_tuple_ratio: float = 0.2
+    maintenance_min_interval: float = 3600.0  # Seconds between maintenance runs
+    maintenance_reindex: bool = True  # REINDEX CONCURRENTLY hnsw/ivfflat indexes
+
+    # Owner partitioning: chunks carry their document's owner, and
+    # python -m app.cli.partition_chunks moves document_chunks to hash
+    # partitions on it. With routing on, searches and chunk lookups are
+    # limited to the caller's documents and filter on owner_id, so a
+    # partitioned table is pruned to one partition. Turn it on once
+    # owner_id is backfilled
+    chunk_owner_routing: bool = False
+    chunk_partitions: int = 16  # Partitions created by partition_chunks
+
+    # Parent-child chunking: small children are embedded and searched, their
+    # parent sections (chunk_size) are what the LLM sees
+    chunk_parent_child: bool = True
+    chunk_child_size: int = 400
+    retrieval_child_overfetch: int = 3  # Children searched per parent returned
+
+    # Chunk text storage. "inline" stores the document text and every chunk's
+    # text in full. "offsets" stores the document text once, compressed, and
+    # parent sections as (start, end) spans into it; embedded chunks keep
+    # their text, which full-text search indexes. Retrieval then resolves
+    # parents, and widens flat chunks by retrieval_context_chars on each
+    # side, by slicing the cached document text
+    chunk_text_storage: str = "inline"  # "inline" or "offsets"
+    retrieval_context_chars: int = 0
+    document_text_cache_chars: int = 50_000_000  # Decompressed text kept per worker
+
+    # Maximal marginal relevance: over-fetch candidates and keep a diverse
+    # subset; a request can pass its own lambda (1 = relevance order only)
+    retrieval_mmr_enabled: bool = False
+    retrieval_mmr_lambda: float = 0.7
+    retrieval_mmr_candidates: int = 3  # Candidates searched per result kept
+
+    # Paged retrieve-only results: a cursor continues after the last (score,
+    # chunk id) returned, and every page is cut from the same ranking of
+    # retrieval_page_window candidates per search leg. Streaming (NDJSON)
+    # fetches retrieval_stream_page_size rows per round trip
+    retrieval_page_window: int = 1000
+    retrieval_stream_page_size: int = 50
+
+    # Full-text leg of hybrid search; documents with a `language` in their
+    # metadata use that language's configuration instead
+    text_search_config: str = "english"
+    # Extra comma-separated configurations the query is also parsed with, so
+    # a chunk in one of those languages is matched in its own (e.g.
+    # "german,french"). Empty parses with text_search_config only; each extra
+    # one adds lexemes to the GIN lookup and a per-row recheck
+    text_search_configs: str = ""
+
+    # Two-stage vector search: a reduced projection of each embedding is
+    # searched first and the top candidates are rescored at full dimension.
+    # Fit the projection with python -m app.cli.fit_projection
+    search_reduced_dim: int = 0  # 0 disables two-stage search
+    search_projection_path: str = ".cache/projection.npz"
+    search_rescore_candidates: int = 200  # First-stage hits rescored in full
+
+    # Memory-mapped index snapshot, built and refreshed with
+    # python -m app.cli.index_snapshot; workers map it at startup and read
+    # candidate vectors from it instead of fetching them from Postgres
+    index_snapshot_path: str = ""  # Empty disables
+    index_snapshot_verify: bool = True  # Check the checksum when mapping
+
+    # Identical concurrent queries share one retrieval and one LLM stream
+    query_coalescing_enabled: bool = True
+
+    # Hot-path instrumentation (/metrics and Server-Timing headers)
+    metrics_enabled: bool = True
+
+    # ONNX Runtime embedding backend; needs pip install -r requirements-onnx.txt
+    onnx_model_dir: str = ".cache/onnx"
+    onnx_quantize: bool = True  # Dynamic int8 quantization of the exported model
+    onnx_intra_op_threads: int = 0  # 0 lets ONNX Runtime pick (physical cores)
+    onnx_parity_threshold: float = 0.99  # Min cosine similarity vs. the torch output
+
+    # Shared embedding server (embedding_backend="server")
+    embedding_server_socket: str = "/tmp/themison-embeddings.sock"
+    embedding_server_processes: int = 1
+    embedding_server_backend: str = "torch"  # What the server process itself runs
+    embedding_server_max_batch: int = 64
+    embedding_server_batch_wait_ms: float = 5.0  # How long to wait to fill a batch
+    embedding_server_slots: int = 8  # Concurrent requests per worker connection
+    embedding_server_slot_rows: int = 256  # Vectors per shared-memory slot
+
+    # Admission control for the embedding model and the LLM
+    admission_enabled: bool = True
+    admission_query_embedding_concurrency: int = 4
+    admission_ingest_embedding_concurrency: int = 2
+    admission_llm_concurrency: int = 16
+    admission_query_max_wait: float = 2.0  # Seconds before a queued request is shed
+    admission_ingest_max_wait: float = 30.0
+    admission_llm_max_wait: float = 5.0
+    admission_max_queue_depth: int = 256
+    admission_max_queued_per_user: int = 8
+
     class Config:
         env_file = ".env"
 
@@ -2,6 +2,8 @@ from .base import BaseContract, TimestampedContract
 from .chat import (ChatMessageBase, ChatMessageCreate, ChatMessageResponse,
                    ChatSessionBase, ChatSessionCreate, ChatSessionResponse,
                    ChatSessionUpdate)
-from .document import (DocumentBase, DocumentCreate, DocumentResponse,
-                       DocumentUpdate)
+from .document import (BulkIngestDocumentResult, BulkIngestItem,
+                       BulkIngestRequest, BulkIngestResponse, DocumentBase,
+                       DocumentCreate, DocumentDeleteResponse,
+                       DocumentResponse, DocumentUpdate)
 from .query import QueryBase, QueryCreate, QueryResponse
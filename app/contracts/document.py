@@ -1,10 +1,12 @@
 from .base import BaseContract, TimestampedContract
 from uuid import UUID
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+from pydantic import AliasChoices, Field
 
 class DocumentBase(BaseContract):
     content: str
-    metadata: Optional[Dict] = None
+    # The ORM attribute is doc_metadata; Document.metadata is SQLAlchemy's MetaData
+    metadata: Optional[Dict] = Field(None, validation_alias=AliasChoices("doc_metadata", "metadata"))
     chunks: Optional[Dict] = None
 
 class DocumentCreate(DocumentBase):
@@ -17,7 +19,40 @@ class DocumentUpdate(BaseContract):
 
 class DocumentResponse(DocumentBase, TimestampedContract):
     id: UUID
+    # None when the text is stored compressed for offset-referenced chunks
+    content: Optional[str] = None
     embedding_id: Optional[UUID] = None
     
 class DocumentUpload(BaseContract):
     document_url: str
+
+class DocumentDeleteResponse(BaseContract):
+    document_id: UUID
+    deleted_chunks: int
+
+class BulkIngestItem(BaseContract):
+    document_id: UUID
+    document_url: str
+
+class BulkIngestRequest(BaseContract):
+    documents: List[BulkIngestItem] = Field(min_length=1)
+    chunk_size: int = 1000
+    concurrency: int = Field(4, ge=1, le=32, description="Documents downloaded and parsed at once")
+
+class BulkIngestDocumentResult(BaseContract):
+    document_id: UUID
+    status: str  # "success" or "failed"
+    failed_stage: Optional[str] = None
+    error: Optional[str] = None
+    chunks: int = 0
+    seconds: float = 0.0
+
+class BulkIngestResponse(BaseContract):
+    documents: List[BulkIngestDocumentResult]
+    succeeded: int
+    failed: int
+    total_chunks: int
+    seconds: float
+    documents_per_second: float
+    chunks_per_second: float
+
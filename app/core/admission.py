@@ -0,0 +1,343 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from enum import IntEnum
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from prometheus_client.core import GaugeMetricFamily
+
+from app.config import get_settings
+from app.core.metrics import (ADMISSION_WAIT_SECONDS, metrics_enabled,
+                              register_gauges)
+
+ANONYMOUS = "anonymous"
+
+
+class Priority(IntEnum):
+    """Lower values are admitted first"""
+    INTERACTIVE = 0
+    BULK = 1
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted to a lane in time"""
+
+    def __init__(self, lane: str, reason: str, retry_after: int, status_code: int = 503):
+        super().__init__(f"{lane}: {reason}")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    user_load: int
+    seq: int
+    weight: int = field(compare=False)
+    user_id: str = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+class AdmissionLane:
+    """
+    Weighted semaphore with a priority queue in front of it.
+
+    Waiters are ordered by priority, then by how much of the lane the same
+    user already holds or is waiting for (so one user's burst cannot starve
+    everyone else), then by arrival order.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        capacity: int,
+        max_queue_wait: float,
+        max_queue_depth: int,
+        max_queued_per_user: int,
+        yields_to: Optional["AdmissionLane"] = None,
+    ):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.max_queue_wait = max_queue_wait
+        self.max_queue_depth = max_queue_depth
+        self.max_queued_per_user = max_queued_per_user
+        self.yields_to = yields_to
+        self._yielders: List["AdmissionLane"] = []
+        if yields_to is not None:
+            yields_to._yielders.append(self)
+
+        self._in_use = 0
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._user_active: Dict[str, int] = defaultdict(int)
+        self._user_queued: Dict[str, int] = defaultdict(int)
+
+        # Metrics
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for w in self._queue if not w.cancelled)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_use
+
+    def _retry_after(self) -> int:
+        return max(1, int(self.max_queue_wait))
+
+    def _reject(self, reason: str, status_code: int) -> AdmissionRejected:
+        self.rejected_total += 1
+        return AdmissionRejected(self.name, reason, self._retry_after(), status_code)
+
+    def _can_grant(self, priority: int, weight: int) -> bool:
+        if self._in_use + weight > self.capacity:
+            return False
+        # Bulk work steps aside while interactive work is queued on the lane we yield to
+        if (
+            priority > Priority.INTERACTIVE
+            and self.yields_to is not None
+            and self.yields_to.queue_depth > 0
+        ):
+            return False
+        return True
+
+    def _grant(self, weight: int, user_id: str) -> None:
+        self._in_use += weight
+        self._user_active[user_id] += 1
+
+    def _wake(self) -> None:
+        while self._queue:
+            waiter = self._queue[0]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if not self._can_grant(waiter.priority, waiter.weight):
+                break
+            heapq.heappop(self._queue)
+            self._user_queued[waiter.user_id] -= 1
+            self._grant(waiter.weight, waiter.user_id)
+            waiter.future.set_result(None)
+
+    def _release(self, weight: int, user_id: str) -> None:
+        self._in_use -= weight
+        self._user_active[user_id] -= 1
+        if self._user_active[user_id] <= 0:
+            self._user_active.pop(user_id, None)
+        self._wake()
+        # Bulk waiters elsewhere may have been held back on our queue
+        for lane in self._yielders:
+            lane._wake()
+
+    async def acquire(
+        self,
+        user_id: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        weight: int = 1,
+    ) -> float:
+        """Wait for capacity and return the time spent queued"""
+        user_id = user_id or ANONYMOUS
+        weight = min(max(1, weight), self.capacity)
+        start = time.perf_counter()
+
+        if not self.queue_depth and self._can_grant(priority, weight):
+            self._grant(weight, user_id)
+            self._record_wait(0.0)
+            return 0.0
+
+        if self._user_queued[user_id] >= self.max_queued_per_user:
+            raise self._reject("too many queued requests for this user", 429)
+        if self.queue_depth >= self.max_queue_depth:
+            raise self._reject("queue is full", 503)
+
+        waiter = _Waiter(
+            priority=int(priority),
+            user_load=self._user_active[user_id] + self._user_queued[user_id],
+            seq=next(self._seq),
+            weight=weight,
+            user_id=user_id,
+            future=asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._queue, waiter)
+        self._user_queued[user_id] += 1
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.max_queue_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted in the same tick we gave up; hand the slot back
+                self._release(weight, user_id)
+            else:
+                waiter.cancelled = True
+                waiter.future.cancel()
+                self._user_queued[user_id] -= 1
+                for lane in self._yielders:
+                    lane._wake()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject(f"no capacity within {self.max_queue_wait}s", 503)
+
+        waited = time.perf_counter() - start
+        self._record_wait(waited)
+        return waited
+
+    def _record_wait(self, waited: float) -> None:
+        self.admitted_total += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        if metrics_enabled():
+            ADMISSION_WAIT_SECONDS.labels(self.name).observe(waited)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        user_id: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        weight: int = 1,
+    ) -> AsyncIterator[float]:
+        """Hold `weight` units of the lane for the duration of the block"""
+        user_id = user_id or ANONYMOUS
+        weight = min(max(1, weight), self.capacity)
+        waited = await self.acquire(user_id, priority, weight)
+        try:
+            yield waited
+        finally:
+            self._release(weight, user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "admitted_total": self.admitted_total,
+            "rejected_total": self.rejected_total,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "wait_seconds_avg": round(
+                self.wait_seconds_total / self.admitted_total, 6
+            ) if self.admitted_total else 0.0,
+        }
+
+
+class AdmissionController:
+    """Process-wide admission lanes for the embedding model and the LLM"""
+
+    QUERY_EMBEDDING = "query_embedding"
+    INGEST_EMBEDDING = "ingest_embedding"
+    LLM = "llm"
+
+    def __init__(self, settings=None):
+        settings = settings or get_settings()
+        self.enabled = settings.admission_enabled
+        common = dict(
+            max_queue_depth=settings.admission_max_queue_depth,
+            max_queued_per_user=settings.admission_max_queued_per_user,
+        )
+        query_lane = AdmissionLane(
+            self.QUERY_EMBEDDING,
+            capacity=settings.admission_query_embedding_concurrency,
+            max_queue_wait=settings.admission_query_max_wait,
+            **common,
+        )
+        ingest_lane = AdmissionLane(
+            self.INGEST_EMBEDDING,
+            capacity=settings.admission_ingest_embedding_concurrency,
+            max_queue_wait=settings.admission_ingest_max_wait,
+            yields_to=query_lane,
+            **common,
+        )
+        llm_lane = AdmissionLane(
+            self.LLM,
+            capacity=settings.admission_llm_concurrency,
+            max_queue_wait=settings.admission_llm_max_wait,
+            **common,
+        )
+        self.lanes: Dict[str, AdmissionLane] = {
+            lane.name: lane for lane in (query_lane, ingest_lane, llm_lane)
+        }
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        lane: str,
+        user_id: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        weight: int = 1,
+    ) -> AsyncIterator[float]:
+        if not self.enabled:
+            yield 0.0
+            return
+        async with self.lanes[lane].slot(user_id, priority, weight) as waited:
+            yield waited
+
+    async def guard_stream(
+        self,
+        lane: str,
+        stream_factory,
+        user_id: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE,
+    ) -> AsyncIterator[str]:
+        """
+        Acquire a slot, open the stream and return a generator that releases
+        the slot once the stream is exhausted or closed.
+        """
+        if not self.enabled:
+            return await stream_factory()
+
+        target = self.lanes[lane]
+        user_id = user_id or ANONYMOUS
+        await target.acquire(user_id, priority)
+        try:
+            stream = await stream_factory()
+        except BaseException:
+            target._release(1, user_id)
+            raise
+
+        async def guarded():
+            try:
+                async for item in stream:
+                    yield item
+            finally:
+                target._release(1, user_id)
+
+        return guarded()
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+
+@lru_cache()
+def get_admission_controller() -> AdmissionController:
+    return AdmissionController()
+
+
+def _admission_gauges() -> List[GaugeMetricFamily]:
+    families = {
+        "queue_depth": GaugeMetricFamily(
+            "rag_admission_queue_depth", "Requests waiting for an admission lane", labels=["lane"]
+        ),
+        "in_flight": GaugeMetricFamily(
+            "rag_admission_in_flight", "Capacity units currently held per lane", labels=["lane"]
+        ),
+        "rejected_total": GaugeMetricFamily(
+            "rag_admission_rejected", "Requests shed per lane since startup", labels=["lane"]
+        ),
+    }
+    for name, stats in get_admission_controller().stats().items():
+        for key, family in families.items():
+            family.add_metric([name], stats[key])
+    return list(families.values())
+
+
+register_gauges("admission", _admission_gauges)
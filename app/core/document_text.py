@@ -0,0 +1,80 @@
+"""
+The single stored copy of a document's text.
+
+With chunk_text_storage = "offsets", documents.content_compressed holds the
+preprocessed text once, zlib-compressed, and parent sections store only
+their (start_index, end_index) span into it. Retrieval fetches the texts it
+needs in one batch and keeps recently used ones decompressed, so resolving
+a passage or widening it to its neighbours is a slice.
+"""
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+from app.config import get_settings
+
+# Cache entries are keyed by document and text version, so a reprocessed
+# document never serves offsets into its old text
+TextKey = Tuple[str, str]
+
+
+def compress_text(text: str) -> bytes:
+    return zlib.compress(text.encode("utf-8"), 6)
+
+
+def decompress_text(data: Union[bytes, str]) -> str:
+    if isinstance(data, str):
+        # PostgREST returns bytea as hex text
+        data = bytes.fromhex(data[2:] if data.startswith("\\x") else data)
+    return zlib.decompress(data).decode("utf-8")
+
+
+def text_version(text: str) -> str:
+    """Short hash chunks record so readers can tell which text their offsets point into"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+
+
+class DocumentTextCache:
+    """Decompressed document texts, least recently used evicted past max_chars"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self._texts: "OrderedDict[TextKey, str]" = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: TextKey) -> Optional[str]:
+        with self._lock:
+            text = self._texts.get(key)
+            if text is not None:
+                self._texts.move_to_end(key)
+            return text
+
+    def get_many(self, keys: Iterable[TextKey]) -> Dict[TextKey, str]:
+        found = {}
+        for key in keys:
+            text = self.get(key)
+            if text is not None:
+                found[key] = text
+        return found
+
+    def put(self, key: TextKey, text: str) -> None:
+        if len(text) > self.max_chars:
+            return
+        with self._lock:
+            previous = self._texts.pop(key, None)
+            if previous is not None:
+                self._chars -= len(previous)
+            self._texts[key] = text
+            self._chars += len(text)
+            while self._chars > self.max_chars:
+                _, evicted = self._texts.popitem(last=False)
+                self._chars -= len(evicted)
+
+
+@lru_cache()
+def get_text_cache() -> DocumentTextCache:
+    return DocumentTextCache(get_settings().document_text_cache_chars)
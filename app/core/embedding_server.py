@@ -0,0 +1,395 @@
+"""
+Shared embedding server for multi-worker deployments.
+
+One process (or a small pool) owns the embedding model; API workers connect
+over a Unix socket. Each client hands the server a shared-memory segment
+split into fixed-size slots, and the server writes float32 vectors straight
+into the slot named in the request, so only texts and small JSON headers go
+over the socket. Requests from every connected worker are pooled into shared
+batches before they reach the model.
+
+    python -m app.core.embedding_server --processes 2
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.config import get_settings
+from app.core.embeddings import EmbeddingProvider
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct("!I")
+
+# Seconds before a lost server connection is dialled again
+_RECONNECT_DELAY = 1.0
+
+
+async def _send(writer: asyncio.StreamWriter, message: Dict) -> None:
+    payload = json.dumps(message).encode()
+    writer.write(_HEADER.pack(len(payload)) + payload)
+    await writer.drain()
+
+
+async def _recv(reader: asyncio.StreamReader) -> Dict:
+    (length,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return json.loads(await reader.readexactly(length))
+
+
+def socket_paths(base_path: str = None, processes: int = None) -> List[str]:
+    """Socket path for every server process in the pool"""
+    settings = get_settings()
+    base_path = base_path or settings.embedding_server_socket
+    processes = processes or settings.embedding_server_processes
+    if processes <= 1:
+        return [base_path]
+    return [f"{base_path}.{i}" for i in range(processes)]
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach to a client's segment without taking ownership of it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 registers attached segments with the resource tracker,
+        # which would unlink the client's memory when this process exits
+        from multiprocessing import resource_tracker
+
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class EmbeddingServer:
+    """Owns the model and batches embedding requests across connections"""
+
+    def __init__(
+        self,
+        provider: EmbeddingProvider,
+        max_batch_size: int = None,
+        batch_wait_ms: float = None,
+    ):
+        settings = get_settings()
+        self.provider = provider
+        self.max_batch_size = max_batch_size or settings.embedding_server_max_batch
+        self.batch_wait = (
+            batch_wait_ms if batch_wait_ms is not None else settings.embedding_server_batch_wait_ms
+        ) / 1000
+        self.dim = int(provider.encode_batch(["dimension probe"]).shape[1])
+        self._pending: asyncio.Queue = asyncio.Queue()
+
+    async def _batcher(self) -> None:
+        while True:
+            items = [await self._pending.get()]
+            total = len(items[0][0])
+            deadline = time.monotonic() + self.batch_wait
+            while total < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._pending.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                total += len(item[0])
+
+            texts = [text for item_texts, _ in items for text in item_texts]
+            try:
+                matrix = await asyncio.to_thread(self.provider.encode_batch, texts)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for item_texts, future in items:
+                if not future.done():
+                    future.set_result(matrix[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self._pending.put((texts, future))
+        return await future
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        shm: Optional[shared_memory.SharedMemory] = None
+        slots: Optional[np.ndarray] = None
+        tasks = set()
+
+        async def serve(message: Dict) -> None:
+            try:
+                vectors = await self.embed(message["texts"])
+                slots[message["slot"], :len(vectors)] = vectors
+                await _send(writer, {"id": message["id"], "rows": len(vectors)})
+            except Exception as e:
+                await _send(writer, {"id": message["id"], "error": str(e)})
+
+        try:
+            await _send(writer, {"type": "hello", "dim": self.dim})
+            while True:
+                message = await _recv(reader)
+                if message["type"] == "attach":
+                    shm = _attach_shared_memory(message["shm"])
+                    slots = np.ndarray(
+                        (message["slots"], message["slot_rows"], self.dim),
+                        dtype=np.float32,
+                        buffer=shm.buf,
+                    )
+                elif message["type"] == "embed":
+                    task = asyncio.create_task(serve(message))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            slots = None
+            if shm is not None:
+                shm.close()
+            writer.close()
+
+    async def serve_forever(self, path: str) -> None:
+        if os.path.exists(path):
+            os.unlink(path)
+        batcher = asyncio.create_task(self._batcher())
+        server = await asyncio.start_unix_server(self._handle, path=path)
+        logger.info(f"Embedding server listening on {path} (dim={self.dim})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+class EmbeddingServerClient(EmbeddingProvider):
+    """
+    Drop-in EmbeddingProvider that forwards to the shared embedding server.
+
+    Connections live on a private event loop thread so both the sync and the
+    async interface can be used from any thread. A lost connection fails
+    its pending requests, takes no new ones and is redialled on a later
+    request; with none left, requests fail instead of waiting.
+    """
+
+    def __init__(self, paths: List[str] = None, slots: int = None, slot_rows: int = None):
+        settings = get_settings()
+        self.paths = paths or socket_paths()
+        self.slot_count = slots or settings.embedding_server_slots
+        self.slot_rows = slot_rows or settings.embedding_server_slot_rows
+        self._ids = itertools.count()
+        self._connections: List[Dict] = []
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._call(self._connect_all())
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _connect_all(self) -> None:
+        for path in self.paths:
+            reader, writer = await asyncio.open_unix_connection(path)
+            hello = await _recv(reader)
+            dim = hello["dim"]
+            shm = shared_memory.SharedMemory(
+                create=True, size=self.slot_count * self.slot_rows * dim * 4
+            )
+            connection = {
+                "path": path,
+                "shm": shm,
+                "slots": np.ndarray((self.slot_count, self.slot_rows, dim), dtype=np.float32, buffer=shm.buf),
+                "free": asyncio.Queue(),
+                "waiters": {},
+                "in_flight": 0,
+            }
+            for slot in range(self.slot_count):
+                connection["free"].put_nowait(slot)
+            await self._attach(connection, reader, writer)
+            self._connections.append(connection)
+        self.dim = self._connections[0]["slots"].shape[2]
+
+    async def _attach(self, connection: Dict, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await _send(writer, {
+            "type": "attach",
+            "shm": connection["shm"].name,
+            "slots": self.slot_count,
+            "slot_rows": self.slot_rows,
+        })
+        connection.update(reader=reader, writer=writer, error=None)
+        connection["reader_task"] = asyncio.create_task(self._read_replies(connection))
+
+    async def _reconnect(self, connection: Dict) -> None:
+        """Dial a lost server again, reusing the connection's shared memory"""
+        connection["retry_at"] = self._loop.time() + _RECONNECT_DELAY
+        writer = None
+        try:
+            reader, writer = await asyncio.open_unix_connection(connection["path"])
+            hello = await _recv(reader)
+            if hello["dim"] != connection["slots"].shape[2]:
+                raise RuntimeError(f"server now has {hello['dim']} dimensions, not {connection['slots'].shape[2]}")
+            await self._attach(connection, reader, writer)
+            logger.info(f"Reconnected to embedding server at {connection['path']}")
+        except Exception as e:
+            if writer is not None:
+                writer.close()
+            logger.warning(f"Embedding server at {connection['path']} still unreachable: {e!r}")
+
+    async def _read_replies(self, connection: Dict) -> None:
+        error = RuntimeError("Embedding server connection closed")
+        try:
+            while True:
+                reply = await _recv(connection["reader"])
+                future = connection["waiters"].pop(reply["id"], None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Any failure here, not only a dropped socket, strands the waiters
+            error = RuntimeError(f"Embedding server connection lost: {e!r}")
+            logger.warning(f"{error}; requests go to the other servers until it is back")
+        finally:
+            connection["error"] = error
+            connection["retry_at"] = self._loop.time() + _RECONNECT_DELAY
+            connection["writer"].close()
+            for future in connection["waiters"].values():
+                if not future.done():
+                    future.set_exception(error)
+            connection["waiters"].clear()
+
+    async def _pick_connection(self) -> Dict:
+        now = self._loop.time()
+        for connection in self._connections:
+            if connection["error"] is not None and now >= connection["retry_at"]:
+                await self._reconnect(connection)
+        live = [connection for connection in self._connections if connection["error"] is None]
+        if not live:
+            raise RuntimeError(f"No embedding server reachable: {self._connections[0]['error']}")
+        return min(live, key=lambda c: c["in_flight"])
+
+    async def _embed_chunk(self, texts: List[str]) -> np.ndarray:
+        connection = await self._pick_connection()
+        slot = await connection["free"].get()
+        connection["in_flight"] += 1
+        request_id = next(self._ids)
+        try:
+            if connection["error"] is not None:
+                # Lost while this request waited for a slot
+                raise connection["error"]
+            future = self._loop.create_future()
+            connection["waiters"][request_id] = future
+            await _send(connection["writer"], {"type": "embed", "id": request_id, "slot": slot, "texts": texts})
+            reply = await future
+            if "error" in reply:
+                raise RuntimeError(f"Embedding server error: {reply['error']}")
+            # Copy out before the slot is reused
+            return connection["slots"][slot, :reply["rows"]].copy()
+        finally:
+            connection["waiters"].pop(request_id, None)
+            connection["in_flight"] -= 1
+            connection["free"].put_nowait(slot)
+
+    async def _embed(self, texts: List[str]) -> np.ndarray:
+        parts = await asyncio.gather(*[
+            self._embed_chunk(texts[i:i + self.slot_rows])
+            for i in range(0, len(texts), self.slot_rows)
+        ])
+        return np.vstack(parts)
+
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        return self._call(self._embed(list(texts)))
+
+    def warmup(self) -> None:
+        # Fails fast at startup if the server is unreachable
+        self.encode_batch(["warmup"])
+
+    def get_embedding(self, text: str) -> List[float]:
+        if isinstance(text, list):
+            return self.encode_batch(text).tolist()
+        return self.encode_batch([text])[0].tolist()
+
+    async def get_embeddings_batch(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
+        """Generate embeddings for multiple texts; batching happens server-side"""
+        if not texts:
+            return []
+        return (await self.get_embeddings_matrix(texts, batch_size)).tolist()
+
+    async def get_embeddings_matrix(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        future = asyncio.run_coroutine_threadsafe(self._embed(list(texts)), self._loop)
+        return await asyncio.wrap_future(future)
+
+    def close(self) -> None:
+        async def _close():
+            for connection in self._connections:
+                connection["reader_task"].cancel()
+                connection["writer"].close()
+        self._call(_close())
+        for connection in self._connections:
+            connection["slots"] = None
+            connection["shm"].close()
+            connection["shm"].unlink()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def _create_local_provider(backend: str) -> EmbeddingProvider:
+    if backend == "onnx":
+        from app.core.onnx_embeddings import OnnxRuntimeProvider
+        return OnnxRuntimeProvider()
+    from app.core.embeddings import SentenceTransformerProvider
+    return SentenceTransformerProvider()
+
+
+def run_server(path: str, backend: str) -> None:
+    logging.basicConfig(level=logging.INFO)
+    provider = _create_local_provider(backend)
+    provider.warmup()
+
+    async def main():
+        await EmbeddingServer(provider).serve_forever(path)
+
+    asyncio.run(main())
+
+
+def main():
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=settings.embedding_server_socket)
+    parser.add_argument("--processes", type=int, default=settings.embedding_server_processes)
+    parser.add_argument("--backend", default=settings.embedding_server_backend, choices=["torch", "onnx"])
+    args = parser.parse_args()
+
+    paths = socket_paths(args.socket, args.processes)
+    if len(paths) == 1:
+        run_server(paths[0], args.backend)
+        return
+
+    processes = [
+        multiprocessing.Process(target=run_server, args=(path, args.backend), daemon=False)
+        for path in paths
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
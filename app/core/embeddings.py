@@ -1,10 +1,16 @@
 from abc import ABC, abstractmethod
 from typing import List
-from sentence_transformers import SentenceTransformer
 from app.config import get_settings
+from app.core.model_registry import get_model_registry
 import asyncio
 import numpy as np
 
+WARMUP_TEXTS = [
+    "warmup",
+    "This agreement is governed by the laws of the jurisdiction stated below.",
+    "What are the termination conditions and notice periods in the contract?",
+] * 11
+
 class EmbeddingProvider(ABC):
     @abstractmethod
     def get_embedding(self, text: str) -> List[float]:
@@ -14,19 +20,58 @@ class EmbeddingProvider(ABC):
     async def get_embeddings_batch(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
         pass
 
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch synchronously and return a float32 matrix"""
+        return np.asarray(self.get_embedding(texts), dtype=np.float32)
+
+    async def get_embeddings_matrix(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """get_embeddings_batch as a float32 matrix, without a Python list per vector where the backend allows"""
+        return np.asarray(await self.get_embeddings_batch(texts, batch_size), dtype=np.float32)
+
+    def warmup(self) -> None:
+        """Run a representative batch so lazy kernels and tokenizers are initialized"""
+        pass
+
 class SentenceTransformerProvider(EmbeddingProvider):
-    def __init__(self):
+    def __init__(self, model_name: str = None):
+        # torch comes with it, so only processes that load the model pay for the import
+        from sentence_transformers import SentenceTransformer
+        
         settings = get_settings()
-        self.model = SentenceTransformer(settings.embedding_model)
+        self.model_name = model_name or settings.embedding_model
+        self.registry_key = f"sentence-transformers:{self.model_name}"
+        # Shared across every provider instance in the process
+        self.model = get_model_registry().get(
+            self.registry_key, lambda: SentenceTransformer(self.model_name)
+        )
+
+    def warmup(self) -> None:
+        get_model_registry().warmup(
+            self.registry_key,
+            lambda model: (
+                model.encode(WARMUP_TEXTS[0]),
+                model.encode(WARMUP_TEXTS, show_progress_bar=False, convert_to_numpy=True),
+            ),
+        )
     
     def get_embedding(self, text: str) -> List[float]:
         embedding = self.model.encode(text)
         return embedding.tolist()
+
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, show_progress_bar=False, convert_to_numpy=True).astype(
+            np.float32, copy=False
+        )
     
     async def get_embeddings_batch(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
         """Generate embeddings for multiple texts with batching"""
         if not texts:
             return []
+        return (await self.get_embeddings_matrix(texts, batch_size)).tolist()
+
+    async def get_embeddings_matrix(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
         
         async def process_batch(batch: List[str]) -> np.ndarray:
             return await asyncio.to_thread(
@@ -38,15 +83,25 @@ class SentenceTransformerProvider(EmbeddingProvider):
             )
         
         if len(texts) <= batch_size:
-            embeddings = await process_batch(texts)
-            return [emb.tolist() for emb in embeddings]
+            return (await process_batch(texts)).astype(np.float32, copy=False)
         
         # Process in batches
         batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
         batch_embeddings = await asyncio.gather(*[process_batch(batch) for batch in batches])
-        
-        # Combine all batches and convert to lists
-        all_embeddings = np.vstack(batch_embeddings)
-        return [emb.tolist() for emb in all_embeddings]
+        return np.vstack(batch_embeddings).astype(np.float32, copy=False)
 
-# different embedding models comparison in the future hence the factory design 
\ No newline at end of file
+# different embedding models comparison in the future hence the factory design
+def create_embedding_provider() -> EmbeddingProvider:
+    """Build the embedding provider selected in settings"""
+    backend = get_settings().embedding_backend
+    if backend == "server":
+        from app.core.embedding_server import EmbeddingServerClient
+        # One set of connections and shared-memory slots per worker
+        return get_model_registry().get("embedding-server-client", EmbeddingServerClient)
+    if backend == "onnx":
+        from app.core.onnx_embeddings import OnnxRuntimeProvider
+        return OnnxRuntimeProvider()
+    if backend != "torch":
+        raise ValueError(f"Unknown embedding_backend: {backend}")
+    return SentenceTransformerProvider()
+ 
\ No newline at end of file
@@ -0,0 +1,492 @@
+"""
+Memory-mappable snapshot of the chunk embedding index.
+
+Layout (little-endian):
+
+    "RAGSNAP1" | u32 format version | u32 header length | header JSON
+    sections, each 64-byte aligned, starting at HEADER_BLOCK
+
+The header holds the row count, dimension, graph degree, the creation
+time of the newest chunk included (high_water), the SHA-256 of everything
+after the header block and each section's [offset, nbytes]:
+
+    ids           count x 16-byte chunk UUIDs, sorted, so lookup is a binary search
+    vectors       count x dim float32, L2-normalized, in id order
+    graph         count x degree int32 nearest neighbours (-1 padded)
+    meta_offsets  count + 1 int64 offsets into meta
+    meta          JSON per chunk: document_id, chunk_index, metadata
+
+Opening maps the file read-only and every section is a zero-copy numpy
+view, so workers on one host share the pages through the OS page cache
+and opening costs only the header. A new snapshot replaces the old one by
+rename; get_index_snapshot notices the new file and remaps it, and until
+then a worker keeps its consistent old view.
+
+Chunks inserted after the snapshot are appended to a delta log next to it
+and searched exactly alongside the graph; deleted chunks are logged there
+as tombstones. The log is named after the snapshot's checksum
+(<path>.<sha256[:12]>.delta), so a worker still on the old snapshot never
+reads the new snapshot's log, or an empty one, as its own.
+"""
+import hashlib
+import heapq
+import json
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RAGSNAP1"
+DELTA_MAGIC = b"RAGDELT1"
+FORMAT_VERSION = 1
+HEADER_BLOCK = 4096
+_ALIGN = 64
+_PREFIX = struct.Struct("<8sII")
+_DELTA_HEADER = struct.Struct("<8sI")
+_DELTA_RECORD = struct.Struct("<16sdBI")  # id, epoch seconds, kind, metadata length
+_INSERTED, _DELETED = 0, 1
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+
+def _sha256_from(path: str, offset: int) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_graph(vectors: np.ndarray, graph: np.ndarray, block: int = 1024, column_block: int = 65536) -> None:
+    """
+    Fill `graph` with each row's nearest neighbours by cosine similarity.
+
+    Exact and quadratic in the row count, computed in blocks so memory
+    stays at block x column_block similarities; fine up to a few hundred
+    thousand chunks. Build with degree 0 beyond that to search exactly.
+    """
+    count, degree = graph.shape
+    for start in range(0, count, block):
+        rows = np.asarray(vectors[start:start + block])
+        best_sim = np.full((len(rows), 0), -np.inf, dtype=np.float32)
+        best_idx = np.zeros((len(rows), 0), dtype=np.int64)
+        own = np.arange(start, start + len(rows))
+        for column in range(0, count, column_block):
+            columns = np.asarray(vectors[column:column + column_block])
+            sims = rows @ columns.T
+            # No self-loops
+            inside = (own >= column) & (own < column + len(columns))
+            sims[np.nonzero(inside)[0], own[inside] - column] = -np.inf
+            sims = np.concatenate([best_sim, sims], axis=1)
+            idx = np.concatenate(
+                [best_idx, np.broadcast_to(np.arange(column, column + len(columns)), (len(rows), len(columns)))],
+                axis=1,
+            )
+            keep = min(degree, sims.shape[1])
+            top = np.argpartition(-sims, keep - 1, axis=1)[:, :keep]
+            best_sim = np.take_along_axis(sims, top, axis=1)
+            best_idx = np.take_along_axis(idx, top, axis=1)
+        order = np.argsort(-best_sim, axis=1)
+        neighbours = np.take_along_axis(best_idx, order, axis=1)
+        neighbours[np.take_along_axis(best_sim, order, axis=1) == -np.inf] = -1
+        graph[start:start + len(rows), :neighbours.shape[1]] = neighbours
+        graph[start:start + len(rows), neighbours.shape[1]:] = -1
+
+
+def write_snapshot(
+    path: str,
+    batches: Iterable[Tuple[List[UUID], np.ndarray, List[Dict[str, Any]]]],
+    count: int,
+    dim: int,
+    degree: int,
+    high_water: Optional[datetime],
+) -> Dict[str, Any]:
+    """
+    Write a snapshot from batches of (ids, vectors, metadata) in ascending id
+    order, totalling `count` rows. Vectors are streamed to disk, so memory
+    does not grow with the corpus. Returns the header.
+    """
+    sections = {}
+    offset = HEADER_BLOCK
+    for name, nbytes in (
+        ("ids", count * 16),
+        ("vectors", count * dim * 4),
+        ("graph", count * degree * 4),
+        ("meta_offsets", (count + 1) * 8),
+    ):
+        sections[name] = [offset, nbytes]
+        offset = _aligned(offset + nbytes)
+    meta_start = offset
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w+b") as f:
+            f.truncate(meta_start)
+            ids = np.memmap(f, dtype="S16", mode="r+", offset=sections["ids"][0], shape=(count,)) if count else None
+            vectors = np.memmap(f, dtype=np.float32, mode="r+", offset=sections["vectors"][0], shape=(count, dim)) if count else None
+            meta_offsets = np.zeros(count + 1, dtype=np.int64)
+
+            f.seek(meta_start)
+            row = 0
+            previous = b""
+            for batch_ids, batch_vectors, batch_meta in batches:
+                n = len(batch_ids)
+                if row + n > count:
+                    raise SnapshotError(f"More rows than the {count} announced")
+                raw = [chunk_id.bytes for chunk_id in batch_ids]
+                if raw and (raw[0] <= previous or any(a >= b for a, b in zip(raw, raw[1:]))):
+                    raise SnapshotError("Rows must arrive in ascending id order")
+                previous = raw[-1] if raw else previous
+                ids[row:row + n] = raw
+                vectors[row:row + n] = _normalize(np.asarray(batch_vectors, dtype=np.float32))
+                for i, meta in enumerate(batch_meta):
+                    f.write(json.dumps(meta, separators=(",", ":")).encode())
+                    meta_offsets[row + i + 1] = f.tell() - meta_start
+                row += n
+            if row != count:
+                raise SnapshotError(f"Expected {count} rows, got {row}")
+            sections["meta"] = [meta_start, int(meta_offsets[-1])]
+
+            if count and degree:
+                graph = np.memmap(f, dtype=np.int32, mode="r+", offset=sections["graph"][0], shape=(count, degree))
+                build_graph(vectors, graph)
+                graph.flush()
+            f.seek(sections["meta_offsets"][0])
+            f.write(meta_offsets.tobytes())
+            if count:
+                ids.flush()
+                vectors.flush()
+            f.flush()
+
+            header = {
+                "count": count,
+                "dim": dim,
+                "degree": degree,
+                "high_water": high_water.isoformat() if high_water else None,
+                "built_at": datetime.now().astimezone().isoformat(),
+                "sections": sections,
+                "sha256": _sha256_from(tmp, HEADER_BLOCK),
+            }
+            encoded = json.dumps(header).encode()
+            if _PREFIX.size + len(encoded) > HEADER_BLOCK:
+                raise SnapshotError("Header does not fit the header block")
+            f.seek(0)
+            f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(encoded)) + encoded)
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return header
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise SnapshotError(f"{path} is not an index snapshot")
+        magic, version, length = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path} is not an index snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"Snapshot format {version} is not supported (expected {FORMAT_VERSION})")
+        return json.loads(f.read(length))
+
+
+def delta_path(path: str, header: Dict[str, Any]) -> str:
+    """The delta log belonging to the snapshot with this header"""
+    return f"{path}.{header['sha256'][:12]}.delta"
+
+
+def _file_identity(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class DeltaLog:
+    """
+    Append-only log of changes since the snapshot: chunks inserted after its
+    high water mark, and tombstones for deleted chunks. Each append is one
+    O_APPEND write, so several workers can log deletions to the same file.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self.ids: List[str] = []
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.metadata: List[Dict[str, Any]] = []
+        self.deleted: set = set()
+        # Greatest (epoch seconds, chunk id) logged; catch-up continues after it
+        self.last_key: Optional[Tuple[float, str]] = None
+        self._size = 0
+
+    def _write(self, payload: bytes) -> None:
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND)
+            payload = _DELTA_HEADER.pack(DELTA_MAGIC, self.dim) + payload
+        except FileExistsError:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, payload)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def append(self, records: Sequence[Tuple[UUID, datetime, np.ndarray, Dict[str, Any]]]) -> None:
+        payload = []
+        for chunk_id, created_at, vector, meta in records:
+            encoded = json.dumps(meta, separators=(",", ":")).encode()
+            payload.append(_DELTA_RECORD.pack(chunk_id.bytes, created_at.timestamp(), _INSERTED, len(encoded)))
+            payload.append(_normalize(np.asarray(vector, dtype=np.float32)[None, :]).tobytes())
+            payload.append(encoded)
+        self._write(b"".join(payload))
+
+    def append_deletions(self, chunk_ids: Iterable[UUID], deleted_at: Optional[datetime] = None) -> None:
+        """Tombstones; the chunks drop out of lookups and search until the next rebuild"""
+        stamp = (deleted_at or datetime.now().astimezone()).timestamp()
+        self._write(b"".join(
+            _DELTA_RECORD.pack(UUID(str(chunk_id)).bytes, stamp, _DELETED, 0) for chunk_id in chunk_ids
+        ))
+
+    def reload(self) -> bool:
+        """Re-read the log if it grew; returns whether anything changed"""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            # Never written, or dropped by a rebuild: keep what was read
+            return False
+        if size == self._size:
+            return False
+        inserted: Dict[str, Tuple[np.ndarray, Dict[str, Any]]] = {}
+        deleted, last = set(), None
+        if size:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            magic, dim = _DELTA_HEADER.unpack_from(data)
+            if magic != DELTA_MAGIC or dim != self.dim:
+                raise SnapshotError(f"{self.path} does not belong to this snapshot")
+            position = _DELTA_HEADER.size
+            vector_bytes = self.dim * 4
+            while position + _DELTA_RECORD.size <= len(data):
+                raw_id, stamp, kind, meta_len = _DELTA_RECORD.unpack_from(data, position)
+                start = position + _DELTA_RECORD.size
+                end = start + (vector_bytes if kind == _INSERTED else 0) + meta_len
+                if end > len(data):
+                    break  # Torn final record from an interrupted append
+                chunk_id = str(UUID(bytes=raw_id))
+                if kind == _INSERTED:
+                    vector = np.frombuffer(data, np.float32, self.dim, start)
+                    inserted[chunk_id] = (vector, json.loads(data[start + vector_bytes:end]))
+                    last = max(last, (stamp, chunk_id)) if last else (stamp, chunk_id)
+                else:
+                    deleted.add(chunk_id)
+                    inserted.pop(chunk_id, None)
+                position = end
+        self.ids = list(inserted)
+        self.vectors = (
+            np.vstack([vector for vector, _ in inserted.values()])
+            if inserted else np.zeros((0, self.dim), dtype=np.float32)
+        )
+        self.metadata = [meta for _, meta in inserted.values()]
+        self.deleted = deleted
+        self.last_key = last
+        self._size = size
+        return True
+
+
+class IndexSnapshot:
+    def __init__(self, path: str, verify: bool = False):
+        self.path = path
+        self.header = read_header(path)
+        if verify and _sha256_from(path, HEADER_BLOCK) != self.header["sha256"]:
+            raise SnapshotError(f"Checksum mismatch in {path}")
+        self.count = self.header["count"]
+        self.dim = self.header["dim"]
+        self.degree = self.header["degree"]
+        high_water = self.header["high_water"]
+        self.high_water = datetime.fromisoformat(high_water) if high_water else None
+
+        self._file = open(path, "rb")
+        # A rebuild renames a new file over the path, which changes this
+        stat = os.fstat(self._file.fileno())
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        # mmap cannot map an empty region
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.ids = self._section("ids", "S16", (self.count,))
+        self.vectors = self._section("vectors", np.float32, (self.count, self.dim))
+        self.graph = self._section("graph", np.int32, (self.count, self.degree))
+        self.meta_offsets = self._section("meta_offsets", np.int64, (self.count + 1,))
+        self._meta_start = self.header["sections"]["meta"][0]
+        # Entry points spread over the id space (ids are random, so over the
+        # corpus too); a kNN graph falls apart into clusters, so the search
+        # starts from the entries nearest the query rather than a fixed one
+        entries = min(self.count, max(64, int(4 * np.sqrt(self.count))))
+        self._entries = np.unique(np.linspace(0, max(self.count - 1, 0), entries).astype(np.int64))
+        self.delta = DeltaLog(delta_path(path, self.header), self.dim)
+        self.delta.reload()
+
+    def _section(self, name: str, dtype, shape) -> np.ndarray:
+        offset, nbytes = self.header["sections"][name]
+        return np.frombuffer(self._map, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+
+    def close(self) -> None:
+        self.ids = self.vectors = self.graph = self.meta_offsets = None
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # Views handed out are still alive; the mapping goes with them
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.count + len(self.delta.ids)
+
+    def row_of(self, chunk_id: str) -> Optional[int]:
+        key = UUID(str(chunk_id)).bytes
+        row = int(np.searchsorted(self.ids, key))
+        if row < self.count and self.ids[row] == key.rstrip(b"\0"):
+            return row
+        return None
+
+    def chunk_id(self, row: int) -> str:
+        # "S16" views drop trailing zero bytes
+        return str(UUID(bytes=self.ids[row].ljust(16, b"\0")))
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        start, end = self.meta_offsets[row], self.meta_offsets[row + 1]
+        return json.loads(self._map[self._meta_start + start:self._meta_start + end])
+
+    def vectors_for(self, chunk_ids: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Normalized vectors for the given chunks; None for chunks it does not hold"""
+        self.delta.reload()
+        delta_rows = {chunk_id: i for i, chunk_id in enumerate(self.delta.ids)}
+        found = []
+        for chunk_id in chunk_ids:
+            row = self.row_of(chunk_id)
+            if str(chunk_id) in self.delta.deleted:
+                found.append(None)
+            elif row is not None:
+                found.append(self.vectors[row])
+            elif str(chunk_id) in delta_rows:
+                found.append(self.delta.vectors[delta_rows[str(chunk_id)]])
+            else:
+                found.append(None)
+        return found
+
+    def _graph_search(self, query: np.ndarray, ef: int) -> List[Tuple[float, int]]:
+        """Best-first search over the neighbour graph, keeping the ef best rows"""
+        sims = self.vectors[self._entries] @ query
+        nearest = np.argsort(-sims)[:ef]
+        entries, sims = self._entries[nearest], sims[nearest]
+        visited = set(self._entries.tolist())
+        frontier = [(-float(s), int(r)) for s, r in zip(sims, entries)]
+        heapq.heapify(frontier)
+        best = [(float(s), int(r)) for s, r in zip(sims, entries)]
+        heapq.heapify(best)
+        while len(best) > ef:
+            heapq.heappop(best)
+        while frontier:
+            negative, row = heapq.heappop(frontier)
+            if len(best) >= ef and -negative < best[0][0]:
+                break
+            neighbours = [n for n in self.graph[row].tolist() if n >= 0 and n not in visited]
+            if not neighbours:
+                continue
+            visited.update(neighbours)
+            for sim, neighbour in zip((self.vectors[neighbours] @ query).tolist(), neighbours):
+                if len(best) < ef or sim > best[0][0]:
+                    heapq.heappush(frontier, (-sim, neighbour))
+                    heapq.heappush(best, (sim, neighbour))
+                    if len(best) > ef:
+                        heapq.heappop(best)
+        return best
+
+    def search(self, query: Sequence[float], k: int = 10, ef: int = 64) -> List[Tuple[str, float]]:
+        """Nearest chunks by cosine similarity as (chunk id, similarity), best first"""
+        query = np.asarray(query, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        self.delta.reload()
+        # Look past the deleted chunks that would otherwise fill the results
+        wanted = k + len(self.delta.deleted)
+        results: List[Tuple[float, str]] = []
+        if self.count:
+            if self.degree:
+                hits = self._graph_search(query, max(ef, wanted))
+            else:
+                sims = self.vectors @ query
+                top = np.argpartition(-sims, min(wanted, self.count) - 1)[:wanted]
+                hits = [(float(sims[row]), int(row)) for row in top]
+            results = [(sim, self.chunk_id(row)) for sim, row in hits]
+            results = [(sim, chunk_id) for sim, chunk_id in results if chunk_id not in self.delta.deleted]
+
+        if self.delta.ids:
+            sims = self.delta.vectors @ query
+            results.extend((float(sim), chunk_id) for sim, chunk_id in zip(sims, self.delta.ids))
+        results.sort(reverse=True)
+        return [(chunk_id, sim) for sim, chunk_id in results[:k]]
+
+
+def record_deletions(chunk_ids: Sequence[Any]) -> None:
+    """Tombstone deleted chunks in the configured snapshot's delta log, if there is a snapshot"""
+    path = get_settings().index_snapshot_path
+    if not path or not chunk_ids or not os.path.exists(path):
+        return
+    header = read_header(path)
+    DeltaLog(delta_path(path, header), header["dim"]).append_deletions(chunk_ids)
+
+
+_snapshot: Optional[IndexSnapshot] = None
+_snapshot_lock = threading.Lock()
+_missing_logged = False
+
+
+def get_index_snapshot() -> Optional[IndexSnapshot]:
+    """
+    The snapshot configured in settings; None when disabled or not built
+    yet. Costs a stat per call, and remaps when a rebuild has replaced the
+    file, so call it from a thread.
+    """
+    global _snapshot, _missing_logged
+    path = get_settings().index_snapshot_path
+    if not path:
+        return None
+    try:
+        identity = _file_identity(path)
+    except FileNotFoundError:
+        if not _missing_logged:
+            logger.warning("Index snapshot %s not found; build it with python -m app.cli.index_snapshot build", path)
+            _missing_logged = True
+        return _snapshot
+    if _snapshot is not None and _snapshot.identity == identity:
+        return _snapshot
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.identity != identity:
+            # The old mapping is left to the views still using it
+            _snapshot = IndexSnapshot(path, verify=get_settings().index_snapshot_verify)
+            logger.info("Mapped index snapshot of %d chunks (%d in delta)", _snapshot.count, len(_snapshot.delta.ids))
+    return _snapshot
@@ -0,0 +1,184 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, Counter,
+                               Histogram, generate_latest)
+from prometheus_client.core import GaugeMetricFamily
+
+from app.config import get_settings
+
+# Stage timings for the current request, read by ServerTimingMiddleware
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "request_timings", default=None
+)
+
+_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds",
+    "Time spent in each hot-path stage",
+    ["pipeline", "stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_TTFT_SECONDS = Histogram(
+    "rag_llm_time_to_first_token_seconds",
+    "Time from opening the LLM stream to the first content delta",
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "rag_llm_tokens_per_second",
+    "Streaming rate after the first token (content deltas per second)",
+    buckets=(1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400),
+)
+LLM_TOKENS = Counter("rag_llm_stream_tokens_total", "Content deltas streamed from the LLM")
+COALESCED_REQUESTS = Counter(
+    "rag_coalesced_requests_total",
+    "Requests served by joining an identical in-flight operation",
+    ["operation"],
+)
+LLM_PROMPT_TOKENS = Counter(
+    "rag_llm_prompt_tokens_total",
+    "Prompt tokens sent to the LLM, by whether the provider served them from its prefix cache",
+    ["cache"],
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "rag_admission_wait_seconds",
+    "Time spent queued for an admission lane",
+    ["lane"],
+    buckets=_LATENCY_BUCKETS,
+)
+
+
+@lru_cache()
+def metrics_enabled() -> bool:
+    return get_settings().metrics_enabled
+
+
+@contextmanager
+def stage(pipeline: str, name: str) -> Iterator[None]:
+    """Time a block, record it in the stage histogram and the Server-Timing header"""
+    if not metrics_enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(pipeline, name).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((f"{pipeline}-{name}", elapsed))
+
+
+async def instrument_stream(stream: AsyncIterator[str]) -> AsyncIterator[str]:
+    """Record TTFT and token rate for an LLM stream as it is consumed"""
+    if not metrics_enabled():
+        async for item in stream:
+            yield item
+        return
+
+    start = time.perf_counter()
+    first_token_at = None
+    tokens = 0
+    try:
+        async for item in stream:
+            if item:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    LLM_TTFT_SECONDS.observe(first_token_at - start)
+                tokens += 1
+            yield item
+    finally:
+        if tokens:
+            LLM_TOKENS.inc(tokens)
+            duration = time.perf_counter() - first_token_at
+            if duration > 0 and tokens > 1:
+                LLM_TOKENS_PER_SECOND.observe((tokens - 1) / duration)
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware adding a Server-Timing header with per-stage durations"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics_enabled():
+            await self.app(scope, receive, send)
+            return
+
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                entries = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings]
+                entries.append(f"total;dur={(time.perf_counter() - start) * 1000:.1f}")
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", ", ".join(entries).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+
+
+class _CallbackCollector:
+    """Expose gauges computed on scrape from in-process stats"""
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], List[GaugeMetricFamily]]] = {}
+
+    def register(self, name: str, source: Callable[[], List[GaugeMetricFamily]]) -> None:
+        self._sources[name] = source
+
+    def collect(self):
+        for source in list(self._sources.values()):
+            yield from source()
+
+
+_collector = _CallbackCollector()
+REGISTRY.register(_collector)
+
+
+def register_gauges(name: str, source: Callable[[], List[GaugeMetricFamily]]) -> None:
+    """Register a callback producing gauge families on every scrape"""
+    _collector.register(name, source)
+
+
+_prompt_cache_tokens = {"hit": 0, "miss": 0}
+
+
+def record_prompt_cache(hit_tokens: int, miss_tokens: int) -> None:
+    if not metrics_enabled():
+        return
+    LLM_PROMPT_TOKENS.labels("hit").inc(hit_tokens)
+    LLM_PROMPT_TOKENS.labels("miss").inc(miss_tokens)
+    _prompt_cache_tokens["hit"] += hit_tokens
+    _prompt_cache_tokens["miss"] += miss_tokens
+
+
+def _prompt_cache_gauges() -> List[GaugeMetricFamily]:
+    total = _prompt_cache_tokens["hit"] + _prompt_cache_tokens["miss"]
+    family = GaugeMetricFamily(
+        "rag_llm_prompt_cache_hit_ratio",
+        "Share of prompt tokens served from the provider's prefix cache since startup",
+    )
+    family.add_metric([], _prompt_cache_tokens["hit"] / total if total else 0.0)
+    return [family]
+
+
+register_gauges("prompt_cache", _prompt_cache_gauges)
+
+
+def render_latest() -> Tuple[bytes, str]:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
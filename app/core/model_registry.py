@@ -0,0 +1,162 @@
+import gc
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from prometheus_client.core import GaugeMetricFamily
+
+from app.core.metrics import register_gauges
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process, 0 if it cannot be determined"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        import sys
+
+        # Peak rather than current RSS, but better than nothing on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+    except Exception:
+        return 0
+
+
+def _parameter_bytes(model: Any) -> Optional[int]:
+    """Size of the weights for torch-backed models"""
+    parameters = getattr(model, "parameters", None)
+    if not callable(parameters):
+        return None
+    try:
+        return sum(p.numel() * p.element_size() for p in parameters())
+    except Exception:
+        return None
+
+
+@dataclass
+class ModelInfo:
+    key: str
+    load_seconds: float
+    rss_delta_bytes: int
+    parameter_bytes: Optional[int] = None
+    warmup_seconds: Optional[float] = None
+    warmed_up: bool = False
+
+
+class ModelRegistry:
+    """
+    Process-wide registry that loads every model exactly once.
+
+    Loads are serialized per key, so concurrent callers asking for the same
+    model wait for the first load instead of starting their own.
+    """
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._info: Dict[str, ModelInfo] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        with self._registry_lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key: str, loader: Callable[[], Any]) -> Any:
+        """Return the model for `key`, calling `loader` only on first use"""
+        model = self._models.get(key)
+        if model is not None:
+            return model
+
+        with self._lock_for(key):
+            model = self._models.get(key)
+            if model is not None:
+                return model
+
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            model = loader()
+            load_seconds = time.perf_counter() - start
+
+            self._info[key] = ModelInfo(
+                key=key,
+                load_seconds=round(load_seconds, 3),
+                rss_delta_bytes=max(0, current_rss_bytes() - rss_before),
+                parameter_bytes=_parameter_bytes(model),
+            )
+            self._models[key] = model
+            logger.info(f"Loaded model {key} in {load_seconds:.2f}s")
+            return model
+
+    def is_loaded(self, key: str) -> bool:
+        return key in self._models
+
+    def release(self, key: str) -> bool:
+        """Drop a model loaded for a one-off job, such as an export, so its memory can be reclaimed"""
+        with self._lock_for(key):
+            model = self._models.pop(key, None)
+            self._info.pop(key, None)
+        if model is None:
+            return False
+        del model
+        gc.collect()
+        logger.info(f"Released model {key}")
+        return True
+
+    def warmup(self, key: str, fn: Callable[[Any], Any]) -> None:
+        """Run `fn(model)` once so the first real request skips lazy initialization"""
+        model = self._models[key]
+        start = time.perf_counter()
+        fn(model)
+        info = self._info[key]
+        info.warmup_seconds = round(time.perf_counter() - start, 3)
+        info.warmed_up = True
+
+    def mark_ready(self) -> None:
+        self._ready.set()
+
+    def mark_not_ready(self) -> None:
+        self._ready.clear()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "rss_bytes": current_rss_bytes(),
+            "models": {key: asdict(info) for key, info in self._info.items()},
+        }
+
+
+_registry = ModelRegistry()
+
+
+def get_model_registry() -> ModelRegistry:
+    return _registry
+
+
+def _model_gauges() -> List[GaugeMetricFamily]:
+    ready = GaugeMetricFamily("rag_ready", "1 once models are loaded and warmed up")
+    ready.add_metric([], 1 if _registry.ready else 0)
+    rss = GaugeMetricFamily("rag_process_rss_bytes", "Resident memory of this worker")
+    rss.add_metric([], current_rss_bytes())
+    load = GaugeMetricFamily("rag_model_load_seconds", "Model load time", labels=["model"])
+    memory = GaugeMetricFamily("rag_model_rss_delta_bytes", "RSS growth while loading", labels=["model"])
+    for key, info in list(_registry._info.items()):
+        load.add_metric([key], info.load_seconds)
+        memory.add_metric([key], info.rss_delta_bytes)
+    return [ready, rss, load, memory]
+
+
+register_gauges("models", _model_gauges)
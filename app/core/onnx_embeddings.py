@@ -0,0 +1,303 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import get_settings
+from app.core.embeddings import WARMUP_TEXTS, EmbeddingProvider
+from app.core.model_registry import get_model_registry
+
+logger = logging.getLogger(__name__)
+
+FP32_FILENAME = "model.onnx"
+INT8_FILENAME = "model.int8.onnx"
+POOLING_FILENAME = "pooling.json"
+PARITY_TEXTS = [
+    "The receiving party shall keep all confidential information strictly confidential.",
+    "Either party may terminate this agreement with thirty days written notice.",
+    "What is the duration of the internship?",
+    "Compensation is paid monthly in arrears.",
+    "¿Cuál es la ley aplicable al contrato?",
+]
+
+
+def _require_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise RuntimeError(
+            "embedding_backend='onnx' requires onnxruntime and onnx (pip install -r requirements-onnx.txt)"
+        ) from e
+    return onnxruntime
+
+
+def _model_dir(model_name: str, base_dir: Optional[str] = None) -> str:
+    base_dir = base_dir or get_settings().onnx_model_dir
+    return os.path.join(base_dir, model_name.replace("/", "__"))
+
+
+def _pooling_config(st_model) -> Dict[str, Any]:
+    """Read pooling/normalization from the SentenceTransformer module stack"""
+    config = {"mode": "mean", "normalize": False, "max_seq_length": st_model.max_seq_length}
+    for module in st_model:
+        name = type(module).__name__
+        if name == "Pooling":
+            if getattr(module, "pooling_mode_cls_token", False):
+                config["mode"] = "cls"
+            elif getattr(module, "pooling_mode_max_tokens", False):
+                config["mode"] = "max"
+        elif name == "Normalize":
+            config["normalize"] = True
+    return config
+
+
+def _encode(
+    session, tokenizer, pooling: Dict[str, Any], texts: List[str], input_names: Optional[set] = None,
+) -> np.ndarray:
+    """Run the exported transformer and pool its output like the SentenceTransformer did"""
+    encoded = tokenizer(
+        texts,
+        padding=True,
+        truncation=True,
+        max_length=pooling.get("max_seq_length") or 512,
+        return_tensors="np",
+    )
+    input_names = input_names or {i.name for i in session.get_inputs()}
+    feeds = {
+        name: encoded[name].astype(np.int64)
+        for name in input_names
+        if name in encoded
+    }
+    hidden = session.run(["last_hidden_state"], feeds)[0]
+    mask = encoded["attention_mask"].astype(np.float32)[..., None]
+
+    mode = pooling.get("mode", "mean")
+    if mode == "cls":
+        pooled = hidden[:, 0]
+    elif mode == "max":
+        pooled = np.where(mask > 0, hidden, -1e9).max(axis=1)
+    else:
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    if pooling.get("normalize"):
+        pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled.astype(np.float32, copy=False)
+
+
+def _min_cosine(candidate: np.ndarray, reference: np.ndarray, threshold: float) -> float:
+    """Minimum row-wise cosine similarity; raises ValueError below `threshold`"""
+    a = np.asarray(candidate, dtype=np.float32)
+    b = np.asarray(reference, dtype=np.float32)
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    min_cosine = float((a * b).sum(axis=1).min())
+    if min_cosine < threshold:
+        raise ValueError(
+            f"Embedding parity check failed: min cosine {min_cosine:.4f} < {threshold}"
+        )
+    return min_cosine
+
+
+def _verify_export(path: str, tokenizer, pooling: Dict[str, Any], reference, threshold: float) -> float:
+    """Parity of an exported model file against the SentenceTransformer it came from"""
+    ort = _require_onnxruntime()
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    candidate = _encode(session, tokenizer, pooling, PARITY_TEXTS)
+    expected = reference.encode(PARITY_TEXTS, convert_to_numpy=True, show_progress_bar=False)
+    return _min_cosine(candidate, expected, threshold)
+
+
+def export_onnx_model(
+    model_name: str,
+    output_dir: Optional[str] = None,
+    quantize: bool = True,
+    opset: int = 17,
+) -> str:
+    """
+    Export the transformer behind a SentenceTransformer to ONNX and
+    optionally write a dynamically int8-quantized copy next to it.
+
+    Each file is written under a temporary name and only takes its final
+    name once its embeddings match the SentenceTransformer's to within
+    onnx_parity_threshold; otherwise ValueError. A torch model loaded just
+    for the export is released from the registry afterwards.
+
+    Returns the directory holding the exported files.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    output_dir = output_dir or _model_dir(model_name)
+    os.makedirs(output_dir, exist_ok=True)
+    fp32_path = os.path.join(output_dir, FP32_FILENAME)
+    int8_path = os.path.join(output_dir, INT8_FILENAME)
+    if os.path.exists(fp32_path) and (not quantize or os.path.exists(int8_path)):
+        return output_dir
+
+    threshold = get_settings().onnx_parity_threshold
+    registry = get_model_registry()
+    key = f"sentence-transformers:{model_name}"
+    loaded_here = not registry.is_loaded(key)
+    st_model = registry.get(key, lambda: SentenceTransformer(model_name))
+    try:
+        _export(st_model, output_dir, quantize, opset, threshold)
+    finally:
+        if loaded_here:
+            # The API serves from the ONNX session; the torch copy is only a reference
+            registry.release(key)
+    return output_dir
+
+
+def _export(st_model, output_dir: str, quantize: bool, opset: int, threshold: float) -> None:
+    import torch
+
+    fp32_path = os.path.join(output_dir, FP32_FILENAME)
+    if not os.path.exists(fp32_path):
+        transformer = st_model[0]
+        tokenizer = transformer.tokenizer
+        auto_model = transformer.auto_model.eval()
+
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        pooling = _pooling_config(st_model)
+        tmp_path = fp32_path + ".tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                auto_model,
+                tuple(sample[name] for name in input_names),
+                tmp_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset,
+                do_constant_folding=True,
+            )
+        tokenizer.save_pretrained(output_dir)
+        with open(os.path.join(output_dir, POOLING_FILENAME), "w") as f:
+            json.dump(pooling, f)
+        # Last, so a model file is only ever there with its tokenizer and pooling
+        _accept(tmp_path, fp32_path, tokenizer, pooling, st_model, threshold)
+        logger.info(f"Exported the transformer to {fp32_path}")
+
+    int8_path = os.path.join(output_dir, INT8_FILENAME)
+    if quantize and not os.path.exists(int8_path):
+        _require_onnxruntime()
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        from transformers import AutoTokenizer
+
+        tmp_path = int8_path + ".tmp"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        with open(os.path.join(output_dir, POOLING_FILENAME)) as f:
+            pooling = json.load(f)
+        _accept(tmp_path, int8_path, AutoTokenizer.from_pretrained(output_dir), pooling, st_model, threshold)
+        logger.info(f"Wrote int8 model to {int8_path}")
+
+
+def _accept(tmp_path: str, path: str, tokenizer, pooling: Dict[str, Any], st_model, threshold: float) -> None:
+    """Give an exported file its final name if it passes the parity check, else delete it"""
+    try:
+        min_cosine = _verify_export(tmp_path, tokenizer, pooling, st_model, threshold)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    logger.info(f"{os.path.basename(path)} parity: min cosine {min_cosine:.4f}")
+
+
+class OnnxRuntimeProvider(EmbeddingProvider):
+    """CPU embedding through ONNX Runtime, optionally int8-quantized"""
+
+    def __init__(
+        self,
+        model_name: str = None,
+        quantize: bool = None,
+        intra_op_threads: int = None,
+    ):
+        settings = get_settings()
+        self.model_name = model_name or settings.embedding_model
+        self.quantize = settings.onnx_quantize if quantize is None else quantize
+        self.intra_op_threads = (
+            settings.onnx_intra_op_threads if intra_op_threads is None else intra_op_threads
+        )
+        variant = "int8" if self.quantize else "fp32"
+        self.registry_key = f"onnx:{self.model_name}:{variant}"
+        self.session, self.tokenizer, self.pooling = get_model_registry().get(
+            self.registry_key, self._load
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    def _load(self):
+        ort = _require_onnxruntime()
+        from transformers import AutoTokenizer
+
+        model_dir = export_onnx_model(self.model_name, quantize=self.quantize)
+        filename = INT8_FILENAME if self.quantize else FP32_FILENAME
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # One request at a time per session; parallelism comes from intra-op threads
+        options.inter_op_num_threads = 1
+        if self.intra_op_threads:
+            options.intra_op_num_threads = self.intra_op_threads
+
+        session = ort.InferenceSession(
+            os.path.join(model_dir, filename),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        with open(os.path.join(model_dir, POOLING_FILENAME)) as f:
+            pooling = json.load(f)
+        return session, tokenizer, pooling
+
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch and return a float32 matrix"""
+        return _encode(self.session, self.tokenizer, self.pooling, texts, self._input_names)
+
+    def get_embedding(self, text: str) -> List[float]:
+        if isinstance(text, list):
+            return self.encode_batch(text).tolist()
+        return self.encode_batch([text])[0].tolist()
+
+    async def get_embeddings_batch(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
+        """Generate embeddings for multiple texts with batching"""
+        if not texts:
+            return []
+        return (await self.get_embeddings_matrix(texts, batch_size)).tolist()
+
+    async def get_embeddings_matrix(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        # Sequential batches: the session already uses every intra-op thread
+        batches = []
+        for i in range(0, len(texts), batch_size):
+            batches.append(await asyncio.to_thread(self.encode_batch, texts[i:i + batch_size]))
+        return np.vstack(batches)
+
+    def warmup(self) -> None:
+        get_model_registry().warmup(
+            self.registry_key,
+            lambda _: (self.encode_batch(WARMUP_TEXTS[:1]), self.encode_batch(WARMUP_TEXTS)),
+        )
+
+
+def check_parity(
+    candidate: EmbeddingProvider,
+    reference: EmbeddingProvider,
+    texts: List[str] = None,
+    threshold: float = None,
+) -> float:
+    """
+    Compare two providers on the same texts and return the minimum cosine
+    similarity. Raises ValueError if it falls below `threshold`.
+    """
+    texts = texts or PARITY_TEXTS
+    threshold = get_settings().onnx_parity_threshold if threshold is None else threshold
+    return _min_cosine(candidate.get_embedding(texts), reference.get_embedding(texts), threshold)
@@ -0,0 +1,360 @@
+"""
+In-process statistical profiler and event-loop lag monitor.
+
+StackSampler snapshots every thread's stack from a background thread at a
+fixed interval (sys._current_frames), so the profiled code runs unmodified
+and the cost is one stack walk per thread per interval. Output is in
+collapsed-stack format ("frame;frame;frame count" per line), which
+flamegraph.pl, speedscope and inferno read directly.
+
+LoopLagMonitor runs a heartbeat task on the event loop; when a beat is
+late by more than a threshold, a watchdog thread has already captured the
+loop thread's stack mid-stall, so the report names the blocking callback.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+# Leaf frames of threads that are parked rather than working
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socketserver.py", "serve_forever"),
+}
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    return (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_LEAVES
+
+
+def stack_of(frame, max_depth: int = 128) -> List[str]:
+    """Frames from the outermost call to `frame`"""
+    stack = []
+    while frame is not None and len(stack) < max_depth:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class StackSampler:
+    """Sample the stacks of all threads but its own"""
+
+    def __init__(
+        self,
+        interval: float = 0.005,
+        include_idle: bool = False,
+        active: Optional[Callable[[], bool]] = None,
+    ):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.active = active  # Samples are only kept while this returns True
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._ignored: set = set()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def ignore_thread(self, ident: int) -> None:
+        self._ignored.add(ident)
+
+    def _sample(self) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident in self._ignored or (not self.include_idle and _is_idle(frame)):
+                continue
+            thread = names.get(ident, str(ident)).replace(";", ":").replace(" ", "_")
+            self.stacks[";".join([thread] + stack_of(frame))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        self._ignored.add(threading.get_ident())
+        while not self._stop.wait(self.interval):
+            if self.active is None or self.active():
+                self._sample()
+
+    def start(self) -> "StackSampler":
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+        return self
+
+    def collapsed(self) -> str:
+        # Spaces inside frame labels are fine; the count is the last field
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def top_frames(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Leaf frames by share of samples (self time)"""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [
+            {"frame": frame, "samples": count, "share": round(count / total, 4)}
+            for frame, count in leaves.most_common(limit)
+        ]
+
+
+@dataclass
+class LagEvent:
+    at: float  # Seconds since monitoring started
+    blocked_ms: float
+    stack: List[str]
+
+
+class LoopLagMonitor:
+    """Report every stretch in which the event loop was blocked longer than `threshold`"""
+
+    def __init__(self, threshold: float = 0.05, interval: float = 0.01):
+        self.threshold = threshold
+        self.interval = interval
+        self.events: List[LagEvent] = []
+        self.max_lag_ms = 0.0
+        self._loop_thread: Optional[int] = None
+        self._beat = 0.0
+        self._stall_stack: Optional[List[str]] = None
+        self._started_at = 0.0
+        self._stop = threading.Event()
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+
+    async def _run_heartbeat(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            self._beat = expected
+            await asyncio.sleep(self.interval)
+            lag = time.perf_counter() - expected
+            self.max_lag_ms = max(self.max_lag_ms, lag * 1000)
+            if lag > self.threshold:
+                self.events.append(LagEvent(
+                    at=round(expected - self._started_at, 3),
+                    blocked_ms=round(lag * 1000, 1),
+                    stack=self._stall_stack or ["<stack not captured>"],
+                ))
+            self._stall_stack = None
+
+    def _run_watchdog(self) -> None:
+        while not self._stop.wait(self.threshold / 2):
+            if self._stall_stack is None and time.perf_counter() - self._beat > self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    self._stall_stack = stack_of(frame)
+
+    def start(self) -> "LoopLagMonitor":
+        """Call from the event loop thread"""
+        self._loop_thread = threading.get_ident()
+        self._started_at = self._beat = time.perf_counter()
+        self._heartbeat = asyncio.get_running_loop().create_task(self._run_heartbeat())
+        self._watchdog = threading.Thread(target=self._run_watchdog, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        return self
+
+    def stop(self) -> "LoopLagMonitor":
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        if self._watchdog is not None:
+            self._watchdog.join()
+        return self
+
+    @property
+    def watchdog_ident(self) -> Optional[int]:
+        return self._watchdog.ident if self._watchdog else None
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "blocked": [event.__dict__ for event in sorted(self.events, key=lambda e: -e.blocked_ms)],
+        }
+
+
+@dataclass
+class ProfileSession:
+    """One capture: a fixed window, or the next `requests` requests on a route"""
+    id: str
+    mode: str  # "window" or "requests"
+    route: Optional[str] = None
+    requests: int = 0
+    interval: float = 0.005
+    lag_threshold: float = 0.05
+    status: str = "running"  # "armed", "running" or "done"
+    # Why a done session ended: "completed", "expired" or "cancelled"
+    ended: Optional[str] = None
+    # Request sessions end by then even if the route never gets `requests` calls
+    expires_at: Optional[float] = None
+    completed_requests: int = 0
+    active_requests: int = 0
+    sampler: Optional[StackSampler] = None
+    monitor: Optional[LoopLagMonitor] = None
+    created_at: float = field(default_factory=time.time)
+
+    def start(self) -> None:
+        self.sampler = StackSampler(
+            self.interval,
+            active=(lambda: self.active_requests > 0) if self.mode == "requests" else None,
+        )
+        self.monitor = LoopLagMonitor(self.lag_threshold).start()
+        self.sampler.ignore_thread(self.monitor.watchdog_ident)
+        self.sampler.start()
+        self.status = "running"
+
+    def finish(self, ended: str = "completed") -> None:
+        # An armed session that never saw its route has nothing to stop
+        if self.sampler is not None:
+            self.sampler.stop()
+            self.monitor.stop()
+        self.status = "done"
+        self.ended = ended
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {
+            "id": self.id,
+            "mode": self.mode,
+            "route": self.route,
+            "status": self.status,
+            "ended": self.ended,
+            "requests": self.requests,
+            "completed_requests": self.completed_requests,
+        }
+        if self.expires_at is not None and self.status != "done":
+            summary["expires_in_seconds"] = max(0.0, round(self.expires_at - time.time(), 1))
+        if self.status == "done" and self.sampler is not None:
+            summary.update(
+                duration_seconds=round(self.sampler.duration, 3),
+                samples=self.sampler.samples,
+                interval_ms=self.interval * 1000,
+                top_frames=self.sampler.top_frames(),
+                loop_lag=self.monitor.report(),
+            )
+        return summary
+
+
+class Profiler:
+    """Runs one profile session at a time and keeps the last few results"""
+
+    def __init__(self, keep: int = 10):
+        self.keep = keep
+        self.sessions: Dict[str, ProfileSession] = {}
+        self.current: Optional[ProfileSession] = None
+
+    def expire(self) -> None:
+        """End the current request session if its time ran out, keeping what it sampled"""
+        session = self.current
+        if (
+            session is not None and session.status != "done"
+            and session.expires_at is not None and time.time() >= session.expires_at
+        ):
+            session.finish("expired")
+
+    def cancel(self, profile_id: str) -> ProfileSession:
+        session = self.sessions[profile_id]
+        if session.mode != "requests":
+            raise RuntimeError(f"Profile {profile_id} samples a fixed window and ends by itself")
+        if session.status != "done":
+            session.finish("cancelled")
+        return session
+
+    def _new_session(self, **kwargs) -> ProfileSession:
+        self.expire()
+        if self.current is not None and self.current.status != "done":
+            raise RuntimeError(f"Profile {self.current.id} is still {self.current.status}")
+        session = ProfileSession(id=uuid.uuid4().hex[:12], **kwargs)
+        self.sessions[session.id] = session
+        for stale in list(self.sessions)[:-self.keep]:
+            del self.sessions[stale]
+        self.current = session
+        return session
+
+    async def sample(self, seconds: float, interval: float, lag_threshold: float) -> ProfileSession:
+        session = self._new_session(mode="window", interval=interval, lag_threshold=lag_threshold)
+        session.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            session.finish()
+        return session
+
+    def arm(
+        self, route: str, requests: int, interval: float, lag_threshold: float, timeout: float,
+    ) -> ProfileSession:
+        """Profile the next `requests` requests to `route`, for at most `timeout` seconds"""
+        session = self._new_session(
+            mode="requests", route=route, requests=requests,
+            interval=interval, lag_threshold=lag_threshold,
+        )
+        session.expires_at = session.created_at + timeout
+        session.status = "armed"
+        return session
+
+    def request_started(self, path: str) -> Optional[ProfileSession]:
+        """Called by the middleware; returns the session tracking this request, if any"""
+        self.expire()
+        session = self.current
+        if session is None or session.mode != "requests" or session.status == "done":
+            return None
+        if path != session.route or session.completed_requests + session.active_requests >= session.requests:
+            return None
+        if session.status == "armed":
+            session.start()
+        session.active_requests += 1
+        return session
+
+    def request_finished(self, session: ProfileSession) -> None:
+        session.active_requests -= 1
+        session.completed_requests += 1
+        if session.completed_requests >= session.requests and session.status != "done":
+            session.finish()
+
+
+@lru_cache()
+def get_profiler() -> Profiler:
+    return Profiler()
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that feeds requests on an armed route into the profiler"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profiler = get_profiler()
+        session = profiler.request_started(scope["path"])
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+        # Finished once the body is fully sent, so streamed responses count in full
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.request_finished(session)
@@ -0,0 +1,158 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Models trained so that a prefix of the embedding is itself a usable
+# embedding; for these the projection is plain truncation
+MATRYOSHKA_MODELS = (
+    "nomic-ai/nomic-embed-text-v1.5",
+    "mixedbread-ai/mxbai-embed-large-v1",
+    "Alibaba-NLP/gte-large-en-v1.5",
+    "Snowflake/snowflake-arctic-embed-m-v1.5",
+)
+
+
+def default_method(model_name: str) -> str:
+    return "truncate" if model_name in MATRYOSHKA_MODELS else "pca"
+
+
+class Projection:
+    """
+    Maps full embeddings to a reduced dimension for first-stage search.
+
+    "truncate" keeps the leading dimensions (Matryoshka models); "pca"
+    projects onto the top principal components of the corpus. Outputs are
+    L2-normalized so cosine distance stays meaningful. `version` identifies
+    the fitted parameters; chunks store it next to their reduced vector so
+    search only compares vectors from the same projection.
+    """
+
+    def __init__(
+        self,
+        method: str,
+        dim: int,
+        mean: Optional[np.ndarray] = None,
+        components: Optional[np.ndarray] = None,
+    ):
+        if method not in ("truncate", "pca"):
+            raise ValueError(f"Unknown projection method {method}")
+        if method == "pca" and (mean is None or components is None):
+            raise ValueError("A PCA projection needs a mean and components")
+        self.method = method
+        self.dim = dim
+        self.mean = mean
+        self.components = components
+        digest = hashlib.sha256(f"{method}:{dim}".encode())
+        if method == "pca":
+            digest.update(np.ascontiguousarray(mean, dtype=np.float32).tobytes())
+            digest.update(np.ascontiguousarray(components, dtype=np.float32).tobytes())
+        self.version = digest.hexdigest()[:12]
+
+    @classmethod
+    def truncation(cls, dim: int) -> "Projection":
+        return cls("truncate", dim)
+
+    @classmethod
+    def fit_pca(cls, matrix: np.ndarray, dim: int) -> "Projection":
+        """Fit on an (n, d) sample of corpus embeddings"""
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if dim > matrix.shape[1]:
+            raise ValueError(f"Cannot project {matrix.shape[1]} dimensions to {dim}")
+        mean = matrix.mean(axis=0)
+        centered = matrix - mean
+        # Eigenvectors of the d x d covariance: cheaper than an SVD of the sample
+        eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+        top = np.argsort(eigenvalues)[::-1][:dim]
+        return cls(
+            "pca",
+            dim,
+            mean=mean.astype(np.float32),
+            components=eigenvectors[:, top].T.astype(np.float32),
+        )
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.method == "truncate":
+            reduced = vectors[..., :self.dim]
+        else:
+            reduced = (vectors - self.mean) @ self.components.T
+        norms = np.linalg.norm(reduced, axis=-1, keepdims=True)
+        return reduced / np.clip(norms, 1e-12, None)
+
+    def save(self, path: str) -> None:
+        """Replaces the file by rename, so a worker reloading it never reads half a projection"""
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        arrays = {"method": np.array(self.method), "dim": np.array(self.dim)}
+        if self.method == "pca":
+            arrays.update(mean=self.mean, components=self.components)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "Projection":
+        with np.load(path) as data:
+            method = str(data["method"])
+            return cls(
+                method,
+                int(data["dim"]),
+                mean=data["mean"] if method == "pca" else None,
+                components=data["components"] if method == "pca" else None,
+            )
+
+
+_loaded: Optional[Tuple[Tuple[int, int], Projection]] = None
+_load_lock = threading.Lock()
+_missing_logged = False
+
+
+def get_projection() -> Optional[Projection]:
+    """
+    The persisted projection, or None when two-stage search is off. Reloaded
+    when app.cli.fit_projection replaces the file, at the cost of a stat
+    per call.
+    """
+    global _loaded, _missing_logged
+    settings = get_settings()
+    if not settings.search_reduced_dim:
+        return None
+    path = settings.search_projection_path
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        if not _missing_logged:
+            logger.warning(
+                f"Two-stage search is enabled but {path} does not exist; "
+                "run python -m app.cli.fit_projection. Searching full vectors only"
+            )
+            _missing_logged = True
+        return None
+    identity = (stat.st_ino, stat.st_mtime_ns)
+    if _loaded is not None and _loaded[0] == identity:
+        return _loaded[1]
+    with _load_lock:
+        if _loaded is None or _loaded[0] != identity:
+            projection = Projection.load(path)
+            if projection.dim != settings.search_reduced_dim:
+                logger.warning(
+                    f"Projection in {path} has {projection.dim} dimensions, "
+                    f"search_reduced_dim is {settings.search_reduced_dim}; using the file"
+                )
+            logger.info(f"Loaded projection {projection.version} from {path}")
+            _loaded = (identity, projection)
+    return _loaded[1]
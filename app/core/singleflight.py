@@ -0,0 +1,163 @@
+import asyncio
+from typing import (Any, AsyncIterator, Awaitable, Callable, Dict, Generic,
+                    Hashable, List, Optional, Tuple, TypeVar)
+
+from app.core.metrics import COALESCED_REQUESTS
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    Run at most one call per key at a time; concurrent callers with the same
+    key await the call that is already in flight instead of starting their own.
+
+    The call runs as its own task, so a caller that disconnects does not
+    cancel it for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        else:
+            COALESCED_REQUESTS.labels(self.name).inc()
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved; every caller already got it
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+
+class StreamBroadcast:
+    """
+    Fan one async stream out to any number of subscribers.
+
+    The source is drained by a background task into a buffer; each
+    subscriber replays the buffer from the start and then follows along,
+    so late joiners see the whole stream. A failure of the source is
+    raised in every subscriber. Once every subscriber has left, the source
+    is cancelled and closed rather than read to the end for nobody.
+    """
+
+    def __init__(self, source: AsyncIterator[Any]):
+        self._items: List[Any] = []
+        self._error: Optional[BaseException] = None
+        self._done = False
+        self._subscribers = 0
+        self._abandoned = False
+        self._changed = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async for item in source:
+                self._items.append(item)
+                self._notify()
+        except BaseException as e:
+            self._error = e
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        finally:
+            self._done = True
+            self._notify()
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    @property
+    def abandoned(self) -> bool:
+        """Cancelled because every subscriber left; not for new subscribers"""
+        return self._abandoned
+
+    def add_done_callback(self, fn: Callable[[], None]) -> None:
+        self._task.add_done_callback(lambda _: fn())
+
+    def subscribe(self) -> AsyncIterator[Any]:
+        # Counted from now, not from the first read, so a subscriber whose
+        # response has not started yet keeps the stream alive
+        self._subscribers += 1
+        return self._follow()
+
+    async def _follow(self) -> AsyncIterator[Any]:
+        position = 0
+        try:
+            while True:
+                changed = self._changed
+                while position < len(self._items):
+                    yield self._items[position]
+                    position += 1
+                if self._done:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                await changed.wait()
+        finally:
+            self._subscribers -= 1
+            if self._subscribers == 0 and not self._done:
+                self._abandoned = True
+                self._task.cancel()
+
+
+class BroadcastFlight:
+    """
+    SingleFlight for streams. The first caller opens the stream; anyone
+    asking for the same key until the stream ends subscribes to it instead,
+    replaying whatever has already been produced. A stream every subscriber
+    has left is cancelled, and the next caller opens a new one.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._opening: SingleFlight[StreamBroadcast] = SingleFlight(name)
+        self._live: Dict[Hashable, StreamBroadcast] = {}
+
+    async def subscribe(
+        self, key: Hashable, open_stream: Callable[[], Awaitable[AsyncIterator[Any]]]
+    ) -> AsyncIterator[Any]:
+        broadcast = self._live.get(key)
+        if broadcast is not None and not broadcast.abandoned:
+            COALESCED_REQUESTS.labels(self.name).inc()
+        else:
+            broadcast = await self._opening.do(key, lambda: self._open(key, open_stream))
+        return broadcast.subscribe()
+
+    async def _open(
+        self, key: Hashable, open_stream: Callable[[], Awaitable[AsyncIterator[Any]]]
+    ) -> StreamBroadcast:
+        broadcast = StreamBroadcast(await open_stream())
+        self._live[key] = broadcast
+
+        def forget():
+            if self._live.get(key) is broadcast:
+                del self._live[key]
+
+        broadcast.add_done_callback(forget)
+        return broadcast
+
+    def in_flight(self) -> int:
+        return len(self._live) + self._opening.in_flight()
+
+
+def flight_key(query: str, *scope: Any) -> Tuple:
+    """Case- and whitespace-insensitive key for a query and anything that narrows it"""
+    return (" ".join(query.lower().split()), *scope)
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+TABLE = "document_chunks"
+
+
+class ChunkTableMaintenance:
+    """
+    VACUUM (and reindex the ANN indexes of) document_chunks once deletes
+    have left too many dead tuples behind.
+
+    Runs as a background task in this process, at most one at a time and
+    no more often than maintenance_min_interval, so a burst of deletes
+    schedules one pass. When the table is partitioned by owner, each
+    partition is judged and maintained on its own, so deletes by one owner
+    only cost a pass over that owner's partition.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._last_run = 0.0
+
+    async def dead_tuple_ratios(self, engine) -> Dict[str, float]:
+        """Dead-tuple ratio per leaf relation: the partitions, or the table itself"""
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(
+                    "SELECT s.relname, s.n_live_tup, s.n_dead_tup "
+                    "FROM pg_partition_tree(CAST(:table AS regclass)) t "
+                    "JOIN pg_stat_user_tables s ON s.relid = t.relid WHERE t.isleaf"
+                ),
+                {"table": TABLE},
+            )
+            rows = result.all()
+        return {
+            row.relname: row.n_dead_tup / (row.n_live_tup + row.n_dead_tup)
+            for row in rows
+            if row.n_live_tup + row.n_dead_tup
+        }
+
+    async def _ann_indexes(self, conn, relation: str) -> List[str]:
+        result = await conn.execute(
+            text(
+                "SELECT indexname FROM pg_indexes WHERE tablename = :table "
+                "AND (indexdef ILIKE '%USING hnsw%' OR indexdef ILIKE '%USING ivfflat%')"
+            ),
+            {"table": relation},
+        )
+        return [row.indexname for row in result]
+
+    async def run(self, engine, relations: Optional[List[str]] = None) -> None:
+        settings = get_settings()
+        relations = relations or [TABLE]
+        # VACUUM and REINDEX CONCURRENTLY refuse to run inside a transaction
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            started = time.perf_counter()
+            reindexed = []
+            for relation in relations:
+                await conn.execute(text(f'VACUUM (ANALYZE) "{relation}"'))
+                if settings.maintenance_reindex:
+                    for index in await self._ann_indexes(conn, relation):
+                        await conn.execute(text(f'REINDEX INDEX CONCURRENTLY "{index}"'))
+                        reindexed.append(index)
+        logger.info(
+            "Vacuumed %s%s in %.1fs", ", ".join(relations),
+            f" and reindexed {', '.join(reindexed)}" if reindexed else "",
+            time.perf_counter() - started,
+        )
+
+    async def _check_and_run(self, engine) -> None:
+        try:
+            threshold = get_settings().maintenance_dead_tuple_ratio
+            due = {
+                relation: ratio
+                for relation, ratio in (await self.dead_tuple_ratios(engine)).items()
+                if ratio >= threshold
+            }
+            if not due:
+                return
+            logger.info(
+                "Running maintenance for dead tuples in %s",
+                ", ".join(f"{relation} ({ratio:.0%})" for relation, ratio in due.items()),
+            )
+            self._last_run = time.monotonic()
+            await self.run(engine, sorted(due))
+        except Exception:
+            logger.exception("Index maintenance failed")
+
+    def schedule(self, engine=None) -> Optional[asyncio.Task]:
+        """Check the dead-tuple ratio in the background after a delete; returns the task if one started"""
+        if self._task is not None and not self._task.done():
+            return None
+        if time.monotonic() - self._last_run < get_settings().maintenance_min_interval:
+            return None
+        if engine is None:
+            from app.db.session import get_engine
+            engine = get_engine()
+        self._task = asyncio.get_running_loop().create_task(self._check_and_run(engine))
+        return self._task
+
+
+@lru_cache()
+def get_maintenance() -> ChunkTableMaintenance:
+    return ChunkTableMaintenance()
@@ -0,0 +1,27 @@
+import logging
+import os
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from alembic.config import Config
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def alembic_config() -> "Config":
+    # Imported here: most processes start without running migrations
+    from alembic.config import Config
+
+    config = Config(os.path.join(PROJECT_ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(PROJECT_ROOT, "migrations"))
+    return config
+
+
+def run_migrations(revision: str = "head") -> None:
+    """Bring the schema up to date; blocking, so call it off the event loop"""
+    from alembic import command
+
+    logger.info(f"Upgrading database schema to {revision}")
+    command.upgrade(alembic_config(), revision)
@@ -1,9 +1,60 @@
-# boilerplate code for the database session
+    # boilerplate code for the database session
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from functools import lru_cache
+from typing import List
+
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.config import get_settings
+from app.core.metrics import register_gauges
+
+
+@lru_cache()
+def get_engine() -> AsyncEngine:
+    """The process-wide engine, built on first use rather than at import"""
+    settings = get_settings()
+    return create_async_engine(
+        settings.supabase_db_url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        # Compiled SQL for the hot queries is reused instead of recompiled per request
+        query_cache_size=settings.db_query_cache_size,
+        connect_args={
+            # Prepared statements cached per connection by the asyncpg adapter;
+            # set to 0 behind a transaction-mode pooler such as pgbouncer
+            "prepared_statement_cache_size": settings.db_prepared_statement_cache_size,
+        },
+    )
+
+
+@lru_cache()
+def _session_factory() -> sessionmaker:
+    return sessionmaker(get_engine(), class_=AsyncSession, expire_on_commit=False)
+
+
+def async_session() -> AsyncSession:
+    return _session_factory()()
+
+
+def _pool_gauges() -> List[GaugeMetricFamily]:
+    if not get_engine.cache_info().currsize:
+        return []  # Nothing has connected yet
+    pool = get_engine().sync_engine.pool
+    families = []
+    for name, description, value in (
+        ("rag_db_pool_size", "Configured connection pool size", pool.size()),
+        ("rag_db_pool_checked_out", "Connections currently in use", pool.checkedout()),
+        ("rag_db_pool_checked_in", "Idle connections in the pool", pool.checkedin()),
+        ("rag_db_pool_overflow", "Connections opened beyond pool_size", max(0, pool.overflow())),
+    ):
+        family = GaugeMetricFamily(name, description)
+        family.add_metric([], value)
+        families.append(family)
+    return families
+
 
-settings = get_settings()
-engine = create_async_engine(settings.supabase_db_url)
-async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False) 
\ No newline at end of file
+register_gauges("db_pool", _pool_gauges)
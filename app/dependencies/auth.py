@@ -1,9 +1,9 @@
+from app.core.metrics import stage
 from app.supabase_client.supabase_client import supabase_client
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional, Dict, Any
 
-supabase = supabase_client()
 security = HTTPBearer()
 
 async def get_current_user(
@@ -15,7 +15,8 @@ async def get_current_user(
     """
     token = credentials.credentials
     try:
-        user_response = supabase.auth.get_user(token)
+        with stage("request", "auth"):
+            user_response = supabase_client().auth.get_user(token)
         if not user_response or not user_response.user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -52,6 +53,20 @@ async def get_current_user_id(
     """
     return current_user["id"]
 
+async def require_admin(
+    current_user: Dict[str, Any] = Depends(get_current_user)
+) -> Dict[str, Any]:
+    """
+    Dependency for admin-only routes.
+    Admins carry role "admin" in their app_metadata, which only the service key can set.
+    """
+    if current_user["app_metadata"].get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
+    return current_user
+
 # Legacy support - remove once migration is complete
 class AuthDependency:
     @staticmethod
@@ -1,6 +1,6 @@
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.embeddings import EmbeddingProvider, SentenceTransformerProvider
+from app.core.embeddings import EmbeddingProvider, create_embedding_provider
 from app.core.storage import StorageProvider, PostgresVectorStore
 from .db import get_db
 
@@ -8,8 +8,9 @@ def get_embedding_provider() -> EmbeddingProvider:
     """Get embedding provider instance from app state (loaded at startup)"""
     from app.main import app_state
     if "embedding_provider" not in app_state:
-        # Fallback to lazy loading if not in app state (e.g., during testing)
-        return SentenceTransformerProvider()
+        # Outside the lifespan (e.g., during testing); the model registry makes
+        # sure the weights are still only loaded once per process
+        app_state["embedding_provider"] = create_embedding_provider()
     return app_state["embedding_provider"]
 
 def get_storage_provider(
@@ -1,5 +1,6 @@
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.indexing.checkpoints import get_checkpoint_store
 from app.services.indexing.document_service import DocumentService
 from app.services.retrieval.retrieval_generation_service import RetrievalGenerationService
 from app.services.interfaces.document_service import IDocumentService
@@ -17,7 +18,8 @@ async def get_document_service(
     return DocumentService(
         db=db,
         embedding_provider=embedding_provider,
-        storage_provider=storage_provider
+        storage_provider=storage_provider,
+        checkpoint_store=get_checkpoint_store(),
     )
 
 async def get_rag_service(
@@ -1,13 +1,25 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.api.routes import *
-from app.core.embeddings import SentenceTransformerProvider
-from app.dependencies.auth import auth
+from app.core.admission import AdmissionRejected
+from app.core.embeddings import create_embedding_provider
+from app.core.index_snapshot import get_index_snapshot
+from app.core.metrics import ServerTimingMiddleware
+from app.core.model_registry import get_model_registry
+from app.core.profiling import ProfilingMiddleware
+from app.config import get_settings
+from app.db.migrations import run_migrations
+from app.db.session import get_engine
+from app.dependencies.auth import auth, require_admin
+from app.services.indexing.checkpoints import run_checkpoint_cleanup
+from app.supabase_client.supabase_client import supabase_client
 
 load_dotenv()
 
@@ -17,10 +29,28 @@ app_state = {}
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Load heavy models at startup"""
-    app_state["embedding_provider"] = SentenceTransformerProvider()
+    registry = get_model_registry()
+    if get_settings().db_migrate_on_startup:
+        # Schema is managed here once, not per request
+        await asyncio.to_thread(run_migrations)
+    provider = await asyncio.to_thread(create_embedding_provider)
+    await asyncio.to_thread(provider.warmup)
+    app_state["embedding_provider"] = provider
+    # Clients are no longer built at import; build them before the first request
+    await asyncio.to_thread(supabase_client)
+    get_engine()
+    # Map the index snapshot now rather than on the first query
+    await asyncio.to_thread(get_index_snapshot)
+    # Readiness only flips once the first real request won't pay for warmup
+    registry.mark_ready()
+    # Expire checkpoints of ingestion jobs that were never retried
+    cleanup = asyncio.create_task(run_checkpoint_cleanup())
     yield
     # Clean up
+    cleanup.cancel()
+    registry.mark_not_ready()
     app_state.clear()
+    await get_engine().dispose()
 
 app = FastAPI(lifespan=lifespan)
 app.add_middleware(
@@ -30,6 +60,28 @@ app.add_middleware(
     allow_headers=["*"],
     allow_credentials=True,
 )
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Shed load fast instead of letting latency grow without bound"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": f"Server busy ({exc.lane}): {exc.reason}"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+app.include_router(
+    metrics_router,
+    tags=["metrics"]
+)
+
+app.include_router(
+    health_router,
+    prefix="/health",
+    tags=["health"]
+)
 
 app.include_router(
     auth_router,
@@ -38,6 +90,13 @@ app.include_router(
 )
 
 # Protected routes
+app.include_router(
+    profiling_router,
+    prefix="/admin/profile",
+    tags=["admin"],
+    dependencies=[Depends(require_admin)]
+)
+
 app.include_router(
     upload_router,
     prefix="/upload",
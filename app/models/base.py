@@ -1,14 +1,4 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
-from app.config import get_settings
-
-Base = declarative_base()
-
-# Use settings for database configuration
-settings = get_settings()
-DATABASE_URL = settings.supabase_db_url
-
-engine = create_async_engine(DATABASE_URL, echo=True)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
\ No newline at end of file
+# The engine and sessions live in app.db.session; schema changes go through Alembic
+Base = declarative_base()
\ No newline at end of file
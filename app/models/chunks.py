@@ -3,9 +3,10 @@ from datetime import UTC, datetime
 from typing import Dict, List
 
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, Text
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy import (JSON, Column, Computed, DateTime, ForeignKey, Index,
+                        Integer, Text, text)
+from sqlalchemy.dialects.postgresql import REGCONFIG, TSVECTOR, UUID
+from sqlalchemy.orm import Mapped, deferred, relationship
 
 from .base import Base
 from .documents import Document
@@ -14,14 +15,49 @@ from .documents import Document
 # New table for individual chunks
 class DocumentChunk(Base):
     __tablename__ = 'document_chunks'
+    __table_args__ = (
+        Index("ix_document_chunks_document_id", "document_id", "chunk_index"),
+        Index("ix_document_chunks_parent_id", "parent_id"),
+        Index("ix_document_chunks_content_tsv", "content_tsv", postgresql_using="gin"),
+        Index("ix_document_chunks_owner_id", "owner_id"),
+    )
     
     id: Mapped[UUID] = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     document_id: Mapped[UUID] = Column(UUID(as_uuid=True), ForeignKey('documents.id'), nullable=False)
+    # The document's user_id, copied down so searches can filter on it and
+    # the table can be hash-partitioned by it (app.cli.partition_chunks)
+    owner_id: Mapped[UUID] = Column(UUID(as_uuid=True), nullable=True)
     content: Mapped[str] = Column(Text, nullable=False)
     chunk_index: Mapped[int] = Column(Integer, nullable=False)
+    # Set on child chunks; parent sections have no embedding and no parent
+    parent_id: Mapped[UUID] = Column(
+        UUID(as_uuid=True), ForeignKey('document_chunks.id', ondelete="CASCADE"), nullable=True
+    )
     chunk_metadata: Mapped[Dict] = Column("metadata", JSON)
     embedding: Mapped[List[float]] = Column(Vector(1024))
+    # First-stage search vector (see app.core.projection); no fixed dimension
+    # here so the projection can be refitted at another size. Until
+    # app.cli.fit_projection --index declares the fitted dimension in the
+    # database and builds its HNSW index, the first stage scans every row
+    embedding_reduced: Mapped[List[float]] = Column(Vector())
+    # Projection.version that produced embedding_reduced; hybrid_search only
+    # compares vectors of the projection the query was reduced with
+    embedding_reduced_version: Mapped[str] = Column(Text, nullable=True)
     created_at: Mapped[datetime] = Column(DateTime, default=lambda: datetime.now(UTC))
+    # Text search configuration of the document's language, e.g. "english"
+    search_config: Mapped[str] = Column(REGCONFIG, nullable=False, server_default=text("'english'::regconfig"))
+    # Keyword leg of hybrid_search; computed by Postgres on insert. Parent
+    # sections are left out so only children are matched, as in the vector leg.
+    # Deferred: only the database ever reads it
+    content_tsv = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "CASE WHEN embedding IS NULL THEN NULL ELSE to_tsvector(search_config, content) END",
+            persisted=True,
+        ),
+    ))
     
     # Relationships
-    document: Mapped["Document"] = relationship("Document", back_populates="chunks")
+    # Document.chunks is a JSON column, not the reverse side of this relationship
+    document: Mapped["Document"] = relationship("Document")
+    parent: Mapped["DocumentChunk"] = relationship("DocumentChunk", remote_side=[id])
@@ -3,9 +3,10 @@ from datetime import UTC, datetime
 # from .chat_sessions import ChatSession  # Removed to fix circular import
 from typing import List
 
-from sqlalchemy import JSON, Column, DateTime, Integer, String, Text
+from sqlalchemy import (JSON, Column, DateTime, Integer, LargeBinary, String,
+                        Text)
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import Mapped, relationship
+from sqlalchemy.orm import Mapped, deferred, relationship
 
 from .base import Base
 
@@ -22,6 +23,9 @@ class Document(Base):
     doc_metadata: Mapped[JSON] = Column("metadata", JSON)
     chunks: Mapped[JSON] = Column(JSON)
     content: Mapped[Text] = Column(Text)
+    # The same text, zlib-compressed, when chunks reference it by offset
+    # (chunk_text_storage = "offsets"); content is then left empty
+    content_compressed: Mapped[bytes] = deferred(Column(LargeBinary))
     total_pages: Mapped[int] = Column(Integer)
     total_chunks: Mapped[int] = Column(Integer)
     created_at: Mapped[DateTime] = Column(DateTime, default=lambda: datetime.now(UTC))
@@ -0,0 +1,328 @@
+# app/services/indexing/bulk_ingestion.py
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+
+from app.config import get_settings
+from app.contracts.document import (BulkIngestDocumentResult, BulkIngestItem,
+                                    BulkIngestResponse)
+from app.core.admission import Priority
+from app.core.metrics import stage
+
+from .checkpoints import IngestCheckpoint, content_hash
+from .document_service import DocumentService
+from .utils.chunk_batch import ChunkBatch
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass(eq=False)
+class _Job:
+    item: BulkIngestItem
+    started: float = field(default_factory=time.perf_counter)
+    stage: Optional[str] = None  # Set once the caller is known to own the document
+    content: str = ""
+    metadata: dict = field(default_factory=dict)
+    chunks: Optional[ChunkBatch] = None
+    checkpoint: Optional[IngestCheckpoint] = None
+    positions: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+    remaining: int = 0
+    saved_batches: int = 0  # Leading embedding batches of this document in the checkpoint
+    failed_stage: Optional[str] = None
+    error: Optional[str] = None
+    heartbeat_at: float = 0.0
+    finished: float = 0.0
+
+    def fail(self, failed_stage: str, error: Exception) -> None:
+        if self.failed_stage is None:
+            self.failed_stage = failed_stage
+            self.error = str(error)
+            self.finished = time.perf_counter()
+
+    def result(self) -> BulkIngestDocumentResult:
+        failed = self.failed_stage is not None
+        return BulkIngestDocumentResult(
+            document_id=self.item.document_id,
+            status="failed" if failed else "success",
+            failed_stage=self.failed_stage,
+            error=self.error,
+            chunks=0 if failed or self.chunks is None else len(self.chunks),
+            seconds=round((self.finished or time.perf_counter()) - self.started, 3),
+        )
+
+
+class BulkIngestionService:
+    """
+    Ingest many PDFs at once.
+
+    Documents are downloaded and parsed with bounded concurrency, their chunks
+    are pooled into full embedding batches regardless of which document they
+    came from, and each document is inserted as soon as its last chunk has
+    been embedded. Like DocumentService.process_pdf_complete, each document's
+    processing_status follows its stage and ends as "completed" or
+    "failed:<stage>"; documents of other users are skipped untouched.
+
+    With the document service's checkpoint store, a document's pages and
+    chunks are checkpointed as in process_pdf_complete, and its embeddings
+    in batches of its own `batch_size` rows however they were pooled. With
+    the default batch size those are the batches process_pdf_complete
+    writes, so a rerun here or through resume_ingestion skips them.
+    """
+
+    def __init__(self, document_service: DocumentService, batch_size: int = 32):
+        self.document_service = document_service
+        self.batch_size = batch_size
+        # Every task shares the service's session, which allows one operation at a time
+        self._db_lock = asyncio.Lock()
+
+    async def _enter(self, job: _Job, name: str) -> None:
+        job.stage = name
+        async with self._db_lock:
+            await self.document_service._set_status(job.item.document_id, f"processing:{name}")
+
+    async def _prepare(
+        self,
+        job: _Job,
+        chunk_queue: asyncio.Queue,
+        insert_queue: asyncio.Queue,
+        semaphore: asyncio.Semaphore,
+        chunk_size: int,
+        user_id: UUID = None,
+    ) -> None:
+        """Download, parse, preprocess and chunk one document"""
+        url = job.item.document_url
+        async with semaphore:
+            job.started = time.perf_counter()
+            try:
+                if not url.endswith(".pdf"):
+                    raise ValueError("Only PDF files are supported")
+                async with self._db_lock:
+                    await self.document_service._owned_document(job.item.document_id, user_id)
+            except Exception as e:
+                job.fail("download", e)
+                return
+            try:
+                await self._enter(job, "download")
+                with stage("ingest", "download"):
+                    raw = await asyncio.to_thread(self.document_service._download, url)
+                store = self.document_service.checkpoint_store
+                if store is not None:
+                    job.checkpoint = IngestCheckpoint(store, job.item.document_id, content_hash(raw), chunk_size)
+                await self._enter(job, "parse")
+                with stage("ingest", "parse"):
+                    content = await asyncio.to_thread(self.document_service._extract_text, raw, job.checkpoint)
+                if not content.strip():
+                    raise ValueError("No text content found in PDF")
+            except Exception as e:
+                job.fail(job.stage, e)
+                return
+
+        try:
+            await self._enter(job, "chunk")
+            filename = url.split("/")[-1]
+            job.metadata = {"filename": filename, "content_type": "application/pdf"}
+            job.content = await self.document_service.preprocess_content(content)
+            if job.checkpoint is not None:
+                job.chunks = await asyncio.to_thread(job.checkpoint.load_chunks, job.content, job.metadata)
+            if job.chunks is None:
+                job.chunks = await self.document_service.chunk_content(job.content, job.metadata, chunk_size)
+                if job.checkpoint is not None:
+                    await asyncio.to_thread(job.checkpoint.save_chunks, job.chunks)
+        except Exception as e:
+            job.fail("chunk", e)
+            return
+
+        # Parent sections are stored without an embedding; the queue carries
+        # each other chunk's row in the document's embedding matrix
+        job.positions = job.chunks.embedded_positions()
+        job.remaining = len(job.positions)
+        if not job.remaining:
+            job.chunks.embeddings = np.zeros((0, 0), dtype=np.float32)
+            await insert_queue.put(job)
+            return
+        await self._enter(job, "embed")
+        job.heartbeat_at = time.monotonic() + get_settings().ingest_heartbeat_seconds
+        loaded = await self._load_embeddings(job)
+        if not job.remaining:
+            await insert_queue.put(job)
+            return
+        for row in range(loaded, len(job.positions)):
+            await chunk_queue.put((job, row))
+
+    async def _load_embeddings(self, job: _Job) -> int:
+        """Fill in the embedding batches a previous run checkpointed; returns the rows loaded"""
+        loaded = 0
+        while job.checkpoint is not None and loaded < len(job.positions):
+            batch = await asyncio.to_thread(job.checkpoint.load_batch, self.batch_size, job.saved_batches)
+            if batch is None:
+                break
+            if job.chunks.embeddings is None:
+                job.chunks.embeddings = np.empty((len(job.positions), batch.shape[1]), dtype=np.float32)
+            job.chunks.embeddings[loaded:loaded + len(batch)] = batch
+            loaded += len(batch)
+            job.saved_batches += 1
+        job.remaining -= loaded
+        return loaded
+
+    async def _save_embeddings(self, job: _Job) -> None:
+        """Checkpoint the document's embedding batches that are now complete"""
+        # Rows are queued and embedded in order, so the embedded ones are a prefix
+        embedded = len(job.positions) - job.remaining
+        while job.saved_batches * self.batch_size < embedded:
+            start = job.saved_batches * self.batch_size
+            end = min(start + self.batch_size, len(job.positions))
+            if end > embedded:
+                break
+            await asyncio.to_thread(
+                job.checkpoint.save_batch, self.batch_size, job.saved_batches, job.chunks.embeddings[start:end]
+            )
+            job.saved_batches += 1
+
+    async def _embed_batches(
+        self,
+        chunk_queue: asyncio.Queue,
+        insert_queue: asyncio.Queue,
+        user_id: UUID,
+    ) -> None:
+        """Embed pooled chunks in full batches, handing finished documents to the inserter"""
+        exhausted = False
+        while not exhausted:
+            batch: List[Tuple[_Job, int]] = []
+            while len(batch) < self.batch_size:
+                entry = await chunk_queue.get()
+                if entry is _DONE:
+                    exhausted = True
+                    break
+                job, _ = entry
+                if job.failed_stage is None:
+                    batch.append(entry)
+            if not batch:
+                continue
+
+            try:
+                embeddings = await self.document_service.embed_texts(
+                    [job.chunks.chunk_text(job.positions[row]) for job, row in batch],
+                    user_id=user_id,
+                    priority=Priority.BULK,
+                    batch_size=self.batch_size,
+                )
+            except Exception as e:
+                for job, _ in batch:
+                    job.fail("embed", e)
+                continue
+
+            for (job, row), embedding in zip(batch, embeddings):
+                if job.chunks.embeddings is None:
+                    job.chunks.embeddings = np.empty((len(job.positions), len(embedding)), dtype=np.float32)
+                job.chunks.embeddings[row] = embedding
+                job.remaining -= 1
+            for job in {job for job, _ in batch}:
+                if job.checkpoint is not None:
+                    try:
+                        await self._save_embeddings(job)
+                    except Exception as e:
+                        job.fail("embed", e)
+                if job.remaining == 0 and job.failed_stage is None:
+                    await insert_queue.put(job)
+            await self._heartbeat({job for job, _ in batch if job.remaining})
+        await insert_queue.put(_DONE)
+
+    async def _heartbeat(self, jobs) -> None:
+        """Bump updated_at of documents still embedding, so a long run does not look abandoned"""
+        now = time.monotonic()
+        for job in jobs:
+            if now >= job.heartbeat_at:
+                async with self._db_lock:
+                    await self.document_service._touch(job.item.document_id)
+                job.heartbeat_at = now + get_settings().ingest_heartbeat_seconds
+
+    async def _insert_documents(self, insert_queue: asyncio.Queue, user_id: UUID) -> None:
+        """Bulk-insert each finished document; one session, so one at a time"""
+        while True:
+            job = await insert_queue.get()
+            if job is _DONE:
+                return
+            try:
+                await self._enter(job, "insert")
+                with stage("ingest", "insert"):
+                    async with self._db_lock:
+                        await self.document_service.insert_document_with_chunks(
+                            title=job.metadata.get("filename") or "Untitled Document",
+                            document_id=job.item.document_id,
+                            content=job.content,
+                            chunks=job.chunks,
+                            metadata=job.metadata,
+                            user_id=user_id,
+                        )
+                job.finished = time.perf_counter()
+            except Exception as e:
+                job.fail("insert", e)
+                continue
+            if job.checkpoint is not None:
+                try:
+                    await asyncio.to_thread(job.checkpoint.clear)
+                except Exception:
+                    logger.warning("Could not clear the ingestion checkpoint of document %s", job.item.document_id, exc_info=True)
+
+    async def ingest(
+        self,
+        items: List[BulkIngestItem],
+        user_id: UUID = None,
+        chunk_size: int = 1000,
+        concurrency: int = 4,
+    ) -> BulkIngestResponse:
+        start = time.perf_counter()
+        jobs = [_Job(item=item) for item in items]
+        semaphore = asyncio.Semaphore(concurrency)
+        # Bounded so parsing cannot run arbitrarily far ahead of embedding
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=self.batch_size * 8)
+        insert_queue: asyncio.Queue = asyncio.Queue()
+
+        async def feed():
+            await asyncio.gather(*[
+                self._prepare(job, chunk_queue, insert_queue, semaphore, chunk_size, user_id)
+                for job in jobs
+            ])
+            await chunk_queue.put(_DONE)
+
+        tasks = [
+            asyncio.create_task(feed()),
+            asyncio.create_task(self._embed_batches(chunk_queue, insert_queue, user_id)),
+            asyncio.create_task(self._insert_documents(insert_queue, user_id)),
+        ]
+        try:
+            # If one of them dies the others would block on its queue for good, so stop them all
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            for task in tasks:
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        error = next((task.exception() for task in tasks if not task.cancelled() and task.exception()), None)
+
+        for job in jobs:
+            if error is not None and job.failed_stage is None and not job.finished:
+                job.fail(job.stage or "download", error)
+            if job.failed_stage is not None and job.stage is not None:
+                async with self._db_lock:
+                    await self.document_service._record_failure(job.item.document_id, job.failed_stage)
+
+        results = [job.result() for job in jobs]
+        seconds = time.perf_counter() - start
+        succeeded = sum(1 for r in results if r.status == "success")
+        total_chunks = sum(r.chunks for r in results)
+        return BulkIngestResponse(
+            documents=results,
+            succeeded=succeeded,
+            failed=len(results) - succeeded,
+            total_chunks=total_chunks,
+            seconds=round(seconds, 3),
+            documents_per_second=round(succeeded / seconds, 3) if seconds else 0.0,
+            chunks_per_second=round(total_chunks / seconds, 3) if seconds else 0.0,
+        )
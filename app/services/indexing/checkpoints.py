@@ -0,0 +1,253 @@
+"""
+Per-stage checkpoints for resumable ingestion.
+
+Each document's intermediate artifacts (extracted page text, chunks and
+embedding batches) are written under "<document_id>/<content hash>/", so a
+retried job skips whatever already finished for the same PDF bytes, and a
+changed PDF never reuses stale work. Chunk and embedding artifacts are also
+named after the settings that produced them, so changing the chunk size or
+the embedding model recomputes instead of mixing results.
+
+Checkpoints are removed once a document is inserted; anything abandoned is
+removed by cleanup() after the retention period.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.config import get_settings
+
+from .utils.chunk_batch import ChunkBatch
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore(ABC):
+    """Blob store for checkpoint artifacts; keys are "/"-separated paths"""
+
+    @abstractmethod
+    def read(self, key: str) -> Optional[bytes]:
+        """Return the blob, or None if it does not exist"""
+        pass
+
+    @abstractmethod
+    def write(self, key: str, data: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> None:
+        pass
+
+    @abstractmethod
+    def cleanup(self, max_age_seconds: float) -> int:
+        """Remove checkpoints untouched for longer than max_age_seconds; returns how many"""
+        pass
+
+
+class LocalCheckpointStore(CheckpointStore):
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so a crash never leaves a truncated artifact behind
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def delete_prefix(self, prefix: str) -> None:
+        path = self._path(prefix)
+        shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.rmdir(os.path.dirname(path))  # The document's directory, once empty
+        except OSError:
+            pass
+
+    def cleanup(self, max_age_seconds: float) -> int:
+        if not os.path.isdir(self.root):
+            return 0
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for document_dir in os.scandir(self.root):
+            if not document_dir.is_dir():
+                continue
+            for checkpoint_dir in os.scandir(document_dir.path):
+                files = [entry.stat().st_mtime for entry in os.scandir(checkpoint_dir.path)]
+                if max(files, default=0) < cutoff:
+                    shutil.rmtree(checkpoint_dir.path, ignore_errors=True)
+                    removed += 1
+            if not os.listdir(document_dir.path):
+                os.rmdir(document_dir.path)
+        return removed
+
+
+class SupabaseCheckpointStore(CheckpointStore):
+    """Checkpoints in a Supabase Storage bucket, shared by every worker"""
+
+    def __init__(self, bucket: str):
+        from supabase import create_client
+
+        settings = get_settings()
+        self.bucket = create_client(settings.supabase_url, settings.supabase_service_key).storage.from_(bucket)
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            return self.bucket.download(key)
+        except Exception:
+            return None
+
+    def write(self, key: str, data: bytes) -> None:
+        self.bucket.upload(key, data, {"upsert": "true", "content-type": "application/octet-stream"})
+
+    def delete_prefix(self, prefix: str) -> None:
+        names = [f"{prefix}/{entry['name']}" for entry in self.bucket.list(prefix)]
+        if names:
+            self.bucket.remove(names)
+
+    def cleanup(self, max_age_seconds: float) -> int:
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for document_dir in self.bucket.list(""):
+            for checkpoint_dir in self.bucket.list(document_dir["name"]):
+                prefix = f"{document_dir['name']}/{checkpoint_dir['name']}"
+                entries = self.bucket.list(prefix)
+                updated = [_timestamp(entry.get("updated_at")) for entry in entries]
+                if max(updated, default=0) < cutoff:
+                    self.delete_prefix(prefix)
+                    removed += 1
+        return removed
+
+
+def _timestamp(value: Optional[str]) -> float:
+    if not value:
+        return 0.0
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def _fingerprint(*parts: Any) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:32]
+
+
+class IngestCheckpoint:
+    """The checkpoint of one document's content; every method blocks, call via to_thread"""
+
+    def __init__(self, store: CheckpointStore, document_id: Any, content_sha: str, chunk_size: int):
+        self.store = store
+        self.prefix = f"{document_id}/{content_sha}"
+        settings = get_settings()
+        self.chunks_fp = _fingerprint(
+            chunk_size,
+            settings.preprocess_strip_repeated_lines,
+            settings.preprocess_repeated_line_ratio,
+            settings.chunk_parent_child,
+            settings.chunk_child_size,
+        )
+        self.model_fp = _fingerprint(settings.embedding_model, settings.embedding_backend)
+
+    def _read_json(self, name: str) -> Optional[Any]:
+        data = self.store.read(f"{self.prefix}/{name}")
+        return json.loads(data) if data is not None else None
+
+    def _write_json(self, name: str, value: Any) -> None:
+        self.store.write(f"{self.prefix}/{name}", json.dumps(value).encode())
+
+    # Pages
+    def load_pages(self) -> Dict[str, Any]:
+        """{"pages": [...], "complete": bool}; pages extracted so far, in order"""
+        return self._read_json("pages.json") or {"pages": [], "complete": False}
+
+    def save_pages(self, pages: List[str], complete: bool) -> None:
+        self._write_json("pages.json", {"pages": pages, "complete": complete})
+
+    # Chunks: the span arrays only, since the text is rebuilt from the pages
+    def load_chunks(self, text: str, metadata: Dict[str, Any]) -> Optional[ChunkBatch]:
+        data = self.store.read(f"{self.prefix}/chunks-{self.chunks_fp}.npz")
+        if data is None:
+            return None
+        with np.load(io.BytesIO(data), allow_pickle=False) as stored:
+            if int(stored["text_length"]) != len(text):
+                return None
+            return ChunkBatch.from_arrays(text, metadata, stored)
+
+    def save_chunks(self, chunks: ChunkBatch) -> None:
+        buffer = io.BytesIO()
+        np.savez(buffer, text_length=len(chunks.text), **chunks.to_arrays())
+        self.store.write(f"{self.prefix}/chunks-{self.chunks_fp}.npz", buffer.getvalue())
+
+    # Embedding batches
+    def _batch_key(self, batch_size: int, index: int) -> str:
+        return f"{self.prefix}/embeddings-{self.chunks_fp}-{self.model_fp}-{batch_size}-{index}.npy"
+
+    def load_batch(self, batch_size: int, index: int) -> Optional[np.ndarray]:
+        data = self.store.read(self._batch_key(batch_size, index))
+        if data is None:
+            return None
+        return np.load(io.BytesIO(data), allow_pickle=False)
+
+    def save_batch(self, batch_size: int, index: int, embeddings: np.ndarray) -> None:
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(embeddings, dtype=np.float32), allow_pickle=False)
+        self.store.write(self._batch_key(batch_size, index), buffer.getvalue())
+
+    def clear(self) -> None:
+        self.store.delete_prefix(self.prefix)
+
+
+@lru_cache()
+def get_checkpoint_store() -> Optional[CheckpointStore]:
+    settings = get_settings()
+    if not settings.ingest_checkpoints_enabled:
+        return None
+    if settings.ingest_checkpoint_backend == "supabase":
+        return SupabaseCheckpointStore(settings.ingest_checkpoint_bucket)
+    return LocalCheckpointStore(settings.ingest_checkpoint_dir)
+
+
+def cleanup_checkpoints() -> int:
+    """Apply the retention policy; blocks, call via to_thread"""
+    store = get_checkpoint_store()
+    if store is None:
+        return 0
+    try:
+        removed = store.cleanup(get_settings().ingest_checkpoint_retention_hours * 3600)
+    except Exception:
+        logger.exception("Checkpoint cleanup failed")
+        return 0
+    if removed:
+        logger.info("Removed %d expired ingestion checkpoints", removed)
+    return removed
+
+
+async def run_checkpoint_cleanup(interval: float = 3600.0) -> None:
+    """Apply the retention policy now and then every `interval` seconds"""
+    while True:
+        await asyncio.to_thread(cleanup_checkpoints)
+        await asyncio.sleep(interval)
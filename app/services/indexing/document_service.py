@@ -1,56 +1,94 @@
 # app/services/indexing/document_service.py
+import asyncio
 import io
+import logging
+import time
 from datetime import UTC, datetime
 from typing import Any, Dict, List, Optional
 from uuid import UUID, uuid4
 
-import pypdf as PyPDF2
+import numpy as np
 import requests
 from fastapi import UploadFile
-from langchain.schema import Document as LangchainDocument
-from sqlalchemy import select
+from sqlalchemy import delete, insert, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import get_settings
 from app.contracts.document import DocumentCreate, DocumentResponse
+from app.core.admission import (AdmissionController, AdmissionRejected,
+                                Priority, get_admission_controller)
+from app.core.document_text import compress_text, text_version
 from app.core.embeddings import EmbeddingProvider
+from app.core.index_snapshot import record_deletions
+from app.core.metrics import stage
+from app.core.projection import get_projection
 from app.core.storage import StorageProvider
-from app.db.session import engine
-from app.models.base import Base
+from app.db.maintenance import get_maintenance
 from app.models.chunks import DocumentChunk
 from app.models.documents import Document
 
 from ..interfaces.document_service import IDocumentService
+from .checkpoints import CheckpointStore, IngestCheckpoint, content_hash
 # Import your utils
-from .utils.chunking import chunk_documents
-from .utils.preprocessing import preprocess_text
+from .utils.chunk_batch import PARENT, ChunkBatch
+from .utils.chunking import chunk_text
+from .utils.preprocessing import PAGE_BREAK, preprocess_pages
+from .utils.text_search import search_config_for
 
+logger = logging.getLogger(__name__)
 
 class DocumentService(IDocumentService):
     def __init__(
         self, 
         db: AsyncSession,
         embedding_provider: EmbeddingProvider,
-        storage_provider: StorageProvider
+        storage_provider: StorageProvider,
+        checkpoint_store: Optional[CheckpointStore] = None,
     ):
         self.db = db
         self.embedding_provider = embedding_provider
         self.storage_provider = storage_provider
+        self.checkpoint_store = checkpoint_store
+    
+    @staticmethod
+    def _download(document_url: str) -> bytes:
+        response = requests.get(document_url, timeout=60)
+        response.raise_for_status()
+        return response.content
+    
+    @staticmethod
+    def _extract_text(content: bytes, checkpoint: Optional[IngestCheckpoint] = None) -> str:
+        from pypdf import PdfReader
+        
+        if checkpoint is None:
+            pdf_reader = PdfReader(io.BytesIO(content))
+            # Keep page boundaries so preprocessing can find running headers and footers
+            return PAGE_BREAK.join(page.extract_text() for page in pdf_reader.pages)
+        
+        # Resume after the pages a previous attempt already extracted
+        saved = checkpoint.load_pages()
+        pages = saved["pages"]
+        if not saved["complete"]:
+            interval = get_settings().ingest_checkpoint_page_interval
+            pdf_reader = PdfReader(io.BytesIO(content))
+            for i in range(len(pages), len(pdf_reader.pages)):
+                pages.append(pdf_reader.pages[i].extract_text())
+                if len(pages) % interval == 0:
+                    checkpoint.save_pages(pages, complete=False)
+            checkpoint.save_pages(pages, complete=True)
+        return PAGE_BREAK.join(pages)
     
     async def parse_pdf(self, document_url: str) -> str:
         """Extract text content from PDF file"""
         try:
-            # Read PDF content
-            response = requests.get(document_url)
-            content = response.content
-            pdf_file = io.BytesIO(content)
+            # Read PDF content; both steps block, so keep them off the event loop
+            with stage("ingest", "download"):
+                content = await asyncio.to_thread(self._download, document_url)
             
-            # Extract text using PyPDF2
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text_content = ""
-            
-            for page in pdf_reader.pages:
-                text_content += page.extract_text() + "\n"
+            # Extract text using pypdf
+            with stage("ingest", "parse"):
+                text_content = await asyncio.to_thread(self._extract_text, content)
             
             if not text_content.strip():
                 raise ValueError("No text content found in PDF")
@@ -62,82 +100,199 @@ class DocumentService(IDocumentService):
     
     async def preprocess_content(self, content: str) -> str:
         """Preprocess text content"""
-        return preprocess_text(content, clean_whitespace=True)
+        settings = get_settings()
+        return await asyncio.to_thread(
+            preprocess_pages,
+            content.split(PAGE_BREAK),
+            clean_whitespace=True,
+            strip_repeated=settings.preprocess_strip_repeated_lines,
+            min_page_ratio=settings.preprocess_repeated_line_ratio,
+        )
     
     async def chunk_content(
         self, 
         content: str, 
         metadata: Dict[str, Any] = None,
         chunk_size: int = 1000,
-    ) -> List[LangchainDocument]:
+    ) -> ChunkBatch:
         """Split content into chunks"""
-        
-        doc = LangchainDocument(
-            page_content=content,
-            metadata=metadata or {}
-        )
-        
-        chunks = chunk_documents([doc], chunk_size)
-        return chunks
+        settings = get_settings()
+        # With parent-child chunking, chunk_size is the parent section; only the children get embedded
+        child_size = settings.chunk_child_size if settings.chunk_parent_child else None
+        return chunk_text(content, metadata, chunk_size, child_size)
     
-    async def generate_embeddings(self, chunks: List[LangchainDocument]) -> List[List[float]]:
-        """Generate embeddings for chunks"""
-        
-        texts = [chunk.page_content for chunk in chunks]
+    async def embed_texts(
+        self,
+        texts: List[str],
+        user_id: UUID = None,
+        priority: Priority = Priority.INTERACTIVE,
+        batch_size: int = 32,
+    ) -> np.ndarray:
+        """Embed one batch behind the ingestion admission lane"""
+        async with get_admission_controller().slot(
+            AdmissionController.INGEST_EMBEDDING,
+            user_id=str(user_id) if user_id else None,
+            priority=priority,
+        ):
+            return await self.embedding_provider.get_embeddings_matrix(texts, batch_size)
+    
+    async def generate_embeddings(
+        self,
+        chunks: ChunkBatch,
+        user_id: UUID = None,
+        priority: Priority = Priority.INTERACTIVE,
+        batch_size: int = 32,
+        checkpoint: Optional[IngestCheckpoint] = None,
+        document_id: Optional[UUID] = None,
+    ) -> np.ndarray:
+        """
+        Embed every chunk but the parent sections into chunks.embeddings, one
+        row each. Given document_id, the document's updated_at is bumped
+        between batches so a long embed stage does not look abandoned.
+        """
+        positions = chunks.embedded_positions()
+        matrix: Optional[np.ndarray] = None
+        heartbeat_at = time.monotonic() + get_settings().ingest_heartbeat_seconds
         
-        embeddings = self.embedding_provider.get_embeddings_batch(texts)
+        # Admit one batch at a time so queries can interleave with long documents
+        for i in range(0, len(positions), batch_size):
+            batch_index = i // batch_size
+            batch = None
+            if checkpoint is not None:
+                batch = await asyncio.to_thread(checkpoint.load_batch, batch_size, batch_index)
+            if batch is None:
+                batch = await self.embed_texts(
+                    chunks.texts(positions[i:i + batch_size]), user_id, priority, batch_size
+                )
+                if checkpoint is not None:
+                    await asyncio.to_thread(checkpoint.save_batch, batch_size, batch_index, batch)
+            if matrix is None:
+                matrix = np.empty((len(positions), batch.shape[1]), dtype=np.float32)
+            matrix[i:i + len(batch)] = batch
+            if document_id is not None and time.monotonic() >= heartbeat_at:
+                await self._touch(document_id)
+                heartbeat_at = time.monotonic() + get_settings().ingest_heartbeat_seconds
         
-        return embeddings
+        chunks.embeddings = matrix if matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        return chunks.embeddings
+    
+    async def _write_chunks(
+        self,
+        document: Document,
+        chunks: ChunkBatch,
+        embeddings: np.ndarray,
+        reduced: Optional[np.ndarray],
+        reduced_version: Optional[str],
+        search_config: str,
+        version: Optional[str],
+    ) -> None:
+        """
+        Bulk-insert the chunks a page of rows at a time, building each row's
+        text and metadata only for its page. Parents come before their
+        children, so every child's parent row is already written.
+        """
+        ids = [uuid4() for _ in range(len(chunks))]
+        embedded = chunks.levels != PARENT
+        # Row of each embedded chunk in the embedding matrix
+        vector_rows = np.cumsum(embedded) - 1
+        created_at = datetime.now(UTC)
+        page = get_settings().chunk_insert_batch_size
+        for start in range(0, len(chunks), page):
+            rows = []
+            for i in range(start, min(start + page, len(chunks))):
+                metadata = chunks.chunk_metadata(i)
+                text = chunks.chunk_text(i)
+                parent = chunks.parents[i]
+                if parent >= 0:
+                    # Retrieval reads this from the search results to fetch the parent
+                    metadata["parent_id"] = str(ids[parent])
+                if version is not None:
+                    metadata["text_version"] = version
+                    if parent >= 0:
+                        # ... or to slice it out of the document text
+                        metadata["parent_span"] = [int(chunks.starts[parent]), int(chunks.ends[parent])]
+                    if not embedded[i]:
+                        # Only embedded chunks need their own text, for full-text search
+                        text = ""
+                vector = embeddings[vector_rows[i]] if embedded[i] else None
+                rows.append({
+                    "id": ids[i],
+                    "document_id": document.id,  # Reference existing document
+                    "owner_id": document.user_id,
+                    "content": text,
+                    "chunk_index": i,
+                    "parent_id": ids[parent] if parent >= 0 else None,
+                    "chunk_metadata": metadata,
+                    "embedding": vector,
+                    "embedding_reduced": reduced[vector_rows[i]] if vector is not None and reduced is not None else None,
+                    "embedding_reduced_version": reduced_version if vector is not None and reduced is not None else None,
+                    "search_config": search_config,
+                    "created_at": created_at,
+                })
+            await self.db.execute(insert(DocumentChunk), rows)
     
     async def insert_document_with_chunks(
         self,
         title: str, 
         document_id: UUID,  # Existing document ID from frontend
         content: str,
-        chunks: List[LangchainDocument],
-        embeddings: List[List[float]],
+        chunks: ChunkBatch,
+        embeddings: Optional[np.ndarray] = None,
         metadata: Dict[str, Any] = None,
         user_id: UUID = None
     ) -> DocumentResponse:
-        """Process existing document and add chunks with embeddings"""
-        
-        await self.ensure_tables_exist()
+        """Process existing document and add chunks with embeddings (chunks.embeddings by default)"""
         
         try:
             # Find existing document that frontend already created
-            document = await self.db.get(Document, document_id)
-            if not document:
-                raise ValueError(f"Document {document_id} not found. Frontend should create it first.")
+            document = await self._owned_document(document_id, user_id)
             
             # Optionally update document with processed content
-            if content:
+            use_offsets = bool(content) and get_settings().chunk_text_storage == "offsets"
+            version = None
+            if use_offsets:
+                # One compressed copy; parent sections become spans into it
+                document.content_compressed = await asyncio.to_thread(compress_text, content)
+                document.content = None
+                version = text_version(content)
+            elif content:
                 document.content = content
+                document.content_compressed = None
             if metadata:
                 # Merge with existing metadata
                 existing_metadata = document.doc_metadata or {}
                 document.doc_metadata = {**existing_metadata, **metadata}
+            document.processing_status = "completed"
             
             # No need to add document - it already exists and SQLAlchemy is tracking it
             await self.db.flush()  # Save any document updates
             
-            print(len(chunks) == len(embeddings))
-            
-            # Add chunks that reference the existing document
-            for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-                chunk_record = DocumentChunk(
-                    id=uuid4(),
-                    document_id=document.id,  # Reference existing document
-                    content=chunk.page_content,
-                    chunk_index=i,
-                    chunk_metadata={**chunk.chunk_metadata, "chunk_index": i},
-                    embedding=embedding,
-                    created_at=datetime.now(UTC)
-                )
-                self.db.add(chunk_record)  # Add NEW chunk
+            if embeddings is None:
+                embeddings = chunks.embeddings
+            if len(embeddings) != len(chunks.embedded_positions()):
+                raise ValueError(f"Got {len(embeddings)} embeddings for {len(chunks.embedded_positions())} chunks")
             
+            # Chunks from an earlier processing of this document get replaced
+            stale_ids = await self._chunk_ids(document.id, document.user_id)
+            
+            # Postgres builds each chunk's tsvector with this config as the rows go in
+            search_config = search_config_for(document.doc_metadata, get_settings().text_search_config)
+            
+            # Reduced vectors for two-stage search, projected in one batch
+            projection = get_projection()
+            reduced = projection.transform(embeddings) if projection and len(embeddings) else None
+            
+            await self._write_chunks(
+                document, chunks, embeddings, reduced, projection.version if projection else None,
+                search_config, version,
+            )
             await self.db.commit()
             await self.db.refresh(document)
             
+            if stale_ids:
+                # Only once the new chunks are live, so search never finds the document empty
+                await self._delete_replaced(stale_ids, document.user_id)
+            
             return DocumentResponse.model_validate(document)
         
         except ValueError as e:
@@ -150,61 +305,197 @@ class DocumentService(IDocumentService):
             await self.db.rollback()
             raise RuntimeError(f"Failed to process document chunks: {str(e)}")
     
+    async def _owned_document(self, document_id: UUID, user_id: Optional[UUID]) -> Document:
+        """
+        The document row, if it exists and belongs to user_id (any owner when
+        user_id is None); someone else's document reads as missing
+        """
+        document = await self.db.get(Document, document_id)
+        if not document or (user_id is not None and str(document.user_id) != str(user_id)):
+            raise ValueError(f"Document {document_id} not found. Frontend should create it first.")
+        return document
+    
+    @staticmethod
+    def _owner_filter(owner_id: Optional[UUID]) -> list:
+        """With owner routing, chunk statements name the owner so a partitioned table is pruned"""
+        if owner_id is None or not get_settings().chunk_owner_routing:
+            return []
+        return [DocumentChunk.owner_id == owner_id]
+    
+    async def _chunk_ids(self, document_id: UUID, owner_id: Optional[UUID] = None) -> List[UUID]:
+        """A document's chunk ids, children before the parents they cascade from"""
+        result = await self.db.execute(
+            select(DocumentChunk.id)
+            .where(DocumentChunk.document_id == document_id, *self._owner_filter(owner_id))
+            .order_by(DocumentChunk.parent_id.is_(None), DocumentChunk.id)
+        )
+        return list(result.scalars().all())
+    
+    async def delete_chunks(self, chunk_ids: List[UUID], owner_id: Optional[UUID] = None) -> int:
+        """
+        Delete chunks by primary key in batches, committing each, so no
+        transaction holds many row locks or grows a long undo chain. Local
+        indexes are told about the deletion and table maintenance is
+        scheduled if the dead-tuple ratio calls for it.
+        """
+        batch_size = get_settings().chunk_delete_batch_size
+        owner_filter = self._owner_filter(owner_id)
+        deleted = 0
+        for i in range(0, len(chunk_ids), batch_size):
+            result = await self.db.execute(
+                delete(DocumentChunk).where(DocumentChunk.id.in_(chunk_ids[i:i + batch_size]), *owner_filter)
+            )
+            await self.db.commit()
+            deleted += result.rowcount
+        if chunk_ids:
+            await asyncio.to_thread(record_deletions, chunk_ids)
+            get_maintenance().schedule()
+        return deleted
+    
+    async def _delete_replaced(self, chunk_ids: List[UUID], owner_id: Optional[UUID] = None) -> None:
+        try:
+            await self.delete_chunks(chunk_ids, owner_id)
+        except Exception:
+            # The next reprocessing or delete picks them up again
+            await self.db.rollback()
+            logger.warning("Could not delete %d replaced chunks", len(chunk_ids), exc_info=True)
+    
+    async def delete_document(self, document_id: UUID) -> int:
+        """
+        Remove a document's chunks and ingestion checkpoints; the document row
+        is the frontend's and stays, marked "deleted". Returns the chunks removed.
+        """
+        document = await self.db.get(Document, document_id)
+        if not document:
+            raise ValueError(f"Document {document_id} not found")
+        deleted = await self.delete_chunks(await self._chunk_ids(document_id, document.user_id), document.user_id)
+        if self.checkpoint_store is not None:
+            await asyncio.to_thread(self.checkpoint_store.delete_prefix, str(document_id))
+        document.processing_status = "deleted"
+        await self.db.commit()
+        return deleted
+    
+    async def _set_status(self, document_id: UUID, status: str) -> bool:
+        """Record the pipeline stage on the document row; False if the row does not exist"""
+        document = await self.db.get(Document, document_id)
+        if not document:
+            return False
+        document.processing_status = status
+        await self.db.commit()
+        return True
+    
+    async def _touch(self, document_id: UUID) -> None:
+        """Bump updated_at without changing the status, as a sign of progress"""
+        document = await self.db.get(Document, document_id)
+        if document:
+            document.updated_at = datetime.now(UTC)
+            await self.db.commit()
+    
     async def process_pdf_complete(
         self,
         document_url: str,
         document_id: UUID,  # Existing document ID from frontend
         user_id: UUID = None,
         chunk_size: int = 1000,
+        priority: Priority = Priority.INTERACTIVE,
     ) -> DocumentResponse:
-        """Complete PDF processing pipeline for existing document"""
+        """
+        Complete PDF processing pipeline for existing document
+        
+        processing_status follows the pipeline ("processing:<stage>") and ends
+        as "completed" or "failed:<stage>". With a checkpoint store, a retry
+        of the same PDF resumes after the last finished page, chunking and
+        embedding batch.
+        """
         
+        # Outside the try, so a document of another user is never marked failed
+        await self._owned_document(document_id, user_id)
+        
+        current_stage = "download"
         try:
-            # Step 1: Parse PDF from URL
-            content = await self.parse_pdf(document_url)
-            document_filename = document_url.split("/")[-1]
+            # Fail before downloading anything if the row is missing
+            if not await self._set_status(document_id, "processing:download"):
+                raise ValueError(f"Document {document_id} not found. Frontend should create it first.")
             
-            # Step 2: Preprocess content
-            preprocessed_content = await self.preprocess_content(content)
+            # Step 1: Parse PDF from URL; both steps block, so keep them off the event loop
+            with stage("ingest", "download"):
+                raw = await asyncio.to_thread(self._download, document_url)
+            checkpoint = None
+            if self.checkpoint_store is not None:
+                checkpoint = IngestCheckpoint(self.checkpoint_store, document_id, content_hash(raw), chunk_size)
             
+            current_stage = "parse"
+            await self._set_status(document_id, "processing:parse")
+            with stage("ingest", "parse"):
+                content = await asyncio.to_thread(self._extract_text, raw, checkpoint)
+            if not content.strip():
+                raise ValueError("No text content found in PDF")
+            document_filename = document_url.split("/")[-1]
             
-            # Step 3: Generate embeddings
-            embeddings = await self.generate_embeddings(preprocessed_content)
+            # Step 2: Preprocess content
+            current_stage = "chunk"
+            await self._set_status(document_id, "processing:chunk")
+            with stage("ingest", "preprocess"):
+                preprocessed_content = await self.preprocess_content(content)
             
-            # Step 4: Chunk content
+            # Step 3: Chunk content
             metadata = {"filename": document_filename, "content_type": "application/pdf"}
-            chunks = await self.chunk_content(
-                preprocessed_content, 
-                metadata, 
-                chunk_size, 
-            )
+            with stage("ingest", "chunk"):
+                chunks = None
+                if checkpoint is not None:
+                    chunks = await asyncio.to_thread(checkpoint.load_chunks, preprocessed_content, metadata)
+                if chunks is None:
+                    chunks = await self.chunk_content(
+                        preprocessed_content, 
+                        metadata, 
+                        chunk_size, 
+                    )
+                    if checkpoint is not None:
+                        await asyncio.to_thread(checkpoint.save_chunks, chunks)
             
-            #Step 4: Embeddings chunks mapping
-            chunk_embeddings = []
-            for chunk in chunks:
-                chunk_embeddings.append(embeddings[chunk.chunk_index : chunk.chunk_index + chunk_size])
+            # Step 4: Generate embeddings, one per child chunk
+            current_stage = "embed"
+            await self._set_status(document_id, "processing:embed")
+            with stage("ingest", "embed"):
+                chunk_embeddings = await self.generate_embeddings(
+                    chunks, user_id=user_id, priority=priority, checkpoint=checkpoint, document_id=document_id
+                )
             
             # Step 5: Process existing document and add chunks
+            current_stage = "insert"
+            await self._set_status(document_id, "processing:insert")
             document_title = document_filename or "Untitled Document"
-            result = await self.insert_document_with_chunks(
-                title=document_title,
-                document_id=document_id,  # Use existing document ID
-                content=preprocessed_content,
-                chunks=chunks,
-                embeddings=chunk_embeddings,
-                metadata=metadata,
-                user_id=user_id
-            )
+            with stage("ingest", "insert"):
+                result = await self.insert_document_with_chunks(
+                    title=document_title,
+                    document_id=document_id,  # Use existing document ID
+                    content=preprocessed_content,
+                    chunks=chunks,
+                    embeddings=chunk_embeddings,
+                    metadata=metadata,
+                    user_id=user_id
+                )
             
+            if checkpoint is not None:
+                # The document is already committed; a leftover checkpoint
+                # only costs storage until retention removes it
+                try:
+                    await asyncio.to_thread(checkpoint.clear)
+                except Exception:
+                    logger.warning("Could not clear the ingestion checkpoint of document %s", document_id, exc_info=True)
             return result
             
+        except AdmissionRejected:
+            # Shed, not broken; a retry resumes from the checkpoint
+            await self._record_failure(document_id, current_stage)
+            raise
         except Exception as e:
+            await self._record_failure(document_id, current_stage)
             raise RuntimeError(f"PDF processing failed: {str(e)}")
     
-    async def ensure_tables_exist(self):
-        """Create tables if they don't exist"""
+    async def _record_failure(self, document_id: UUID, failed_stage: str) -> None:
         try:
-            async with engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
-        except Exception as e:
-            raise RuntimeError(f"Failed to create tables: {str(e)}")
\ No newline at end of file
+            await self.db.rollback()
+            await self._set_status(document_id, f"failed:{failed_stage}")
+        except Exception:
+            logger.warning("Could not record failure of document %s", document_id, exc_info=True)
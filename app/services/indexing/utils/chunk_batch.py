@@ -0,0 +1,72 @@
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# ChunkBatch.levels
+FLAT = 0  # Embedded and returned as is
+PARENT = 1  # Context section, stored without an embedding
+CHILD = 2  # Embedded; retrieval returns its parent
+
+
+class ChunkBatch:
+    """
+    One document's chunks as parallel arrays over its text.
+
+    Chunk i is text[starts[i]:ends[i]] at levels[i]; parents[i] is the
+    index of its parent section, or -1. The metadata every chunk shares is
+    held once, and the chunks that get a vector (all but parent sections)
+    have one row each, in order, in the float32 `embeddings` matrix. Chunk
+    text and per-chunk metadata are only built when a stage needs them, so
+    a large document costs a few arrays rather than an object per chunk.
+    """
+
+    __slots__ = ("text", "metadata", "starts", "ends", "parents", "levels", "embeddings")
+
+    def __init__(
+        self,
+        text: str,
+        metadata: Dict[str, Any],
+        starts: Sequence[int],
+        ends: Sequence[int],
+        parents: Sequence[int],
+        levels: Sequence[int],
+        embeddings: Optional[np.ndarray] = None,
+    ):
+        self.text = text
+        self.metadata = metadata
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.parents = np.asarray(parents, dtype=np.int32)
+        self.levels = np.asarray(levels, dtype=np.int8)
+        self.embeddings = embeddings
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def chunk_text(self, i: int) -> str:
+        return self.text[self.starts[i]:self.ends[i]]
+
+    def texts(self, positions: Sequence[int]) -> List[str]:
+        return [self.text[self.starts[i]:self.ends[i]] for i in positions]
+
+    def embedded_positions(self) -> np.ndarray:
+        """Chunks that get a vector, in the order of the embedding rows"""
+        return np.flatnonzero(self.levels != PARENT)
+
+    def chunk_metadata(self, i: int) -> Dict[str, Any]:
+        """The stored metadata of chunk i: the shared keys plus its level and position"""
+        metadata = {**self.metadata, "chunk_index": i, "start_index": int(self.starts[i]), "end_index": int(self.ends[i])}
+        level = self.levels[i]
+        if level == PARENT:
+            metadata["level"] = "parent"
+        elif level == CHILD:
+            metadata.update(level="child", parent_index=int(self.parents[i]))
+        return metadata
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """The layout without the text, for checkpoints"""
+        return {"starts": self.starts, "ends": self.ends, "parents": self.parents, "levels": self.levels}
+
+    @classmethod
+    def from_arrays(cls, text: str, metadata: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> "ChunkBatch":
+        return cls(text, metadata, arrays["starts"], arrays["ends"], arrays["parents"], arrays["levels"])
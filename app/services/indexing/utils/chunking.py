@@ -1,26 +1,107 @@
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
-from langchain.schema import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from .chunk_batch import CHILD, FLAT, PARENT, ChunkBatch
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+
+def _splitter(chunk_size: int, chunk_overlap: int) -> "RecursiveCharacterTextSplitter":
+    # LangChain is slow to import, so it loads with the first document chunked
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", ". ", " ", ""],
+        keep_separator=True,
+        add_start_index=True,
+    )
 
 
 def chunk_documents(
-    documents: List[Document],
+    documents: List["Document"],
     chunk_size: int = 1000,
-) -> List[Document]:
+    chunk_overlap: int = 200,
+) -> List["Document"]:
     """
     Split documents into chunks using recursive character splitting
-    
+
     Args:
         documents: List of documents to split
         chunk_size: Maximum size of each chunk
-        
+        chunk_overlap: Characters shared by consecutive chunks
+
     Returns:
-        List of chunked documents
+        List of chunked documents, each with its `start_index` in the source text
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        separators=["\n\n", "\n", ". ", " ", ""],
-        keep_separator=True
-    )
-    return text_splitter.split_documents(documents)
\ No newline at end of file
+    return _splitter(chunk_size, chunk_overlap).split_documents(documents)
+
+
+def split_spans(
+    text: str,
+    chunk_size: int = 1000,
+    chunk_overlap: int = 200,
+    offset: int = 0,
+) -> List[Tuple[int, int]]:
+    """
+    (start, end) of each chunk chunk_documents would cut from `text`,
+    shifted by `offset`, without building a Document per chunk
+    """
+    spans = []
+    index, previous_length = 0, 0
+    for piece in _splitter(chunk_size, chunk_overlap).split_text(text):
+        # Where LangChain's add_start_index looks for the chunk
+        index = text.find(piece, max(0, index + previous_length - chunk_overlap))
+        spans.append((offset + index, offset + index + len(piece)))
+        previous_length = len(piece)
+    return spans
+
+
+def chunk_text(
+    text: str,
+    metadata: Optional[Dict[str, Any]] = None,
+    chunk_size: int = 1000,
+    child_chunk_size: Optional[int] = None,
+) -> ChunkBatch:
+    """
+    Split a document's text into a ChunkBatch
+
+    Without child_chunk_size the chunks are flat, overlapping by 200
+    characters. With it, the text is cut into parent sections, each followed
+    by its child chunks: children are small enough for precise vector
+    matching and are the only chunks that get embedded; parents carry the
+    surrounding text that is handed to the LLM. Neither level overlaps, so
+    no text is embedded twice.
+
+    Args:
+        text: The preprocessed document text
+        metadata: Shared by every chunk
+        chunk_size: Maximum size of each flat chunk or parent section
+        child_chunk_size: Maximum size of each child chunk
+
+    Returns:
+        The chunks in document order, parents before their children
+    """
+    starts, ends, parents, levels = [], [], [], []
+    if child_chunk_size is None:
+        for start, end in split_spans(text, chunk_size):
+            starts.append(start)
+            ends.append(end)
+            parents.append(-1)
+            levels.append(FLAT)
+    else:
+        for parent_start, parent_end in split_spans(text, chunk_size, chunk_overlap=0):
+            parent_index = len(starts)
+            starts.append(parent_start)
+            ends.append(parent_end)
+            parents.append(-1)
+            levels.append(PARENT)
+            section = text[parent_start:parent_end]
+            for start, end in split_spans(section, child_chunk_size, chunk_overlap=0, offset=parent_start):
+                starts.append(start)
+                ends.append(end)
+                parents.append(parent_index)
+                levels.append(CHILD)
+    return ChunkBatch(text, metadata or {}, starts, ends, parents, levels)
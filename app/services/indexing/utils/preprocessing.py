@@ -1,32 +1,161 @@
 import unicodedata
 import re
-from typing import Optional
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Set
+
+# Separates pages in the text returned by DocumentService.parse_pdf
+PAGE_BREAK = "\f"
+
+# Control characters are dropped and tabs become spaces in one str.translate pass
+_TRANSLATE = {c: None for c in (*range(0x00, 0x09), 0x0B, 0x0C, *range(0x0E, 0x20), 0x7F)}
+_TRANSLATE[ord("\t")] = " "
+
+_LINE_ENDINGS = re.compile(r"\r\n?")
+# Paragraph breaks and runs of spaces, collapsed in a single scan
+_WHITESPACE = re.compile(r"\n\s*\n| {2,}")
+_DIGITS = re.compile(r"\d+")
+_SPACES = re.compile(r"\s+")
+# Page numbers: a bare number, "- 3 -", "3 / 10", or any line saying "page 3 (of 10)"
+_PAGE_NUMBER = re.compile(r"^[-\u2013\u2014 ]*\d+( ?(/|of) ?\d+)?[-\u2013\u2014 ]*$|\bpage ?\d+( ?(/|of) ?\d+)?\b")
+
+
+def _collapse(match: "re.Match") -> str:
+    return "\n\n" if match.group()[0] == "\n" else " "
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize('NFC', text)
+    return _LINE_ENDINGS.sub("\n", text).translate(_TRANSLATE)
+
+
+def _clean_whitespace(text: str) -> str:
+    return _WHITESPACE.sub(_collapse, text).strip()
+
 
 def preprocess_text(text: str, clean_whitespace: bool = True) -> str:
     """
     Preprocess text for embedding and storage
-    
+
     Args:
         text: Text to preprocess
         clean_whitespace: Whether to clean redundant whitespace
-        
+
     Returns:
         Preprocessed text
     """
-    # Normalize unicode characters
-    text = unicodedata.normalize('NFC', text)
-    
-    # Remove null bytes and other control characters
-    text = re.sub(r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F]', '', text)
-    
-    # Standardize line endings
-    text = text.replace('\r\n', '\n').replace('\r', '\n')
-    
+    text = _normalize(text)
+    if clean_whitespace:
+        text = _clean_whitespace(text)
+    return text
+
+
+def line_signature(line: str) -> str:
+    """
+    Key under which a line counts as repeated. Digits are masked only in
+    page numbers, so "Page 3 of 10" matches across pages but "Section 1"
+    and "Section 2" stay different lines.
+    """
+    line = _SPACES.sub(" ", line.strip().lower())
+    if _PAGE_NUMBER.search(line):
+        return _DIGITS.sub("#", line)
+    return line
+
+
+def _edge_indices(lines: List[str], edge_lines: int) -> List[int]:
+    """
+    Indices of the first and last `edge_lines` non-blank lines of a page.
+    The two windows never meet: on a short page each shrinks so that at
+    least one line in the middle is not a candidate.
+    """
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    edge = min(edge_lines, (len(filled) - 1) // 2)
+    if edge <= 0:
+        return []
+    return filled[:edge] + filled[-edge:]
+
+
+@dataclass
+class PreprocessStats:
+    pages: int = 0
+    chars_in: int = 0
+    chars_out: int = 0
+    lines_removed: int = 0
+    repeated_lines: List[str] = field(default_factory=list)
+
+    @property
+    def chars_saved(self) -> int:
+        return self.chars_in - self.chars_out
+
+
+def find_repeated_lines(
+    pages: List[List[str]],
+    min_page_ratio: float = 0.6,
+    edge_lines: int = 3,
+    min_pages: int = 3,
+) -> Set[str]:
+    """
+    Signatures of lines that sit near the top or bottom of at least
+    `min_page_ratio` of the pages: running headers, footers, page numbers
+    and disclaimers. A line counts once per page.
+    """
+    if len(pages) < min_pages:
+        return set()
+
+    counts: Counter = Counter()
+    for lines in pages:
+        counts.update({line_signature(lines[i]) for i in _edge_indices(lines, edge_lines)})
+
+    threshold = max(min_pages, min_page_ratio * len(pages))
+    return {signature for signature, count in counts.items() if count >= threshold}
+
+
+def preprocess_pages(
+    pages: Iterable[str],
+    clean_whitespace: bool = True,
+    strip_repeated: bool = True,
+    min_page_ratio: float = 0.6,
+    edge_lines: int = 3,
+    stats: Optional[PreprocessStats] = None,
+) -> str:
+    """
+    Preprocess a document page by page, dropping lines repeated across pages
+
+    Args:
+        pages: Raw text of each page, in order
+        clean_whitespace: Whether to clean redundant whitespace
+        strip_repeated: Whether to remove repeated headers and footers
+        min_page_ratio: Fraction of pages a line must appear on to be removed
+        edge_lines: Lines at the top and bottom of a page considered for removal
+        stats: Filled in with what was removed, if given
+
+    Returns:
+        Preprocessed text
+    """
+    stats = stats if stats is not None else PreprocessStats()
+    split_pages: List[List[str]] = []
+    for page in pages:
+        stats.pages += 1
+        stats.chars_in += len(page)
+        split_pages.append(_normalize(page).split("\n"))
+
+    repeated = find_repeated_lines(split_pages, min_page_ratio, edge_lines) if strip_repeated else set()
+    stats.repeated_lines = sorted(repeated)
+
+    kept_pages = []
+    for lines in split_pages:
+        if repeated:
+            # Only the page edges are candidates, so body text that happens
+            # to match a header is left alone
+            drop = {i for i in _edge_indices(lines, edge_lines) if line_signature(lines[i]) in repeated}
+            # A page is never emptied, whatever matched
+            if drop and len(drop) < sum(1 for line in lines if line.strip()):
+                stats.lines_removed += len(drop)
+                lines = [line for i, line in enumerate(lines) if i not in drop]
+        kept_pages.append("\n".join(lines))
+
+    text = "\n".join(kept_pages)
     if clean_whitespace:
-        # Remove redundant whitespace while preserving paragraph breaks
-        text = re.sub(r'\n\s*\n', '\n\n', text)  # Standardize paragraph breaks
-        text = re.sub(r' +', ' ', text)  # Multiple spaces to single space
-        text = re.sub(r'\t', ' ', text)  # Tabs to spaces
-        text = text.strip()  # Remove leading/trailing whitespace
-    
-    return text
\ No newline at end of file
+        text = _clean_whitespace(text)
+    stats.chars_out = len(text)
+    return text
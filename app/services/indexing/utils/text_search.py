@@ -0,0 +1,42 @@
+from typing import Any, Dict, List, Optional
+
+# Text search configurations that ship with PostgreSQL
+SEARCH_CONFIGS = frozenset({
+    "simple", "arabic", "armenian", "basque", "catalan", "danish", "dutch",
+    "english", "finnish", "french", "german", "greek", "hindi", "hungarian",
+    "indonesian", "irish", "italian", "lithuanian", "nepali", "norwegian",
+    "portuguese", "romanian", "russian", "serbian", "spanish", "swedish",
+    "tamil", "turkish", "yiddish",
+})
+
+_LANGUAGE_CODES = {
+    "ar": "arabic", "ca": "catalan", "da": "danish", "de": "german",
+    "el": "greek", "en": "english", "es": "spanish", "eu": "basque",
+    "fi": "finnish", "fr": "french", "ga": "irish", "hi": "hindi",
+    "hu": "hungarian", "hy": "armenian", "id": "indonesian", "it": "italian",
+    "lt": "lithuanian", "ne": "nepali", "nl": "dutch", "no": "norwegian",
+    "pt": "portuguese", "ro": "romanian", "ru": "russian", "sr": "serbian",
+    "sv": "swedish", "ta": "tamil", "tr": "turkish", "yi": "yiddish",
+}
+
+
+def search_config_for(metadata: Optional[Dict[str, Any]], default: str = "english") -> str:
+    """
+    Text search configuration for a document, from the `language` in its
+    metadata (an ISO 639-1 code such as "de" or a name such as "german").
+    Unknown languages fall back to `default`.
+    """
+    language = str((metadata or {}).get("language") or "").strip().lower()
+    if language in SEARCH_CONFIGS:
+        return language
+    return _LANGUAGE_CODES.get(language.split("-")[0].split("_")[0], default)
+
+
+def query_configs(configured: str, default: str = "english") -> Optional[List[str]]:
+    """
+    Configurations hybrid_search parses a query with: `default` plus the
+    comma-separated `configured` ones. None when that is `default` alone,
+    so hybrid_search keeps its single-configuration plan with no recheck.
+    """
+    configs = {config.strip().lower() for config in configured.split(",") if config.strip()} | {default}
+    return sorted(configs) if len(configs) > 1 else None
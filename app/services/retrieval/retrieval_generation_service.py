@@ -1,31 +1,166 @@
-from typing import Any, AsyncGenerator, Dict, List
+import json
+import logging
+from typing import Any, AsyncGenerator, Dict, List, Optional
 
+from app.config import get_settings
+from app.core.admission import AdmissionController, get_admission_controller
 from app.core.embeddings import EmbeddingProvider
+from app.core.metrics import stage
+from app.core.singleflight import BroadcastFlight, SingleFlight, flight_key
 
-from .retriever import create_retriever, preprocess_query
-from .utils.generation import call_llm_stream, generate_response
+from .retriever import (create_embeddings, create_page_retriever,
+                        create_retriever, preprocess_query)
+from .utils.generation import call_llm_stream
+from .utils.pagination import (Keyset, PageCursor, next_cursor,
+                               query_fingerprint)
+from .utils.prompt import build_messages
+
+logger = logging.getLogger(__name__)
+
+# Process-wide, since a service instance is created per request
+_retrievals: SingleFlight[List[Dict[Any, Any]]] = SingleFlight("retrieval")
+_generations = BroadcastFlight("generation")
 
 
 class RetrievalGenerationService:
     def __init__(self, embedding_provider: EmbeddingProvider):
         self.embedding_provider = embedding_provider
         self.retriever = create_retriever(embedding_provider)
-        
-    async def process_query(self, query: str) -> AsyncGenerator[str, None]:
+        self.page_retriever = create_page_retriever(embedding_provider)
+        self.coalesce = get_settings().query_coalescing_enabled
+        self.owner_routing = get_settings().chunk_owner_routing
+
+    def _scope(self, user_id: Optional[str]) -> Optional[str]:
+        """The owner results are limited to, which identical queries must share to coalesce"""
+        return str(user_id) if self.owner_routing and user_id else None
+
+    async def _retrieve(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+        user_id: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+    ) -> List[Dict[Any, Any]]:
+        """Retrieve, sharing the search with identical concurrent queries"""
+        retrieve = lambda: self.retriever(
+            query, override_match_count=limit, user_id=user_id, mmr_lambda=mmr_lambda
+        )
+        if not self.coalesce:
+            return await retrieve()
+        return await _retrievals.do(flight_key(query, limit, mmr_lambda, self._scope(user_id)), retrieve)
+
+    async def _generate(
+        self,
+        query: str,
+        user_id: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+    ) -> AsyncGenerator[str, None]:
+        # Retrieve relevant documents
+        retrieved_docs = await self._retrieve(query, user_id=user_id, mmr_lambda=mmr_lambda)
+
+        # Generate prompt
+        with stage("query", "prompt"):
+            messages = build_messages(query, retrieved_docs)
+
+        # Get streaming response; the LLM slot is held until the stream ends
+        with stage("query", "llm_connect"):
+            return await get_admission_controller().guard_stream(
+                AdmissionController.LLM,
+                lambda: call_llm_stream(messages),
+                user_id=user_id,
+            )
+
+    async def process_query(
+        self,
+        query: str,
+        user_id: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+    ) -> AsyncGenerator[str, None]:
         """Process a query through the RAG pipeline"""
         # Preprocess the query
         processed_query = preprocess_query(query)
-        
-        # Retrieve relevant documents
-        retrieved_docs = await self.retriever(processed_query)
-        
-        # Generate prompt
-        prompt = generate_response(processed_query, retrieved_docs)
-        
-        # Get streaming response
-        return await call_llm_stream(prompt)
-        
-    async def retrieve_documents(self, query: str, limit: int = 5) -> List[Dict[Any, Any]]:
+
+        if not self.coalesce:
+            return await self._generate(processed_query, user_id, mmr_lambda)
+
+        # Identical queries in flight share one generation; tokens are
+        # replayed to anyone who joins after the stream has started
+        return await _generations.subscribe(
+            flight_key(processed_query, mmr_lambda, self._scope(user_id)),
+            lambda: self._generate(processed_query, user_id, mmr_lambda),
+        )
+
+    async def retrieve_documents(
+        self,
+        query: str,
+        limit: int = 5,
+        user_id: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
+    ) -> List[Dict[Any, Any]]:
         """Just retrieve documents without generation"""
         processed_query = preprocess_query(query)
-        return await self.retriever(processed_query, override_match_count=limit) 
\ No newline at end of file
+        return await self._retrieve(processed_query, limit, user_id, mmr_lambda)
+
+    def _resume(self, fingerprint: str, cursor: Optional[str]) -> PageCursor:
+        """Where a paged result set continues; raises InvalidCursor for another query's cursor"""
+        if cursor:
+            return PageCursor.decode(cursor, fingerprint, get_settings().retrieval_page_window)
+        return PageCursor(fingerprint, get_settings().retrieval_page_window, None)
+
+    async def retrieve_page(
+        self,
+        query: str,
+        limit: int = 5,
+        user_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """One page of retrieve-only results, with the cursor for the next page (None on the last)"""
+        processed_query = preprocess_query(query)
+        fingerprint = query_fingerprint(processed_query, user_id)
+        start = self._resume(fingerprint, cursor)
+        rows, after = await self.page_retriever(processed_query, limit, user_id, start.after, start.window)
+        return {"documents": rows, "next_cursor": next_cursor(fingerprint, start.window, after)}
+
+    async def stream_documents(
+        self,
+        query: str,
+        user_id: Optional[str] = None,
+        cursor: Optional[str] = None,
+        max_results: Optional[int] = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Retrieve-only results as NDJSON, one {"document": ...} line per
+        passage, fetched a page at a time so only one page is held. The last
+        line is {"next_cursor": ...}, set when max_results search matches
+        were sent before the ranking ran out.
+        """
+        processed_query = preprocess_query(query)
+        fingerprint = query_fingerprint(processed_query, user_id)
+        start = self._resume(fingerprint, cursor)
+        page_size = get_settings().retrieval_stream_page_size
+        # Embedded once up front, so admission and cursor errors surface
+        # before the response starts
+        query_embedding = await create_embeddings(processed_query, self.embedding_provider, user_id)
+
+        async def lines() -> AsyncGenerator[str, None]:
+            after: Optional[Keyset] = start.after
+            sent = 0
+            try:
+                while max_results is None or sent < max_results:
+                    size = page_size if max_results is None else min(page_size, max_results - sent)
+                    rows, after = await self.page_retriever(
+                        processed_query, size, user_id, after, start.window, query_embedding
+                    )
+                    for row in rows:
+                        yield json.dumps({"document": row}) + "\n"
+                    sent += size
+                    if after is None:
+                        break
+            except Exception as e:
+                # The status line has gone out; report the failure in-band
+                logger.exception("Retrieval stream failed")
+                yield json.dumps({"error": str(e)}) + "\n"
+                return
+            yield json.dumps({"next_cursor": next_cursor(fingerprint, start.window, after)}) + "\n"
+
+        return lines()
@@ -1,13 +1,22 @@
 import asyncio
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 
+from app.config import get_settings
+from app.core.admission import AdmissionController, get_admission_controller
 from app.core.embeddings import EmbeddingProvider
+from app.core.index_snapshot import get_index_snapshot
+from app.core.metrics import stage
+from app.core.projection import get_projection
+from app.services.indexing.utils.text_search import query_configs
 from app.supabase_client.supabase_client import supabase_client
 
-supabase = supabase_client()
+from .utils.mmr import diversify
+from .utils.pagination import Keyset
+from .utils.passages import (load_texts, parent_metadata, slice_text,
+                             widen_passages)
 
 def preprocess_query(query: str) -> str:
     """Clean and normalize the query text."""
@@ -33,11 +42,21 @@ def preprocess_query_for_tsquery(query: str) -> str:
     
     return formatted_query
 
-async def create_embeddings(query: str, embedding_provider: EmbeddingProvider):
+async def create_embeddings(
+    query: str,
+    embedding_provider: EmbeddingProvider,
+    user_id: Optional[str] = None,
+):
     """Create embeddings for the query asynchronously."""
     preprocessed_query = preprocess_query(query)
-    # Use the embedding provider to generate embeddings
-    embeddings = embedding_provider.get_embedding([preprocessed_query])
+    # Use the embedding provider to generate embeddings, behind the query admission lane
+    async with get_admission_controller().slot(
+        AdmissionController.QUERY_EMBEDDING, user_id=user_id
+    ):
+        with stage("query", "embed"):
+            embeddings = await asyncio.to_thread(
+                embedding_provider.get_embedding, [preprocessed_query]
+            )
     
     # Return the first (and only) embedding
     return embeddings[0] if embeddings else []
@@ -46,32 +65,203 @@ def create_retriever(
     embedding_provider: EmbeddingProvider,
     match_count: int = 10,
 ):  
+    settings = get_settings()
+
     async def retrieve(
         query: str,
-        override_match_count: Optional[int] = None
+        override_match_count: Optional[int] = None,
+        user_id: Optional[str] = None,
+        mmr_lambda: Optional[float] = None,
     ) -> List[Dict[Any, Any]]:
         # Generate embedding for the query
-        query_embedding = await create_embeddings(query, embedding_provider)
+        query_embedding = await create_embeddings(query, embedding_provider, user_id)
         
         # Use override parameters if provided, otherwise use defaults
         count = override_match_count if override_match_count is not None else match_count        
+        # Several children usually share a parent, so search a few more of them
+        search_count = count * settings.retrieval_child_overfetch if settings.chunk_parent_child else count
+        params = {
+            "query_text": query,
+            "query_embedding": query_embedding,
+            "match_count": search_count,
+            "text_search_config": settings.text_search_config,
+            # Each chunk's keyword match uses its document's language
+            "search_configs": query_configs(settings.text_search_configs, settings.text_search_config),
+        }
+        owner_id = str(user_id) if settings.chunk_owner_routing and user_id else None
+        if owner_id:
+            # Only the caller's chunks; on a partitioned table, only their partition
+            params["filter_owner"] = owner_id
+        if mmr_lambda is None and settings.retrieval_mmr_enabled:
+            mmr_lambda = settings.retrieval_mmr_lambda
+        snapshot = None
+        if mmr_lambda is not None:
+            # Off the loop: a rebuilt snapshot is remapped (and verified) here
+            snapshot = await asyncio.to_thread(get_index_snapshot)
+            # Candidates for diversification need their vectors; the local
+            # snapshot has most of them, otherwise they come back with the results
+            params["match_count"] = search_count * settings.retrieval_mmr_candidates
+            params["include_embedding"] = snapshot is None
+        projection = get_projection()
+        if projection:
+            # Search the reduced vectors, then rescore the best at full dimension
+            params["query_embedding_reduced"] = projection.transform(query_embedding).tolist()
+            params["reduced_version"] = projection.version
+            params["rescore_count"] = max(settings.search_rescore_candidates, params["match_count"] * 2)
         # Call the hybrid_search function using RPC
-        result = await asyncio.to_thread(
-            lambda: supabase.rpc(
-                "hybrid_search",
-                {
-                    "query_text": query,
-                    "query_embedding": query_embedding,
-                    "match_count": count
-                }
-            ).execute()
-        )
+        with stage("query", "hybrid_search"):
+            result = await asyncio.to_thread(
+                lambda: supabase_client().rpc("hybrid_search", params).execute()
+            )
         
-        # Ensure all data is JSON serializable
-        return _ensure_serializable(result.data)
+        rows = result.data
+        if mmr_lambda is not None:
+            with stage("query", "mmr"):
+                if snapshot is not None:
+                    vectors = snapshot.vectors_for([row["id"] for row in rows])
+                    for row, vector in zip(rows, vectors):
+                        row["embedding"] = vector
+                    # Chunks newer than the snapshot and its last catch-up
+                    await _fetch_missing_embeddings(rows, owner_id)
+                rows = await asyncio.to_thread(diversify, rows, search_count, mmr_lambda)
+            for row in rows:
+                row.pop("embedding", None)
+        return await _passages(rows, count, owner_id)
         
     return retrieve
 
+def create_page_retriever(embedding_provider: EmbeddingProvider):
+    settings = get_settings()
+
+    async def retrieve_page(
+        query: str,
+        page_size: int,
+        user_id: Optional[str] = None,
+        after: Optional[Keyset] = None,
+        window: Optional[int] = None,
+        query_embedding: Optional[List[float]] = None,
+    ) -> Tuple[List[Dict[Any, Any]], Optional[Keyset]]:
+        """
+        One page of search rows, ranked among `window` candidates per search
+        leg and starting after the keyset `after`. Returns the page's passages
+        and the keyset to continue from, or None after the last page.
+        """
+        if query_embedding is None:
+            query_embedding = await create_embeddings(query, embedding_provider, user_id)
+        window = window or settings.retrieval_page_window
+        params = {
+            "query_text": query,
+            "query_embedding": query_embedding,
+            "match_count": page_size,
+            "text_search_config": settings.text_search_config,
+            "search_configs": query_configs(settings.text_search_configs, settings.text_search_config),
+            # Fixed across pages, so each page is cut from the same ranking
+            "candidate_count": window,
+        }
+        owner_id = str(user_id) if settings.chunk_owner_routing and user_id else None
+        if owner_id:
+            params["filter_owner"] = owner_id
+        if after is not None:
+            params["after_score"], params["after_id"] = after
+        projection = get_projection()
+        if projection:
+            params["query_embedding_reduced"] = projection.transform(query_embedding).tolist()
+            params["reduced_version"] = projection.version
+            params["rescore_count"] = max(settings.search_rescore_candidates, window * 2)
+        with stage("query", "hybrid_search"):
+            result = await asyncio.to_thread(
+                lambda: supabase_client().rpc("hybrid_search", params).execute()
+            )
+        
+        rows = result.data
+        # A short page is the last one
+        last = (rows[-1]["score"], str(rows[-1]["id"])) if rows and len(rows) == page_size else None
+        # Every matched child's parent is kept, so a parent can recur on a
+        # later page with other children
+        return await _passages(rows, len(rows), owner_id), last
+    
+    return retrieve_page
+
+async def _passages(
+    rows: List[Dict[str, Any]], count: int, owner_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Search rows as the passages returned: parent sections or widened chunks, JSON-ready"""
+    settings = get_settings()
+    if settings.chunk_parent_child:
+        with stage("query", "parents"):
+            rows = await _expand_to_parents(rows, count, owner_id)
+    elif settings.chunk_text_storage == "offsets" and settings.retrieval_context_chars:
+        with stage("query", "context"):
+            rows = await widen_passages(supabase_client(), rows, settings.retrieval_context_chars)
+    
+    # Ensure all data is JSON serializable
+    with stage("query", "serialize"):
+        return _ensure_serializable(rows)
+
+async def _fetch_missing_embeddings(rows: List[Dict[str, Any]], owner_id: Optional[str] = None) -> None:
+    """Fill in the vectors the snapshot does not hold, which MMR would otherwise treat as unlike everything"""
+    missing = [str(row["id"]) for row in rows if row.get("embedding") is None]
+    if not missing:
+        return
+    query = supabase_client().table("document_chunks").select("id, embedding").in_("id", missing)
+    if owner_id:
+        query = query.eq("owner_id", owner_id)
+    result = await asyncio.to_thread(query.execute)
+    embeddings = {str(chunk["id"]): chunk["embedding"] for chunk in result.data}
+    for row in rows:
+        if row.get("embedding") is None:
+            row["embedding"] = embeddings.get(str(row["id"]))
+
+def _parent_key(row: Dict[str, Any]) -> str:
+    """Children group under their parent; parents and flat chunks stand alone"""
+    return (row.get("metadata") or {}).get("parent_id") or row["id"]
+
+async def _expand_to_parents(
+    rows: List[Dict[str, Any]], count: int, owner_id: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Replace matched children with their parent sections, keeping the rank of
+    each parent's best child and returning at most `count` parents.
+    """
+    groups: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        key = _parent_key(row)
+        if key in groups:
+            groups[key]["matched_chunk_ids"].append(row["id"])
+            continue
+        if len(groups) == count:
+            continue
+        groups[key] = {**row, "matched_chunk_ids": [row["id"]]}
+    
+    parent_ids = [key for key, row in groups.items() if key != row["id"]]
+    # Decided per row, not by the current chunk_text_storage: children written
+    # in offsets mode point into the document text whatever the setting is now
+    spanned = [key for key in parent_ids if "text_version" in (groups[key].get("metadata") or {})]
+    if spanned:
+        # A parent is a span of the document text the children point into
+        texts = await load_texts(supabase_client(), [groups[key] for key in spanned])
+        for key in spanned:
+            metadata = groups[key].get("metadata") or {}
+            content = slice_text(texts, groups[key], metadata.get("parent_span"))
+            if content is not None:
+                groups[key].update(id=key, content=content, metadata=parent_metadata(metadata))
+        parent_ids = [key for key, row in groups.items() if key != row["id"]]
+    if parent_ids:
+        query = supabase_client().table("document_chunks").select("id, document_id, content, metadata").in_("id", parent_ids)
+        if owner_id:
+            query = query.eq("owner_id", owner_id)
+        result = await asyncio.to_thread(query.execute)
+        parents = {str(parent["id"]): parent for parent in result.data}
+        for key in parent_ids:
+            parent = parents.get(key)
+            # Parents stored in offsets mode have no content of their own; if
+            # their span could not be resolved, the child stays the passage
+            if parent and parent["content"]:
+                groups[key].update(
+                    id=parent["id"], content=parent["content"], metadata=parent["metadata"]
+                )
+    return list(groups.values())
+
 def _ensure_serializable(data):
     """Recursively convert any NumPy arrays to lists to ensure JSON serializability."""
     if isinstance(data, np.ndarray):
@@ -1,57 +1,51 @@
-from typing import List, Dict, Any
+from typing import Dict, List
 import os
-from openai import AsyncOpenAI
 import asyncio
 from dotenv import load_dotenv
 import logging
 
+from app.core.metrics import instrument_stream, record_prompt_cache
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-def generate_response(query, retrieved_documents: List[Dict[Any, Any]]):
-    # Format retrieved documents into context
-    context = ""
-    for i, doc in enumerate(retrieved_documents):
-        source = doc.get('metadata', {}).get('source', 'Unknown')
-        page = doc.get('metadata', {}).get('page', 'Unknown')
-        context += f"\nDocument {i+1} (Source: {source}, Page: {page}):\n{doc['content']}\n"
-    
-    # Create a structured prompt
-    prompt = f"""
-    User Query: {query}
-    
-    Retrieved Information:
-    {context}
-    
-    Based on the above information only, provide a comprehensive answer to the user's query.
-    If the information is not sufficient to answer the query, acknowledge this limitation.
-    Include citations to the specific documents you reference.
-    """
-    
-    return prompt
+def _record_usage(usage) -> None:
+    """Prompt-cache outcome from the final usage chunk"""
+    hit = getattr(usage, "prompt_cache_hit_tokens", None)
+    miss = getattr(usage, "prompt_cache_miss_tokens", None)
+    if hit is None:
+        # OpenAI-style usage reports only the cached part
+        details = getattr(usage, "prompt_tokens_details", None)
+        hit = getattr(details, "cached_tokens", 0) or 0
+        miss = (usage.prompt_tokens or 0) - hit
+    record_prompt_cache(hit, miss or 0)
 
-async def call_llm_stream(prompt):
-    # Set up your API client
+async def call_llm_stream(messages: List[Dict[str, str]]):
+    """Stream a chat completion; `messages` come from prompt.build_messages"""
+    # Set up your API client; the SDK is large, so it is imported on first use
+    from openai import AsyncOpenAI
     client = AsyncOpenAI(api_key=os.getenv('DEEPSEEK_API_KEY'), base_url="https://api.deepseek.com")
 
     try:     
         # Start the stream in a separate thread
         stream = await client.chat.completions.create(
             model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant, answer the user's query based on the provided information."},
-                {"role": "user", "content": prompt},
-            ],
+            messages=messages,
             stream=True,
+            # The last chunk then carries usage, including prompt cache hits
+            stream_options={"include_usage": True},
             temperature=0.5,
         )
             
         async def generator():
             async for chunk in stream:
-                yield chunk.choices[0].delta.content or ""
+                if chunk.usage is not None:
+                    _record_usage(chunk.usage)
+                if chunk.choices:
+                    yield chunk.choices[0].delta.content or ""
 
-        response_messages = generator()
+        response_messages = instrument_stream(generator())
         return response_messages
     except Exception as e:
         logger.error(f"Error calling LLM API: {e}")
@@ -0,0 +1,63 @@
+import json
+from typing import Any, List, Sequence
+
+import numpy as np
+
+
+def parse_embedding(value: Any) -> np.ndarray:
+    """pgvector values arrive from PostgREST as "[0.1,0.2,...]" strings"""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def maximal_marginal_relevance(
+    relevance: Sequence[float],
+    embeddings: np.ndarray,
+    k: int,
+    lambda_mult: float = 0.5,
+) -> List[int]:
+    """
+    Pick k indices trading relevance against similarity to what is already picked.
+
+    Each step scores every candidate as
+        lambda_mult * relevance - (1 - lambda_mult) * max similarity to the selection
+    from one pairwise similarity matrix and a running max that is updated
+    with the newly selected row, so a step is O(n) numpy work. lambda_mult=1
+    keeps the relevance order; lower values favour diversity.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    vectors = embeddings / np.clip(norms, 1e-12, None)
+    similarity = vectors @ vectors.T
+
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = [int(np.argmax(relevance))]
+    for _ in range(k - 1):
+        last = selected[-1]
+        available[last] = False
+        np.maximum(redundancy, similarity[last], out=redundancy)
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        selected.append(int(np.argmax(scores)))
+    return selected
+
+
+def diversify(rows: List[dict], k: int, lambda_mult: float) -> List[dict]:
+    """MMR over search results carrying an "embedding"; relevance is the hybrid score"""
+    if len(rows) <= 1:
+        return rows[:k]
+    parsed = [parse_embedding(row["embedding"]) if row.get("embedding") is not None else None for row in rows]
+    dim = next((len(vector) for vector in parsed if vector is not None), 1)
+    # Rows without a vector count as unlike everything
+    embeddings = np.stack([vector if vector is not None else np.zeros(dim, np.float32) for vector in parsed])
+    scores = np.asarray([row.get("score") or 0.0 for row in rows], dtype=np.float32)
+    # Scale to [0, 1] so lambda weighs it against cosine similarity
+    relevance = scores / scores.max() if scores.max() > 0 else scores
+    return [rows[i] for i in maximal_marginal_relevance(relevance, embeddings, k, lambda_mult)]
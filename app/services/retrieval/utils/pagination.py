@@ -0,0 +1,59 @@
+"""
+Cursors for paged retrieve-only results.
+
+A cursor carries the (score, chunk id) of the last search row a client
+received, the candidate window the ranking was cut from, and a fingerprint
+of the query and caller, so it can only continue the result set it came
+from. It is opaque to clients: URL-safe base64 of a small JSON object.
+It is not signed, so the window is capped on decode: a client could
+otherwise ask every page to rank the whole table.
+"""
+import base64
+import hashlib
+import json
+from dataclasses import dataclass, replace
+from typing import Any, Optional, Tuple
+from uuid import UUID
+
+from app.core.singleflight import flight_key
+
+# (score, chunk id) of a search row; pages continue after it
+Keyset = Tuple[float, str]
+
+
+class InvalidCursor(ValueError):
+    """The cursor is malformed or belongs to another query"""
+
+
+def query_fingerprint(query: str, *scope: Any) -> str:
+    return hashlib.sha256(json.dumps(flight_key(query, *scope), default=str).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class PageCursor:
+    fingerprint: str
+    window: int
+    after: Optional[Keyset]  # None before the first page
+
+    def encode(self) -> str:
+        score, chunk_id = self.after
+        raw = json.dumps({"q": self.fingerprint, "w": self.window, "s": score, "i": chunk_id}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str, fingerprint: str, max_window: int) -> "PageCursor":
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            decoded = cls(str(data["q"]), int(data["w"]), (float(data["s"]), str(UUID(data["i"]))))
+        except (ValueError, KeyError, TypeError) as e:
+            raise InvalidCursor("Malformed cursor") from e
+        if decoded.fingerprint != fingerprint or decoded.window < 1:
+            raise InvalidCursor("Cursor does not belong to this query")
+        if decoded.window > max_window:
+            # Also shrinks the window of cursors issued before the setting was lowered
+            decoded = replace(decoded, window=max_window)
+        return decoded
+
+
+def next_cursor(fingerprint: str, window: int, after: Optional[Keyset]) -> Optional[str]:
+    return PageCursor(fingerprint, window, after).encode() if after is not None else None
@@ -0,0 +1,85 @@
+"""
+Passage text from offsets into the stored document text.
+
+Used for chunks written while chunk_text_storage was "offsets" (see
+app.core.document_text), whatever the setting is now: search rows carry
+their chunk's span and the version of the text it points into, and the texts for a result set come from the worker's cache or one
+batched fetch of the documents that are missing.
+"""
+import asyncio
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.core.document_text import (TextKey, decompress_text, get_text_cache,
+                                    text_version)
+
+# Child-only metadata, dropped when a child is replaced by its parent
+_CHILD_KEYS = ("parent_index", "parent_id", "parent_span", "start_index", "end_index")
+
+
+def _text_key(row: Dict[str, Any]) -> Optional[TextKey]:
+    version = (row.get("metadata") or {}).get("text_version")
+    if version is None or row.get("document_id") is None:
+        return None
+    return str(row["document_id"]), version
+
+
+def _decompress_all(data: List[Dict[str, Any]]) -> Dict[TextKey, str]:
+    texts = {}
+    for document in data:
+        if document.get("content_compressed"):
+            text = decompress_text(document["content_compressed"])
+            texts[(str(document["id"]), text_version(text))] = text
+    return texts
+
+
+async def load_texts(client, rows: Sequence[Dict[str, Any]]) -> Dict[TextKey, str]:
+    """The document texts the rows point into, fetching the uncached ones in one query"""
+    keys = {key for key in map(_text_key, rows) if key is not None}
+    cache = get_text_cache()
+    texts = cache.get_many(keys)
+    missing = sorted({document_id for document_id, version in keys - texts.keys()})
+    if missing:
+        result = await asyncio.to_thread(
+            client.table("documents").select("id, content_compressed").in_("id", missing).execute
+        )
+        for key, text in (await asyncio.to_thread(_decompress_all, result.data)).items():
+            cache.put(key, text)
+            # A document reprocessed since the search ran has a new version
+            # and leaves its old offsets unresolved
+            if key in keys:
+                texts[key] = text
+    return texts
+
+
+def slice_text(
+    texts: Dict[TextKey, str], row: Dict[str, Any], span: Optional[Sequence[int]], widen: int = 0
+) -> Optional[str]:
+    """The text of `span` in the row's document, `widen` characters wider on each side"""
+    text = texts.get(_text_key(row))
+    if text is None or not span:
+        return None
+    start, end = span
+    return text[max(0, start - widen):end + widen]
+
+
+def parent_metadata(child_metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """A parent's metadata, rebuilt from the document-level keys its child shares"""
+    start, end = child_metadata["parent_span"]
+    metadata = {key: value for key, value in child_metadata.items() if key not in _CHILD_KEYS}
+    metadata.update(
+        level="parent", chunk_index=child_metadata.get("parent_index"), start_index=start, end_index=end
+    )
+    return metadata
+
+
+async def widen_passages(client, rows: List[Dict[str, Any]], chars: int) -> List[Dict[str, Any]]:
+    """Extend each chunk by `chars` of its neighbouring text on both sides"""
+    texts = await load_texts(client, rows)
+    for row in rows:
+        metadata = row.get("metadata") or {}
+        if "end_index" not in metadata:
+            continue
+        content = slice_text(texts, row, (metadata["start_index"], metadata["end_index"]), chars)
+        if content is not None:
+            row["content"] = content
+    return rows
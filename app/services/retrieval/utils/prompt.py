@@ -0,0 +1,52 @@
+"""
+Prompt assembly ordered for provider-side prefix caching.
+
+DeepSeek caches prompt prefixes across requests, so the request is laid
+out from most to least stable: the fixed system instructions, then the
+retrieved context in a deterministic order (by document, then position in
+the document, not by rank), and the user's query last. Two queries that
+retrieve the same or overlapping chunks share everything up to the first
+chunk where they differ.
+"""
+from typing import Any, Dict, List
+
+SYSTEM_PROMPT = """You are a helpful assistant that answers questions using only the documents provided in the conversation.
+
+Rules:
+- Base the answer on the provided documents only.
+- If the documents are not sufficient to answer the question, say so.
+- Cite the documents you rely on by their number, e.g. [Document 2].
+- Give a comprehensive answer to the question that follows the documents."""
+
+
+def _sort_key(doc: Dict[str, Any]):
+    metadata = doc.get("metadata") or {}
+    return (
+        str(doc.get("document_id") or ""),
+        metadata.get("chunk_index", doc.get("chunk_index", 0)) or 0,
+        str(doc.get("id") or ""),
+    )
+
+
+def order_context(retrieved_documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Retrieved chunks in document order, independent of their rank for this query"""
+    return sorted(retrieved_documents, key=_sort_key)
+
+
+def format_context(retrieved_documents: List[Dict[str, Any]]) -> str:
+    sections = []
+    for i, doc in enumerate(retrieved_documents):
+        metadata = doc.get("metadata") or {}
+        source = metadata.get("source") or metadata.get("filename") or "Unknown"
+        page = metadata.get("page", "Unknown")
+        sections.append(f"Document {i + 1} (Source: {source}, Page: {page}):\n{doc['content']}")
+    return "\n\n".join(sections)
+
+
+def build_messages(query: str, retrieved_documents: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Chat messages for the LLM: stable instructions, ordered context, then the query"""
+    context = format_context(order_context(retrieved_documents))
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"Documents:\n\n{context}\n\nQuestion: {query}"},
+    ]
@@ -8,8 +8,6 @@ from app.supabase_client.supabase_client import supabase_client
 
 from ..indexing.embeddings import encode_texts
 
-supabase = supabase_client()
-
 def preprocess_query(query: str) -> str:
     """Clean and normalize the query text."""
     return query.strip()
@@ -60,7 +58,7 @@ def create_retriever(
         count = override_match_count if override_match_count is not None else match_count        
         # Call the hybrid_search function using RPC
         result = await asyncio.to_thread(
-            lambda: supabase.rpc(
+            lambda: supabase_client().rpc(
                 "hybrid_search",
                 {
                     "query_text": query,
@@ -1,19 +1,22 @@
 import os
-from supabase import create_client, Client
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 load_dotenv()
 
-supabase_instance: Optional[Client] = None
+supabase_instance: Optional["Client"] = None
 
-def supabase_client() -> Optional[Client]:
+def supabase_client() -> Optional["Client"]:
+    """The shared client, created on first use so importing the app stays cheap"""
     global supabase_instance
     
     if supabase_instance is None:
+        from supabase import create_client
         url = os.getenv("SUPABASE_URL")
         key = os.getenv("SUPABASE_ANON_KEY")
         supabase_instance = create_client(url, key)
     
     return supabase_instance
-    
\ No newline at end of file
@@ -0,0 +1,122 @@
+"""
+Peak memory of turning a document's text into chunk rows.
+
+Runs the same parent-child chunking two ways under tracemalloc: the previous
+path, which built a LangChain Document per chunk, kept every embedding as a
+list of Python floats and created a DocumentChunk object per row before the
+commit, and the ChunkBatch path, which keeps offsets in arrays, embeddings
+in one float32 matrix and builds row dicts a page at a time for the bulk
+INSERT. Embeddings are random vectors of the production dimension, so only
+the bookkeeping around them is measured.
+
+    python -m benchmarks.chunk_memory [--pages 50 200] [--dim 1024]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from uuid import uuid4
+
+import numpy as np
+
+# harness sets placeholder settings, so it must come before any app import
+from . import harness  # noqa: F401
+from .text_storage import document_text
+
+from app.models.chunks import DocumentChunk
+from app.services.indexing.utils.chunk_batch import PARENT
+from app.services.indexing.utils.chunking import _splitter, chunk_text
+from langchain.schema import Document as LangchainDocument
+
+
+def _vectors(count: int, dim: int) -> np.ndarray:
+    return np.random.default_rng(0).standard_normal((count, dim), dtype=np.float32)
+
+
+def legacy_rows(text: str, dim: int, chunk_size: int, child_size: int) -> int:
+    """Documents per chunk, float lists per embedding, an ORM object per row"""
+    chunks = []
+    for parent_index, parent in enumerate(
+        _splitter(chunk_size, 0).split_documents([LangchainDocument(page_content=text, metadata={"filename": "bench.pdf"})])
+    ):
+        parent.metadata["level"] = "parent"
+        chunks.append(parent)
+        children = _splitter(child_size, 0).split_documents(
+            [LangchainDocument(page_content=parent.page_content, metadata=dict(parent.metadata))]
+        )
+        for child in children:
+            child.metadata.update(level="child", parent_index=parent_index)
+        chunks.extend(children)
+    embedded = [chunk for chunk in chunks if chunk.metadata["level"] != "parent"]
+    embeddings = iter(_vectors(len(embedded), dim).tolist())
+
+    objects, parent_id = [], None
+    for i, chunk in enumerate(chunks):
+        is_parent = chunk.metadata["level"] == "parent"
+        row = DocumentChunk(
+            id=uuid4(),
+            document_id=None,
+            content=chunk.page_content,
+            chunk_index=i,
+            parent_id=None if is_parent else parent_id,
+            chunk_metadata={**chunk.metadata, "chunk_index": i},
+            embedding=None if is_parent else next(embeddings),
+        )
+        if is_parent:
+            parent_id = row.id
+        objects.append(row)
+    return len(objects)
+
+
+def batch_rows(text: str, dim: int, chunk_size: int, child_size: int, page: int = 500) -> int:
+    """ChunkBatch arrays, one float32 matrix, row dicts one page at a time"""
+    chunks = chunk_text(text, {"filename": "bench.pdf"}, chunk_size, child_size)
+    chunks.embeddings = _vectors(len(chunks.embedded_positions()), dim)
+    ids = [uuid4() for _ in range(len(chunks))]
+    embedded = chunks.levels != PARENT
+    vector_rows = np.cumsum(embedded) - 1
+    written = 0
+    for start in range(0, len(chunks), page):
+        rows = []
+        for i in range(start, min(start + page, len(chunks))):
+            parent = chunks.parents[i]
+            rows.append({
+                "id": ids[i],
+                "content": chunks.chunk_text(i),
+                "chunk_index": i,
+                "parent_id": ids[parent] if parent >= 0 else None,
+                "chunk_metadata": chunks.chunk_metadata(i),
+                "embedding": chunks.embeddings[vector_rows[i]] if embedded[i] else None,
+            })
+        written += len(rows)  # Handed to the INSERT, then dropped
+    return written
+
+
+def measure(path, *args) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    rows = path(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"rows": rows, "peak_mb": round(peak / 2**20, 1), "seconds": round(elapsed, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="*", default=[50, 200])
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--child-size", type=int, default=250)
+    args = parser.parse_args()
+
+    report = {}
+    for pages in args.pages:
+        text = document_text(pages, seed=pages)
+        params = (text, args.dim, args.chunk_size, args.child_size)
+        report[f"{pages}p"] = {"legacy": measure(legacy_rows, *params), "chunk_batch": measure(batch_rows, *params)}
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
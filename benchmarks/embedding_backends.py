@@ -0,0 +1,63 @@
+"""
+Parity check and throughput benchmark for the embedding backends.
+
+    python -m benchmarks.embedding_backends --texts 512 --batch-size 32
+
+The ONNX backends need pip install -r requirements-onnx.txt.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+from app.core.embeddings import EmbeddingProvider, SentenceTransformerProvider
+from app.core.onnx_embeddings import (PARITY_TEXTS, OnnxRuntimeProvider,
+                                      check_parity)
+
+
+def synthetic_texts(count: int, words: int = 180) -> List[str]:
+    """Chunk-sized texts roughly matching the 1000-character ingestion chunks"""
+    base = " ".join(
+        "confidential agreement party term notice clause obligation payment".split()
+        * (words // 8 + 1)
+    )
+    return [f"{i} {base}"[: words * 6] for i in range(count)]
+
+
+async def measure(provider: EmbeddingProvider, texts: List[str], batch_size: int) -> Dict[str, float]:
+    await provider.get_embeddings_batch(texts[:batch_size], batch_size)  # Warm caches
+    start = time.perf_counter()
+    await provider.get_embeddings_batch(texts, batch_size)
+    elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 3), "texts_per_second": round(len(texts) / elapsed, 1)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=None, help="ONNX intra-op threads")
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.texts)
+    torch_provider = SentenceTransformerProvider()
+    report = {"torch": await measure(torch_provider, texts, args.batch_size)}
+
+    for quantize in (False, True):
+        name = "onnx_int8" if quantize else "onnx_fp32"
+        provider = OnnxRuntimeProvider(quantize=quantize, intra_op_threads=args.threads)
+        result = await measure(provider, texts, args.batch_size)
+        try:
+            result["min_cosine"] = round(check_parity(provider, torch_provider, PARITY_TEXTS + texts[:8]), 5)
+            result["parity"] = "pass"
+        except ValueError as e:
+            result["parity"] = str(e)
+        result["speedup"] = round(result["texts_per_second"] / report["torch"]["texts_per_second"], 2)
+        report[name] = result
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,349 @@
+"""
+Local stand-ins for the external services the RAG pipeline talks to.
+
+Nothing here opens a network connection: the Supabase client answers
+`hybrid_search` from an in-memory index, the LLM is a canned token stream
+and the database session keeps ORM objects in a dict.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+from uuid import UUID, uuid4
+
+import numpy as np
+
+from app.core.embeddings import EmbeddingProvider
+from app.core.storage import StorageProvider
+from app.models import Document, DocumentChunk
+
+EMBEDDING_DIM = 1024
+_TOKEN = re.compile(r"\w+")
+
+
+class HashEmbeddingProvider(EmbeddingProvider):
+    """
+    Deterministic bag-of-words hashing embedder.
+
+    Cheap enough that ingestion benchmarks measure our code rather than the
+    model; pass --embedder model to the runners to include the real model.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def encode_batch(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in _TOKEN.findall(text.lower()):
+                digest = hashlib.blake2b(token.encode(), digest_size=4).digest()
+                matrix[row, int.from_bytes(digest, "little") % self.dim] += 1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.clip(norms, 1e-12, None)
+
+    def get_embedding(self, text: str) -> List[float]:
+        if isinstance(text, list):
+            return self.encode_batch(text).tolist()
+        return self.encode_batch([text])[0].tolist()
+
+    async def get_embeddings_batch(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
+        if not texts:
+            return []
+        return (await self.get_embeddings_matrix(texts, batch_size)).tolist()
+
+    async def get_embeddings_matrix(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return await asyncio.to_thread(self.encode_batch, texts)
+
+
+class InMemoryIndex:
+    """Chunk store shared by the fake session, storage provider and Supabase client"""
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+        self.rows: List[Dict[str, Any]] = []
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+        self.owners: Dict[str, Optional[str]] = {}
+        # documents rows as PostgREST returns them, for offset-stored text
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self._terms: List[set] = []
+        self._matrix = np.zeros((0, dim), dtype=np.float32)
+        self._pending: List[List[float]] = []
+        # Searches run in worker threads while inserts land on the event loop
+        self._lock = threading.Lock()
+
+    def add(self, chunk: DocumentChunk) -> None:
+        with self._lock:
+            self._add(chunk)
+
+    def _add(self, chunk: DocumentChunk) -> None:
+        row = {
+            "id": str(chunk.id),
+            "document_id": str(chunk.document_id),
+            "content": chunk.content,
+            "chunk_index": chunk.chunk_index,
+            "metadata": chunk.chunk_metadata or {},
+        }
+        self.by_id[row["id"]] = row
+        self.owners[row["id"]] = str(chunk.owner_id) if chunk.owner_id else None
+        if chunk.embedding is None:
+            return  # Parent sections are fetched by id, never searched
+        self.rows.append(row)
+        self._terms.append(set(_TOKEN.findall(chunk.content.lower())))
+        self._pending.append(chunk.embedding)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._pending:
+            self._matrix = np.vstack([self._matrix, np.asarray(self._pending, dtype=np.float32)])
+            self._pending = []
+        return self._matrix
+
+    def search(
+        self, query_text: str, query_embedding: List[float], match_count: int, include_embedding: bool = False,
+        filter_owner: Optional[str] = None, candidate_count: Optional[int] = None,
+        after_score: Optional[float] = None, after_id: Optional[str] = None,
+    ) -> List[Dict]:
+        """Reciprocal-rank fusion of cosine similarity and keyword overlap, like hybrid_search"""
+        with self._lock:
+            return self._search(
+                query_text, query_embedding, match_count, include_embedding, filter_owner,
+                candidate_count, after_score, after_id,
+            )
+
+    def _search(
+        self, query_text: str, query_embedding: List[float], match_count: int, include_embedding: bool,
+        filter_owner: Optional[str] = None, candidate_count: Optional[int] = None,
+        after_score: Optional[float] = None, after_id: Optional[str] = None,
+    ) -> List[Dict]:
+        matrix = self.matrix
+        if not len(matrix):
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        similarity = matrix @ (query / max(np.linalg.norm(query), 1e-12))
+        if filter_owner is not None:
+            # Other owners' chunks rank below every match, and are dropped below
+            foreign = np.fromiter(
+                (self.owners[row["id"]] != filter_owner for row in self.rows), dtype=bool, count=len(self.rows)
+            )
+            similarity = np.where(foreign, -np.inf, similarity)
+
+        terms = set(_TOKEN.findall(query_text.lower()))
+        keyword = np.fromiter(
+            (len(terms & row_terms) for row_terms in self._terms),
+            dtype=np.float32,
+            count=len(self.rows),
+        )
+
+        pool = min(len(matrix), candidate_count or match_count * 2)
+        # Stable, so ties keep one order from call to call
+        vector_rank = np.argsort(-similarity, kind="stable")[:pool]
+        keyword_rank = np.argsort(-keyword, kind="stable")[:pool]
+        scores: Dict[int, float] = {}
+        for ranking in (vector_rank, keyword_rank):
+            for rank, index in enumerate(ranking):
+                scores[int(index)] = scores.get(int(index), 0.0) + 1.0 / (50 + rank + 1)
+
+        if filter_owner is not None:
+            scores = {i: score for i, score in scores.items() if not foreign[i]}
+        # Ordered by (score, id) descending, the keyset pages continue after
+        ranked = sorted(scores, key=lambda i: (scores[i], self.rows[i]["id"]), reverse=True)
+        if after_score is not None:
+            ranked = [i for i in ranked if (scores[i], self.rows[i]["id"]) < (after_score, after_id)]
+        best = ranked[:match_count]
+        results = [
+            {**self.rows[i], "similarity": float(similarity[i]), "score": scores[i]}
+            for i in best
+        ]
+        if include_embedding:
+            # PostgREST serializes pgvector values as text
+            for i, row in zip(best, results):
+                row["embedding"] = json.dumps(matrix[i].tolist())
+        return results
+
+
+class FakeSupabaseClient:
+    """Answers the `hybrid_search` RPC from an InMemoryIndex"""
+
+    def __init__(self, index: InMemoryIndex, latency: float = 0.0):
+        self.index = index
+        self.latency = latency
+        self.auth = FakeAuth()
+
+    def rpc(self, name: str, params: Dict[str, Any]):
+        if name != "hybrid_search":
+            raise ValueError(f"Unknown RPC {name}")
+
+        def execute():
+            if self.latency:
+                import time
+                time.sleep(self.latency)  # execute() is sync, like the real client
+            return SimpleNamespace(data=self.index.search(
+                params["query_text"], params["query_embedding"], params["match_count"],
+                params.get("include_embedding", False), params.get("filter_owner"),
+                params.get("candidate_count"), params.get("after_score"), params.get("after_id"),
+            ))
+
+        return SimpleNamespace(execute=execute)
+
+    def table(self, name: str) -> "FakeTableQuery":
+        if name == "document_chunks":
+            return FakeTableQuery(self.index.by_id, self.index.owners, latency=self.latency)
+        if name == "documents":
+            return FakeTableQuery(self.index.documents, latency=self.latency)
+        raise ValueError(f"Unknown table {name}")
+
+
+class FakeTableQuery:
+    """select(...).in_("id", ids).eq("owner_id", owner).execute() over the chunk or document rows"""
+
+    def __init__(
+        self,
+        rows: Dict[str, Dict[str, Any]],
+        owners: Optional[Dict[str, Optional[str]]] = None,
+        latency: float = 0.0,
+    ):
+        self.rows = rows
+        self.owners = owners or {}
+        self.latency = latency
+        self._ids: List[str] = []
+        self._owner: Optional[str] = None
+
+    def select(self, columns: str) -> "FakeTableQuery":
+        return self
+
+    def in_(self, column: str, values: List[str]) -> "FakeTableQuery":
+        if column != "id":
+            raise ValueError(f"Unsupported filter column {column}")
+        self._ids = [str(value) for value in values]
+        return self
+
+    def eq(self, column: str, value: str) -> "FakeTableQuery":
+        if column != "owner_id":
+            raise ValueError(f"Unsupported filter column {column}")
+        self._owner = str(value)
+        return self
+
+    def execute(self):
+        if self.latency:
+            import time
+            time.sleep(self.latency)
+        return SimpleNamespace(data=[
+            self.rows[i] for i in self._ids
+            if i in self.rows and (self._owner is None or self.owners.get(i) == self._owner)
+        ])
+
+
+class FakeAuth:
+    """Accepts any bearer token and maps it to a stable user; "admin..." tokens are admins"""
+
+    def get_user(self, token: str):
+        user_id = str(UUID(hashlib.md5(token.encode()).hexdigest()))
+        now = datetime.now(UTC).isoformat()
+        return SimpleNamespace(user=SimpleNamespace(
+            id=user_id,
+            email=f"{user_id[:8]}@bench.local",
+            user_metadata={},
+            app_metadata={"role": "admin"} if token.startswith("admin") else {},
+            aud="authenticated",
+            created_at=now,
+            updated_at=now,
+        ))
+
+
+class InMemoryVectorStore(StorageProvider):
+    def __init__(self, index: InMemoryIndex):
+        self.index = index
+
+    async def similarity_search(self, query_vector: List[float], limit: int = 5) -> List[Dict]:
+        return self.index.search("", query_vector, limit)
+
+
+class FakeAsyncSession:
+    """The subset of AsyncSession that DocumentService uses"""
+
+    def __init__(self, index: InMemoryIndex, autocreate: bool = False, owner_id: Optional[UUID] = None):
+        self.index = index
+        self.autocreate = autocreate  # Act as if the frontend created every document
+        self.owner_id = owner_id  # ... for this user
+        self.documents: Dict[UUID, Document] = {}
+        self._staged: List[Any] = []
+
+    def seed_document(self, document_id: Optional[UUID] = None, user_id: Optional[UUID] = None) -> Document:
+        """Create the document row the frontend would normally insert first"""
+        document = Document(
+            id=document_id or uuid4(),
+            user_id=user_id or uuid4(),
+            original_filename="bench.pdf",
+            storage_url="",
+            processing_status="pending",
+            created_at=datetime.now(UTC),
+        )
+        self.documents[document.id] = document
+        return document
+
+    async def get(self, model, key):
+        if model is Document:
+            if self.autocreate and key not in self.documents:
+                self.seed_document(key, self.owner_id)
+            return self.documents.get(key)
+        return None
+
+    async def execute(self, statement, params=None):
+        if isinstance(params, list) and getattr(getattr(statement, "table", None), "name", None) == "document_chunks":
+            # insert(DocumentChunk) with a page of rows
+            self._staged.extend(SimpleNamespace(**row) for row in params)
+        return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: []), rowcount=0)
+
+    def add(self, obj) -> None:
+        self._staged.append(obj)
+
+    def add_all(self, objs) -> None:
+        self._staged.extend(objs)
+
+    async def flush(self) -> None:
+        pass
+
+    async def commit(self) -> None:
+        for obj in self._staged:
+            if isinstance(obj, (DocumentChunk, SimpleNamespace)):
+                self.index.add(obj)
+        self._staged = []
+        for document in self.documents.values():
+            compressed = document.__dict__.get("content_compressed")
+            if compressed is not None:
+                # PostgREST serializes bytea as hex text
+                self.index.documents[str(document.id)] = {
+                    "id": str(document.id), "content_compressed": "\\x" + compressed.hex(),
+                }
+
+    async def rollback(self) -> None:
+        self._staged = []
+
+    async def refresh(self, obj) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+async def stub_llm_stream(
+    messages: List[Dict[str, str]],
+    tokens: int = 64,
+    ttft: float = 0.0,
+    token_interval: float = 0.0,
+) -> AsyncIterator[str]:
+    """Stand-in for call_llm_stream that yields canned tokens"""
+
+    async def generator():
+        if ttft:
+            await asyncio.sleep(ttft)
+        for i in range(tokens):
+            if token_interval:
+                await asyncio.sleep(token_interval)
+            yield f"token{i} "
+
+    return generator()
@@ -0,0 +1,123 @@
+"""
+Cold import time of app.main, with a budget.
+
+Imports the app in fresh interpreters and reports the median wall time, the
+slowest modules from `python -X importtime` (cumulative) and the self time
+per top-level package. Heavy dependencies are meant to load on first use or
+in the lifespan, so importing any module in LAZY is reported as well.
+
+Exits with status 1 if the median exceeds --budget or a lazy dependency is
+imported, so it can gate worker startup the way benchmarks.run gates
+latency.
+
+    python -m benchmarks.import_time [--budget 1.5] [--runs 5] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+# Only for the placeholder environment; the app itself is imported in children
+from .harness import _PLACEHOLDER_ENV
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds a cold import of app.main may take
+BUDGET_SECONDS = 1.5
+
+# Loaded on first use, never by importing the app
+LAZY = (
+    "torch", "sentence_transformers", "onnxruntime", "transformers", "openai",
+    "langchain", "langchain_core", "langchain_text_splitters", "pypdf",
+    "supabase", "alembic",
+)
+
+_TIMED_IMPORT = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "lazy": sorted(m for m in %r if m in sys.modules)}))
+"""
+
+
+def _env() -> Dict[str, str]:
+    env = {**_PLACEHOLDER_ENV, **os.environ}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def timed_import() -> Dict:
+    result = subprocess.run(
+        [sys.executable, "-c", _TIMED_IMPORT % (LAZY,)],
+        cwd=ROOT, env=_env(), capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def import_profile() -> List[Tuple[str, int, int]]:
+    """(module, self µs, cumulative µs) for every module app.main pulls in"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=ROOT, env=_env(), capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(own), int(cumulative)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=BUDGET_SECONDS, help="Seconds allowed for a cold import of app.main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # The first run also writes bytecode, so it is not counted
+    timed_import()
+    runs = [timed_import() for _ in range(args.runs)]
+    seconds = statistics.median(run["seconds"] for run in runs)
+    lazy_loaded = sorted({name for run in runs for name in run["lazy"]})
+
+    profile = import_profile()
+    packages = defaultdict(int)
+    for name, own, _ in profile:
+        packages[name.split(".")[0]] += own
+    report = {
+        "import_app_ms": round(seconds * 1000, 1),
+        "budget_ms": round(args.budget * 1000, 1),
+        "lazy_dependencies_imported": lazy_loaded,
+        "slowest_modules_ms": {
+            name: round(cumulative / 1000, 1)
+            for name, _, cumulative in sorted(profile, key=lambda row: -row[2])[:args.top]
+        },
+        "packages_self_ms": {
+            name: round(own / 1000, 1)
+            for name, own in sorted(packages.items(), key=lambda item: -item[1])[:args.top]
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+    failed = False
+    if seconds > args.budget:
+        print(f"OVER BUDGET: import app.main took {seconds:.3f}s (budget {args.budget:.3f}s)")
+        failed = True
+    if lazy_loaded:
+        print(f"EAGER IMPORT: {', '.join(lazy_loaded)} loaded by import app.main")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f"import app.main within {args.budget:.3f}s budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""
+End-to-end load generator for a full API worker.
+
+Boots app.main:app under uvicorn in a child process with stubbed auth,
+Supabase RPC, PDF storage and LLM streaming (each with configurable
+latency), then ramps concurrency against it with a weighted mix of
+
+    query    POST /query/query  retrieve_only=true
+    stream   POST /query/query  streamed answer (TTFT and full latency)
+    upload   POST /upload/upload-pdf
+
+and reports, per concurrency step, successful requests/s, p50/p99 per
+operation, TTFT, shed/failed requests and the worker's event-loop lag
+(sampled through /admin/profile/sample). The summary names the knee: the
+step where throughput stops scaling while tail latency keeps growing.
+
+    python -m benchmarks.loadgen
+    python -m benchmarks.loadgen --concurrency 1 4 16 64 --step-seconds 20 \\
+        --mix query=5,stream=4,upload=1 --llm-ttft 0.4 --rpc-latency 0.03
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+# The worker must not touch a real database or load the model unless asked
+os.environ.setdefault("DB_MIGRATE_ON_STARTUP", "false")
+
+# harness sets placeholder settings, so it must come before any app import
+from . import harness
+from .fakes import FakeAsyncSession, FakeAuth, InMemoryIndex, stub_llm_stream
+from .run import QUERIES
+from .synthetic_pdf import build_pdf
+
+ADMIN_TOKEN = "admin-loadgen"
+USER_TOKEN = "loadgen-user"
+READY_MARKER = "LOADGEN-WORKER "
+PDF_NAME = "load.pdf"
+
+
+# --- worker process -------------------------------------------------------
+
+def serve(args) -> None:
+    """Run the API with every external dependency replaced by a local fake"""
+    import uvicorn
+
+    import app.main as main
+    from app.dependencies.db import get_db
+    from app.services.retrieval import retrieval_generation_service
+
+    embedder = harness.make_embedder(args.embedder)
+    index = InMemoryIndex()
+    pdf_server = harness.PdfServer(
+        {PDF_NAME: build_pdf(args.pdf_pages, seed=1)}, latency=args.download_latency
+    ).__enter__()
+
+    async def seed_corpus():
+        # Something for retrieval to find before the first upload lands
+        files = {f"seed-{i}.pdf": build_pdf(args.seed_pages, seed=100 + i) for i in range(args.seed_docs)}
+        with harness.PdfServer(files) as server:
+            for name in files:
+                service = harness.make_document_service(index, embedder)
+                document = service.db.seed_document()
+                await service.process_pdf_complete(server.url(name), document.id, document.user_id)
+
+    asyncio.run(seed_corpus())
+
+    # Also answers the auth dependency's get_user
+    harness.install_fake_supabase(index, latency=args.rpc_latency)
+    main.create_embedding_provider = lambda: embedder
+
+    async def fake_llm(messages):
+        return await stub_llm_stream(
+            messages, tokens=args.llm_tokens, ttft=args.llm_ttft, token_interval=args.llm_token_interval
+        )
+
+    retrieval_generation_service.call_llm_stream = fake_llm
+
+    async def fake_db():
+        # Uploads only replace the caller's own documents
+        yield FakeAsyncSession(index, autocreate=True, owner_id=FakeAuth().get_user(USER_TOKEN).user.id)
+
+    main.app.dependency_overrides[get_db] = fake_db
+    # The driver reads the storage URL from here
+    info = {"pdf_url": pdf_server.url(PDF_NAME), "chunks": len(index.rows)}
+    print(READY_MARKER + json.dumps(info), flush=True)
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning", loop="asyncio")
+
+
+# --- driver ---------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ("query", "stream", "upload"):
+            raise argparse.ArgumentTypeError(f"Unknown operation {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class Step:
+    """Samples collected at one concurrency level"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.latency: Dict[str, List[float]] = {}
+        self.ttft: List[float] = []
+        self.status: Dict[str, int] = {}
+        self.ok = 0
+        self.seconds = 0.0
+        self.loop_lag: Optional[Dict] = None
+
+    def record(self, operation: str, status: int, latency: float, ttft: Optional[float] = None) -> None:
+        key = str(status)
+        self.status[key] = self.status.get(key, 0) + 1
+        if 200 <= status < 300:
+            self.ok += 1
+            self.latency.setdefault(operation, []).append(latency)
+            if ttft is not None:
+                self.ttft.append(ttft)
+
+    def report(self) -> Dict:
+        report = {
+            "concurrency": self.concurrency,
+            "requests_per_s": round(self.ok / self.seconds, 2) if self.seconds else 0.0,
+            "ok": self.ok,
+            "status": self.status,
+            "operations": {op: harness.percentiles(samples) for op, samples in self.latency.items()},
+        }
+        all_samples = [s for samples in self.latency.values() for s in samples]
+        if all_samples:
+            report["all"] = harness.percentiles(all_samples)
+        if self.ttft:
+            report["stream_ttft"] = harness.percentiles(self.ttft)
+        if self.loop_lag:
+            report["loop_lag"] = {
+                "max_ms": self.loop_lag["max_lag_ms"],
+                "stalls": len(self.loop_lag["blocked"]),
+                "worst": self.loop_lag["blocked"][:3],
+            }
+        return report
+
+
+async def run_operation(client, operation: str, step: Step, pdf_url: str, unique: bool, rng: random.Random):
+    query = rng.choice(QUERIES)
+    if unique:
+        # Defeat request coalescing so every request does the full work
+        query = f"{query} {rng.randrange(10**9)}"
+    start = time.perf_counter()
+    try:
+        if operation == "query":
+            response = await client.post("/query/query", json={"message": query, "retrieve_only": True, "limit": 5})
+            step.record(operation, response.status_code, time.perf_counter() - start)
+        elif operation == "stream":
+            ttft = None
+            async with client.stream("POST", "/query/query", json={"message": query}) as response:
+                async for chunk in response.aiter_text():
+                    if chunk and ttft is None:
+                        ttft = time.perf_counter() - start
+            step.record(operation, response.status_code, time.perf_counter() - start, ttft)
+        else:
+            response = await client.post(
+                "/upload/upload-pdf", params={"document_url": pdf_url, "document_id": str(uuid4())}
+            )
+            step.record(operation, response.status_code, time.perf_counter() - start)
+    except Exception as e:
+        step.record(operation, 0, time.perf_counter() - start)
+        step.status[type(e).__name__] = step.status.get(type(e).__name__, 0) + 1
+
+
+async def run_step(client, concurrency: int, seconds: float, mix: Dict[str, float], pdf_url: str, unique: bool) -> Step:
+    step = Step(concurrency)
+    operations, weights = list(mix), list(mix.values())
+    deadline = time.perf_counter() + seconds
+
+    async def user(seed: int):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            operation = rng.choices(operations, weights)[0]
+            await run_operation(client, operation, step, pdf_url, unique, rng)
+
+    async def sample_lag():
+        response = await client.post(
+            "/admin/profile/sample",
+            params={"seconds": seconds, "interval_ms": 20},
+            headers={"Authorization": f"Bearer {ADMIN_TOKEN}"},
+            timeout=seconds + 30,
+        )
+        if response.status_code == 200:
+            step.loop_lag = response.json()["loop_lag"]
+
+    start = time.perf_counter()
+    lag = asyncio.create_task(sample_lag())
+    await asyncio.gather(*[user(concurrency * 1000 + i) for i in range(concurrency)])
+    step.seconds = time.perf_counter() - start
+    await lag
+    return step
+
+
+def find_knee(steps: List[Dict], min_gain: float = 0.1, latency_growth: float = 1.5) -> Dict:
+    """
+    The knee is the last step before scaling stops paying: the next step
+    adds less than `min_gain` throughput while its p99 grows by more than
+    `latency_growth` times.
+    """
+    peak = max(steps, key=lambda s: s["requests_per_s"])
+    knee = steps[-1]
+    for current, following in zip(steps, steps[1:]):
+        gain = following["requests_per_s"] / max(current["requests_per_s"], 1e-9) - 1
+        p99 = current.get("all", {}).get("p99_ms") or 1e-9
+        growth = following.get("all", {}).get("p99_ms", 0) / p99
+        if gain < min_gain and growth > latency_growth:
+            knee = current
+            break
+    return {
+        "knee_concurrency": knee["concurrency"],
+        "knee_requests_per_s": knee["requests_per_s"],
+        "knee_p99_ms": knee.get("all", {}).get("p99_ms"),
+        "peak_concurrency": peak["concurrency"],
+        "peak_requests_per_s": peak["requests_per_s"],
+    }
+
+
+def print_table(steps: List[Dict]) -> None:
+    print(f"{'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'ttft p50':>9} {'lag max':>8} {'non-2xx':>8}")
+    for s in steps:
+        failed = sum(n for code, n in s["status"].items() if not code.startswith("2"))
+        print(
+            f"{s['concurrency']:>5} {s['requests_per_s']:>8} "
+            f"{s.get('all', {}).get('p50_ms', '-'):>8} {s.get('all', {}).get('p99_ms', '-'):>8} "
+            f"{s.get('stream_ttft', {}).get('p50_ms', '-'):>9} "
+            f"{s.get('loop_lag', {}).get('max_ms', '-'):>8} {failed:>8}"
+        )
+
+
+async def drive(args, base_url: str, pdf_url: str) -> Dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    headers = {"Authorization": f"Bearer {USER_TOKEN}"}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=120) as client:
+        for _ in range(300):  # Wait for startup (seeding, lifespan)
+            try:
+                if (await client.get("/health/ready")).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+        else:
+            raise RuntimeError("Worker did not become ready")
+
+        await run_step(client, 1, args.warmup_seconds, args.mix, pdf_url, args.unique_queries)
+        steps = []
+        for concurrency in args.concurrency:
+            step = (await run_step(client, concurrency, args.step_seconds, args.mix, pdf_url, args.unique_queries)).report()
+            steps.append(step)
+            print(f"concurrency {concurrency}: {step['requests_per_s']} req/s", file=sys.stderr)
+    return {"config": {k: v for k, v in vars(args).items() if k != "command"}, "steps": steps, "summary": find_knee(steps)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "serve"], help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--embedder", choices=["hash", "model"], default="hash")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--step-seconds", type=float, default=10.0)
+    parser.add_argument("--warmup-seconds", type=float, default=2.0)
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("query=6,stream=3,upload=1"))
+    parser.add_argument("--unique-queries", action=argparse.BooleanOptionalAction, default=True,
+                        help="Make every query distinct so coalescing does not hide load")
+    parser.add_argument("--rpc-latency", type=float, default=0.02, help="hybrid_search latency (s)")
+    parser.add_argument("--download-latency", type=float, default=0.05, help="PDF storage latency (s)")
+    parser.add_argument("--llm-ttft", type=float, default=0.3)
+    parser.add_argument("--llm-token-interval", type=float, default=0.01)
+    parser.add_argument("--llm-tokens", type=int, default=64)
+    parser.add_argument("--pdf-pages", type=int, default=5, help="Pages per uploaded PDF")
+    parser.add_argument("--seed-docs", type=int, default=5)
+    parser.add_argument("--seed-pages", type=int, default=20)
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args)
+        return
+
+    port = args.port or _free_port()
+    worker_args = [a for a in sys.argv[1:] if a != "run"]
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.loadgen", "serve", *worker_args, "--port", str(port)],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        for line in worker.stdout:
+            if line.startswith(READY_MARKER):
+                info = json.loads(line[len(READY_MARKER):])
+                break
+        else:
+            raise RuntimeError("Worker exited during startup")
+        # Keep draining so a chatty worker never blocks on a full pipe
+        threading.Thread(target=lambda: [None for _ in worker.stdout], daemon=True).start()
+        report = asyncio.run(drive(args, f"http://127.0.0.1:{port}", info["pdf_url"]))
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    report["corpus_chunks"] = info["chunks"]
+    print_table(report["steps"])
+    print(json.dumps(report["summary"], indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
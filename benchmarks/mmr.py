@@ -0,0 +1,96 @@
+"""
+MMR selection cost and effect on near-duplicate candidates.
+
+Builds candidate sets in which groups of results are near-copies of each
+other (the same boilerplate clause across documents), then compares
+top-k by score with MMR at a few lambdas: how many near-duplicate pairs
+end up in the selection, and how long selection takes for the vectorized
+implementation against a straightforward per-pair loop.
+
+    python -m benchmarks.mmr [--candidates 30 90 300] [--k 10]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+# harness sets placeholder settings, so it must come before any app import
+from . import harness  # noqa: F401
+
+from app.services.retrieval.utils.mmr import maximal_marginal_relevance
+
+
+def candidates(n: int, dim: int, copies: int, seed: int = 0):
+    """n vectors in groups of `copies` near-duplicates, with descending scores"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((-(-n // copies), dim)).astype(np.float32)
+    vectors = np.repeat(centers, copies, axis=0)[:n]
+    vectors += 0.05 * rng.standard_normal(vectors.shape).astype(np.float32)
+    # Copies score alike, so plain top-k takes whole groups
+    relevance = np.repeat(np.linspace(1.0, 0.5, len(centers)), copies)[:n]
+    relevance += 0.001 * rng.random(n)
+    return relevance.astype(np.float32), vectors
+
+
+def loop_mmr(relevance, embeddings, k, lambda_mult):
+    """Reference version: similarity recomputed pair by pair in Python"""
+    vectors = [v / np.linalg.norm(v) for v in embeddings]
+    selected = [int(np.argmax(relevance))]
+    while len(selected) < min(k, len(vectors)):
+        best, best_score = None, -np.inf
+        for i in range(len(vectors)):
+            if i in selected:
+                continue
+            redundancy = max(float(vectors[i] @ vectors[j]) for j in selected)
+            score = lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        selected.append(best)
+    return selected
+
+
+def duplicate_pairs(embeddings, selected, threshold: float = 0.95) -> int:
+    vectors = embeddings[selected] / np.linalg.norm(embeddings[selected], axis=1, keepdims=True)
+    similarity = vectors @ vectors.T
+    return int((np.triu(similarity, 1) > threshold).sum())
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--candidates", type=int, nargs="*", default=[30, 90, 300])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--copies", type=int, default=3, help="Near-duplicates per group")
+    parser.add_argument("--lambdas", type=float, nargs="*", default=[1.0, 0.7, 0.5])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    report = []
+    for n in args.candidates:
+        relevance, embeddings = candidates(n, args.dim, args.copies)
+        top_k = list(np.argsort(-relevance)[:args.k])
+        row = {"candidates": n, "top_k_duplicate_pairs": duplicate_pairs(embeddings, top_k)}
+        for lambda_mult in args.lambdas:
+            selected = maximal_marginal_relevance(relevance, embeddings, args.k, lambda_mult)
+            row[f"mmr_{lambda_mult}_duplicate_pairs"] = duplicate_pairs(embeddings, selected)
+        lambda_mult = args.lambdas[-1]
+        row["vectorized_ms"] = round(timed(
+            lambda: maximal_marginal_relevance(relevance, embeddings, args.k, lambda_mult), args.repeat
+        ), 3)
+        row["loop_ms"] = round(timed(
+            lambda: loop_mmr(relevance, embeddings, args.k, lambda_mult), max(1, args.repeat // 10)
+        ), 3)
+        report.append(row)
+    print(json.dumps({"k": args.k, "dim": args.dim, "copies": args.copies, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Retrieve-only results in one body against cursor pages and an NDJSON stream.
+
+Ingests synthetic documents, then fetches the top --results matches three
+ways: one response body, cursor pages of --page-size, and the NDJSON
+stream. Reports time to the first result, total time and traced peak
+memory for each, and checks that the pages and the stream return the same
+search matches as the single fetch, none twice. (With parent-child
+chunking, matches are grouped under their parents page by page, so only
+flat chunks also keep the single fetch's order.)
+
+    python -m benchmarks.paged_retrieval [--results 500] [--page-size 50]
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+# harness sets placeholder settings, so it must come before any app import
+from . import harness
+from .fakes import InMemoryIndex
+from .run import QUERIES
+from .text_storage import document_text
+
+from app.config import get_settings
+from app.services.retrieval.retrieval_generation_service import \
+    RetrievalGenerationService
+
+
+def matched_ids(rows: List[Dict[str, Any]]) -> List[str]:
+    return [chunk_id for row in rows for chunk_id in row.get("matched_chunk_ids") or [row["id"]]]
+
+
+async def ingest(index: InMemoryIndex, embedder, documents: int, pages: int) -> None:
+    for seed in range(documents):
+        service = harness.make_document_service(index, embedder)
+        document = service.db.seed_document()
+        text = document_text(pages, seed=seed)
+        chunks = await service.chunk_content(text, {"filename": f"bench-{seed}.pdf"})
+        await service.generate_embeddings(chunks)
+        await service.insert_document_with_chunks(
+            title=f"bench-{seed}.pdf", document_id=document.id, content=text, chunks=chunks,
+        )
+
+
+async def single(service: RetrievalGenerationService, query: str, results: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    page = await service.retrieve_page(query, results)
+    body = json.dumps(page)
+    elapsed = time.perf_counter() - start
+    return {"first_ms": elapsed * 1000, "total_ms": elapsed * 1000, "bytes": len(body), "ids": matched_ids(page["documents"])}
+
+
+async def paged(service: RetrievalGenerationService, query: str, results: int, page_size: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    first, cursor, ids, size = None, None, [], 0
+    while len(ids) < results:
+        page = await service.retrieve_page(query, min(page_size, results - len(ids)), cursor=cursor)
+        size += len(json.dumps(page))
+        first = first or time.perf_counter() - start
+        ids.extend(matched_ids(page["documents"]))
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    total = time.perf_counter() - start
+    return {"first_ms": first * 1000, "total_ms": total * 1000, "bytes": size, "ids": ids}
+
+
+async def streamed(service: RetrievalGenerationService, query: str, results: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    first, ids, size = None, [], 0
+    async for line in await service.stream_documents(query, max_results=results):
+        size += len(line)
+        first = first or time.perf_counter() - start
+        message = json.loads(line)
+        if "document" in message:
+            ids.extend(matched_ids([message["document"]]))
+    total = time.perf_counter() - start
+    return {"first_ms": first * 1000, "total_ms": total * 1000, "bytes": size, "ids": ids}
+
+
+async def measure(mode, *args) -> Dict[str, Any]:
+    tracemalloc.start()
+    result = await mode(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result["peak_mb"] = peak / 2**20
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=40, help="Pages per synthetic document")
+    parser.add_argument("--results", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005, help="Seconds per fake PostgREST call")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    settings.retrieval_stream_page_size = args.page_size
+    settings.retrieval_page_window = max(settings.retrieval_page_window, args.results * 2)
+    embedder = harness.HashEmbeddingProvider()
+    index = InMemoryIndex()
+    await ingest(index, embedder, args.documents, args.pages)
+    harness.install_fake_supabase(index, latency=args.latency)
+    service = RetrievalGenerationService(embedder)
+    # Builds the fake's search matrix outside the measured runs
+    await service.retrieve_page(QUERIES[0], 1)
+
+    report: Dict[str, Any] = {"corpus_chunks": len(index.rows)}
+    matches: Dict[str, List[List[str]]] = {}
+    for name, mode, extra in (
+        ("single", single, ()),
+        ("paged", paged, (args.page_size,)),
+        ("stream", streamed, ()),
+    ):
+        runs = [await measure(mode, service, query, args.results, *extra) for query in QUERIES]
+        report[name] = {
+            "first_result_ms": round(sum(run["first_ms"] for run in runs) / len(runs), 2),
+            "total_ms": round(sum(run["total_ms"] for run in runs) / len(runs), 2),
+            "peak_mb": round(max(run["peak_mb"] for run in runs), 2),
+            "response_bytes": round(sum(run["bytes"] for run in runs) / len(runs)),
+        }
+        matches[name] = [sorted(run["ids"]) for run in runs]
+    for name in ("paged", "stream"):
+        report[name]["same_matches_as_single"] = matches[name] == matches["single"]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""
+What header/footer stripping saves on the benchmark corpus.
+
+Runs each PDF through preprocessing with and without repeated-line removal
+and chunks both results, reporting characters, chunks and preprocessing time.
+
+    python -m benchmarks.preprocessing [--synthetic-pages 50 400]
+"""
+import argparse
+import json
+import time
+
+# harness sets placeholder settings, so it must come before any app import
+from . import harness  # noqa: F401
+from .run import corpus
+
+from app.services.indexing.document_service import DocumentService
+from app.services.indexing.utils.chunking import chunk_documents
+from app.services.indexing.utils.preprocessing import (PAGE_BREAK,
+                                                       PreprocessStats,
+                                                       preprocess_pages)
+from langchain.schema import Document as LangchainDocument
+
+
+def measure(pages, strip_repeated: bool, chunk_size: int):
+    stats = PreprocessStats()
+    start = time.perf_counter()
+    text = preprocess_pages(pages, strip_repeated=strip_repeated, stats=stats)
+    elapsed = time.perf_counter() - start
+    chunks = chunk_documents([LangchainDocument(page_content=text)], chunk_size)
+    return stats, len(chunks), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic-pages", type=int, nargs="*", default=[50, 400])
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    report = {}
+    for name, body in corpus(args.synthetic_pages).items():
+        pages = DocumentService._extract_text(body).split(PAGE_BREAK)
+        before, chunks_before, _ = measure(pages, False, args.chunk_size)
+        after, chunks_after, elapsed = measure(pages, True, args.chunk_size)
+        report[name.rsplit(".", 1)[0]] = {
+            "pages": after.pages,
+            "chars_before": before.chars_out,
+            "chars_after": after.chars_out,
+            "chars_saved_pct": round(100 * (1 - after.chars_out / max(before.chars_out, 1)), 2),
+            "chunks_before": chunks_before,
+            "chunks_after": chunks_after,
+            "chunks_saved": chunks_before - chunks_after,
+            "lines_removed": after.lines_removed,
+            "repeated_lines": after.repeated_lines,
+            "preprocess_ms": round(elapsed * 1000, 2),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
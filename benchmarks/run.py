@@ -0,0 +1,219 @@
+"""
+Offline ingestion and retrieval benchmarks.
+
+Ingests the sample PDF in data/ plus generated synthetic PDFs through
+DocumentService.process_pdf_complete, then measures retrieval and full
+query latency through RetrievalGenerationService against the ingested
+corpus. Everything runs against local stand-ins (see benchmarks/fakes.py).
+
+    python -m benchmarks.run                      # compare against baseline
+    python -m benchmarks.run --update-baseline    # record a new baseline
+    python -m benchmarks.run --embedder model     # include the real model
+
+Exits with status 1 if any metric regresses past the tolerance stored in
+the baseline file.
+"""
+import argparse
+import asyncio
+import glob
+import io
+import json
+import os
+import sys
+from typing import Dict, List, Tuple
+
+from pypdf import PdfReader
+
+# harness sets placeholder settings, so it must come before any app import
+from . import harness
+from .fakes import InMemoryIndex, stub_llm_stream
+from .synthetic_pdf import build_pdf
+
+from app.services.indexing.utils.chunking import chunk_text
+from app.services.retrieval import retrieval_generation_service
+from app.services.retrieval.retrieval_generation_service import \
+    RetrievalGenerationService
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(os.path.dirname(BENCH_DIR), "data")
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_TOLERANCE = 0.25
+
+QUERIES = [
+    "What are the confidentiality obligations of the intern?",
+    "termination notice period",
+    "Which law governs the agreement?",
+    "payment schedule and compensation",
+    "Can the agreement be assigned to a third party?",
+    "return or destroy confidential information",
+    "liability and indemnification clauses",
+    "intellectual property ownership",
+]
+
+# Metric name suffix -> whether a larger value is better
+_HIGHER_IS_BETTER = {"_per_s": True, "_ms": False, "_mb": False}
+
+
+def corpus(synthetic_pages: List[int]) -> Dict[str, bytes]:
+    files = {}
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, "*.pdf"))):
+        with open(path, "rb") as f:
+            files["sample.pdf"] = f.read()
+        break
+    for pages in synthetic_pages:
+        files[f"synthetic-{pages}p.pdf"] = build_pdf(pages, seed=pages)
+    return files
+
+
+async def bench_ingestion(
+    files: Dict[str, bytes], index: InMemoryIndex, embedder, repeat: int
+) -> Dict[str, Dict[str, float]]:
+    results = {}
+    # Chunking imports LangChain on first use; load it before RSS is sampled
+    chunk_text("warmup", {}, 1000)
+    with harness.PdfServer(files) as server:
+        for name, body in files.items():
+            pages = len(PdfReader(io.BytesIO(body)).pages)
+            elapsed = []
+            chunks = 0
+            with harness.PeakRSS() as rss:
+                for _ in range(repeat):
+                    service = harness.make_document_service(index, embedder)
+                    document = service.db.seed_document()
+                    before = len(index.rows)
+                    start = harness.timer()
+                    await service.process_pdf_complete(server.url(name), document.id, document.user_id)
+                    elapsed.append(harness.timer() - start)
+                    chunks = len(index.rows) - before
+            best = min(elapsed)
+            results[name.rsplit(".", 1)[0]] = {
+                "pages": pages,
+                "chunks": chunks,
+                "seconds": round(best, 4),
+                "pages_per_s": round(pages / best, 2),
+                "chunks_per_s": round(chunks / best, 2),
+                "peak_rss_mb": round(rss.peak_bytes / 2**20, 1),
+                "rss_growth_mb": round((rss.peak_bytes - rss.start_bytes) / 2**20, 1),
+            }
+    return results
+
+
+async def bench_retrieval(
+    index: InMemoryIndex, embedder, iterations: int, limit: int, rpc_latency: float
+) -> Dict[str, Dict[str, float]]:
+    harness.install_fake_supabase(index, latency=rpc_latency)
+    retrieval_generation_service.call_llm_stream = stub_llm_stream
+    service = RetrievalGenerationService(embedder)
+
+    for query in QUERIES:  # Warm up caches and lazy imports
+        await service.retrieve_documents(query, limit)
+
+    retrieve, first_token, full = [], [], []
+    for i in range(iterations):
+        query = QUERIES[i % len(QUERIES)]
+
+        start = harness.timer()
+        await service.retrieve_documents(query, limit)
+        retrieve.append(harness.timer() - start)
+
+        start = harness.timer()
+        stream = await service.process_query(query)
+        ttft = None
+        async for _ in stream:
+            if ttft is None:
+                ttft = harness.timer() - start
+        first_token.append(ttft)
+        full.append(harness.timer() - start)
+
+    return {
+        "retrieve": harness.percentiles(retrieve),
+        "query_ttft": harness.percentiles(first_token),
+        "query_total": harness.percentiles(full),
+        "corpus": {"chunks": len(index.rows), "rows": len(index.by_id)},
+    }
+
+
+def flatten(report: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current: Dict[str, float], baseline: Dict, tolerance: float) -> List[Tuple[str, float, float]]:
+    """Return (metric, baseline, current) for every regression beyond tolerance"""
+    regressions = []
+    for name, base in baseline.items():
+        if name not in current or not base:
+            continue
+        for suffix, higher_is_better in _HIGHER_IS_BETTER.items():
+            if not name.endswith(suffix):
+                continue
+            value = current[name]
+            if higher_is_better and value < base * (1 - tolerance):
+                regressions.append((name, base, value))
+            elif not higher_is_better and value > base * (1 + tolerance):
+                regressions.append((name, base, value))
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embedder", choices=["hash", "model"], default="hash")
+    parser.add_argument("--synthetic-pages", type=int, nargs="*", default=[50, 400])
+    parser.add_argument("--repeat", type=int, default=3, help="Ingestion runs per document (best is kept)")
+    parser.add_argument("--iterations", type=int, default=200, help="Queries for latency percentiles")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--rpc-latency", type=float, default=0.0, help="Simulated hybrid_search latency (s)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--tolerance", type=float, default=None)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    embedder = harness.make_embedder(args.embedder)
+    index = InMemoryIndex()
+    report = {
+        "ingestion": await bench_ingestion(corpus(args.synthetic_pages), index, embedder, args.repeat),
+        "retrieval": await bench_retrieval(index, embedder, args.iterations, args.limit, args.rpc_latency),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    current = flatten(report)
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "embedder": args.embedder,
+                "tolerance": args.tolerance if args.tolerance is not None else DEFAULT_TOLERANCE,
+                "metrics": current,
+            }, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("embedder") != args.embedder:
+        print(f"Baseline was recorded with --embedder {baseline.get('embedder')}; skipping comparison")
+        return
+
+    tolerance = args.tolerance if args.tolerance is not None else baseline.get("tolerance", DEFAULT_TOLERANCE)
+    regressions = compare(current, baseline["metrics"], tolerance)
+    for name, base, value in regressions:
+        print(f"REGRESSION {name}: {base} -> {value} (tolerance {tolerance:.0%})")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
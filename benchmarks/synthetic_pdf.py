@@ -0,0 +1,85 @@
+"""
+Minimal PDF writer for synthetic benchmark documents.
+
+Produces plain text pages (Helvetica, one text object per page) with a
+running header, footer and page number on every page, like the contracts
+we ingest in production.
+"""
+import random
+from typing import List
+
+_WORDS = (
+    "agreement party parties confidential information obligation term termination "
+    "notice period payment invoice liability indemnify warranty jurisdiction law "
+    "governing dispute arbitration intellectual property license employee intern "
+    "supervisor schedule compensation benefit clause section schedule annex breach "
+    "remedy damages consent assignment subcontract disclosure return destroy"
+).split()
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _paragraph(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def page_lines(rng: random.Random, page_number: int, total_pages: int, lines: int) -> List[str]:
+    body = []
+    while len(body) < lines:
+        sentence = _paragraph(rng, rng.randint(8, 16))
+        body.append(f"{rng.randint(1, 20)}.{rng.randint(1, 9)} {sentence}")
+    return (
+        ["ACME Corp - Master Services Agreement - Confidential"]
+        + body
+        + [f"Page {page_number} of {total_pages}"]
+    )
+
+
+def build_pdf(pages: int, lines_per_page: int = 45, seed: int = 0) -> bytes:
+    """Return the bytes of a text PDF with `pages` pages"""
+    rng = random.Random(seed)
+    objects: List[bytes] = []
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    catalog = add(b"")  # Filled in once the page tree id is known
+    page_tree = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for number in range(1, pages + 1):
+        ops = ["BT", "/F1 9 Tf", "11 TL", "50 780 Td"]
+        for line in page_lines(rng, number, pages, lines_per_page):
+            ops.append(f"({_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (page_tree, font, content)
+        ))
+
+    kids = b" ".join(b"%d 0 R" % pid for pid in page_ids)
+    objects[page_tree - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % page_tree
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, obj)
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog, xref
+    )
+    return bytes(out)
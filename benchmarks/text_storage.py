@@ -0,0 +1,105 @@
+"""
+Stored text and parent resolution: inline chunk text against offsets.
+
+Ingests synthetic documents under each chunk_text_storage mode and reports
+the bytes of text written (document plus chunks), the insert time, and how
+long retrieval takes to turn matched children into their parent sections:
+inline fetches the parents by id, offsets slices them out of the document
+text, fetched once (cold) and then from the worker cache (warm). The fake
+client's latency stands in for the PostgREST round trip.
+
+    python -m benchmarks.text_storage [--pages 20 200] [--latency 0.002]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from uuid import uuid4
+
+# harness sets placeholder settings, so it must come before any app import
+from . import harness
+from .fakes import InMemoryIndex
+from .synthetic_pdf import page_lines
+
+from app.config import get_settings
+from app.core.document_text import get_text_cache
+from app.services.retrieval import retriever
+
+
+def document_text(pages: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return "\n\n".join(
+        "\n".join(page_lines(rng, number, pages, 45)[1:-1]) for number in range(1, pages + 1)
+    )
+
+
+def stored_bytes(index: InMemoryIndex, document) -> int:
+    text = len((document.content or "").encode("utf-8"))
+    compressed = document.__dict__.get("content_compressed")
+    if compressed is not None:
+        text += len(compressed)
+    return text + sum(len(row["content"].encode("utf-8")) for row in index.by_id.values())
+
+
+async def run_mode(mode: str, pages: int, latency: float, repeat: int) -> dict:
+    get_settings().chunk_text_storage = mode
+    index = InMemoryIndex(dim=8)
+    client = harness.install_fake_supabase(index, latency=latency)
+    service = harness.make_document_service(index, harness.HashEmbeddingProvider(dim=8))
+    document = service.db.seed_document()
+
+    text = document_text(pages, seed=pages)
+    chunks = await service.chunk_content(text, {"filename": "bench.pdf"})
+    embeddings = await service.generate_embeddings(chunks)
+    start = time.perf_counter()
+    await service.insert_document_with_chunks(
+        title="bench.pdf", document_id=document.id, content=text, chunks=chunks, embeddings=embeddings,
+    )
+    insert_ms = (time.perf_counter() - start) * 1000
+
+    # Ten matched children from across the document, as hybrid_search returns them
+    children = index.rows[:: max(1, len(index.rows) // 10)][:10]
+    rows = [{**row, "similarity": 1.0, "score": 1.0} for row in children]
+
+    queries = []
+    table = client.table
+    client.table = lambda name: queries.append(name) or table(name)
+
+    async def resolve() -> float:
+        start = time.perf_counter()
+        parents = await retriever._expand_to_parents([dict(row) for row in rows], len(rows))
+        assert all(parent["content"] for parent in parents)
+        return (time.perf_counter() - start) * 1000
+
+    get_text_cache.cache_clear()
+    cold = await resolve()
+    queries.clear()
+    warm = min([await resolve() for _ in range(repeat)])
+    return {
+        "stored_text_bytes": stored_bytes(index, document),
+        "insert_ms": round(insert_ms, 2),
+        "resolve_cold_ms": round(cold, 3),
+        "resolve_warm_ms": round(warm, 3),
+        "queries_per_resolve_warm": len(queries) / repeat,
+        "rows": len(index.by_id),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="*", default=[20, 200])
+    parser.add_argument("--latency", type=float, default=0.002, help="Seconds per fake PostgREST call")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    report = {}
+    for pages in args.pages:
+        report[f"{pages}p"] = {
+            mode: await run_mode(mode, pages, args.latency, args.repeat) for mode in ("inline", "offsets")
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+import asyncio
+
+from alembic import context
+from sqlalchemy import pool, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.config import get_settings
+from app.models import Base
+
+config = context.config
+target_metadata = Base.metadata
+
+# Every worker runs migrations at startup; only one may apply them at a time
+MIGRATION_LOCK_ID = 0x7468656D69736F6E
+
+
+def run_migrations_offline() -> None:
+    context.configure(
+        url=get_settings().supabase_db_url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        # Held until the migrations commit or roll back, so a failed one
+        # never leaves an unlock to run in an aborted transaction
+        connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+        context.run_migrations()
+
+
+async def run_migrations_online() -> None:
+    # A throwaway engine: migrations must not hold connections from the app pool
+    engine = create_async_engine(get_settings().supabase_db_url, poolclass=pool.NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
@@ -0,0 +1,49 @@
+"""
+Shared pieces of the migrations that redefine hybrid_search.
+
+Each such migration defines the function it installs as HYBRID_SEARCH and,
+on downgrade, reinstalls the one in place at its down_revision, read from
+the migration that defined it with defined_by instead of kept as a copy.
+"""
+import glob
+import importlib.util
+import os
+
+VERSIONS_DIR = os.path.join(os.path.dirname(__file__), "versions")
+
+# Drops every overload; earlier versions were created by hand with other signatures
+DROP_HYBRID_SEARCH = """
+DO $$
+DECLARE fn regprocedure;
+BEGIN
+    FOR fn IN
+        SELECT oid::regprocedure FROM pg_proc
+        WHERE proname = 'hybrid_search' AND pronamespace = 'public'::regnamespace
+    LOOP
+        EXECUTE 'DROP FUNCTION ' || fn;
+    END LOOP;
+END $$
+"""
+
+
+def _load(revision: str):
+    paths = glob.glob(os.path.join(VERSIONS_DIR, f"{revision}_*.py"))
+    if len(paths) != 1:
+        raise LookupError(f"No single migration file for revision {revision}")
+    spec = importlib.util.spec_from_file_location(f"_hybrid_search_{revision}", paths[0])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def defined_by(revision: str) -> str:
+    """
+    The CREATE FUNCTION statement of hybrid_search as of `revision`: its
+    own HYBRID_SEARCH, or that of the nearest earlier revision defining one
+    """
+    module = _load(revision)
+    while not hasattr(module, "HYBRID_SEARCH"):
+        if module.down_revision is None:
+            raise LookupError(f"No migration up to {revision} defines hybrid_search")
+        module = _load(module.down_revision)
+    return module.HYBRID_SEARCH
@@ -0,0 +1,104 @@
+"""Initial schema
+
+Tables may already exist on databases set up before migrations were
+introduced, so each one is only created if missing.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import context, op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+from sqlalchemy.dialects import postgresql
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _create_if_missing(name, *columns, **kwargs) -> None:
+    if context.is_offline_mode() or not sa.inspect(op.get_bind()).has_table(name):
+        op.create_table(name, *columns, **kwargs)
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+
+    _create_if_missing(
+        "users",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("email", sa.String(255), unique=True),
+        sa.Column("password", postgresql.UUID(as_uuid=True)),
+        sa.Column("role", sa.Enum("ADMIN", "USER", name="userrole")),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    _create_if_missing(
+        "documents",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("original_filename", sa.String(255), nullable=False),
+        sa.Column("storage_url", sa.Text, nullable=False),
+        sa.Column("file_size", sa.Integer),
+        sa.Column("processing_status", sa.String(50)),
+        sa.Column("metadata", sa.JSON),
+        sa.Column("chunks", sa.JSON),
+        sa.Column("content", sa.Text),
+        sa.Column("total_pages", sa.Integer),
+        sa.Column("total_chunks", sa.Integer),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    _create_if_missing(
+        "document_chunks",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("document_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("documents.id"), nullable=False),
+        sa.Column("content", sa.Text, nullable=False),
+        sa.Column("chunk_index", sa.Integer, nullable=False),
+        sa.Column("metadata", sa.JSON),
+        sa.Column("embedding", Vector(1024)),
+        sa.Column("created_at", sa.DateTime),
+    )
+    _create_if_missing(
+        "chat_sessions",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("user_id", postgresql.UUID(as_uuid=True)),
+        sa.Column("title", sa.String(255)),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("updated_at", sa.DateTime),
+    )
+    _create_if_missing(
+        "chat_messages",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("session_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("chat_sessions.id")),
+        sa.Column("content", sa.Text),
+        sa.Column("role", sa.String(50)),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("document_chunk_ids", postgresql.ARRAY(sa.String)),
+    )
+    _create_if_missing(
+        "chat_document_links",
+        sa.Column("chat_session_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("chat_sessions.id"), primary_key=True),
+        sa.Column("document_id", postgresql.UUID(as_uuid=True), sa.ForeignKey("documents.id"), primary_key=True),
+        sa.Column("created_at", sa.DateTime),
+        sa.Column("usage_count", sa.Integer),
+        sa.Column("first_used_at", sa.DateTime),
+        sa.Column("last_used_at", sa.DateTime),
+    )
+    _create_if_missing(
+        "queries",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("query", sa.String),
+        sa.Column("created_at", sa.DateTime),
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_document_chunks_document_id "
+        "ON document_chunks (document_id, chunk_index)"
+    )
+
+
+def downgrade() -> None:
+    # Never drop tables that may predate migrations
+    op.execute("DROP INDEX IF EXISTS ix_document_chunks_document_id")
@@ -0,0 +1,35 @@
+"""Parent-child chunk hierarchy
+
+Child chunks point at the larger parent section they were cut from.
+Parent sections are stored in the same table without an embedding.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "document_chunks",
+        sa.Column(
+            "parent_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("document_chunks.id", ondelete="CASCADE"),
+            nullable=True,
+        ),
+    )
+    op.create_index("ix_document_chunks_parent_id", "document_chunks", ["parent_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_document_chunks_parent_id", table_name="document_chunks")
+    op.drop_column("document_chunks", "parent_id")
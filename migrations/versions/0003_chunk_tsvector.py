@@ -0,0 +1,117 @@
+"""Stored tsvector with a GIN index for the keyword leg of hybrid_search
+
+Adds a per-chunk text search configuration and a generated tsvector
+column, which Postgres fills for existing rows when the column is added
+and for new rows as they are inserted. hybrid_search is redefined to
+match against that column with websearch_to_tsquery, so the keyword leg
+is a GIN index lookup instead of to_tsvector over every row per query.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from migrations.hybrid_search import DROP_HYBRID_SEARCH
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+HYBRID_SEARCH = """
+CREATE FUNCTION hybrid_search(
+    query_text text,
+    query_embedding vector(1024),
+    match_count int,
+    text_search_config regconfig DEFAULT 'english',
+    full_text_weight float DEFAULT 1,
+    semantic_weight float DEFAULT 1,
+    rrf_k int DEFAULT 50
+)
+RETURNS TABLE (
+    id uuid,
+    document_id uuid,
+    content text,
+    chunk_index int,
+    metadata json,
+    similarity float,
+    score float
+)
+LANGUAGE sql STABLE
+AS $$
+WITH full_text AS (
+    SELECT c.id,
+           row_number() OVER (
+               ORDER BY ts_rank_cd(c.content_tsv, websearch_to_tsquery(text_search_config, query_text)) DESC
+           ) AS rank_ix
+    FROM document_chunks c
+    WHERE c.content_tsv @@ websearch_to_tsquery(text_search_config, query_text)
+    ORDER BY rank_ix
+    LIMIT match_count * 2
+),
+semantic AS (
+    SELECT c.id,
+           row_number() OVER (ORDER BY c.embedding <=> query_embedding) AS rank_ix
+    FROM document_chunks c
+    WHERE c.embedding IS NOT NULL
+    ORDER BY rank_ix
+    LIMIT match_count * 2
+)
+SELECT c.id,
+       c.document_id,
+       c.content,
+       c.chunk_index,
+       c.metadata,
+       1 - (c.embedding <=> query_embedding) AS similarity,
+       coalesce(1.0 / (rrf_k + full_text.rank_ix), 0.0) * full_text_weight
+         + coalesce(1.0 / (rrf_k + semantic.rank_ix), 0.0) * semantic_weight AS score
+FROM full_text
+FULL OUTER JOIN semantic ON full_text.id = semantic.id
+JOIN document_chunks c ON c.id = coalesce(full_text.id, semantic.id)
+ORDER BY score DESC
+LIMIT match_count
+$$
+"""
+
+
+def upgrade() -> None:
+    op.add_column(
+        "document_chunks",
+        sa.Column(
+            "search_config",
+            postgresql.REGCONFIG,
+            nullable=False,
+            server_default=sa.text("'english'::regconfig"),
+        ),
+    )
+    op.add_column(
+        "document_chunks",
+        sa.Column(
+            "content_tsv",
+            postgresql.TSVECTOR,
+            sa.Computed(
+                "CASE WHEN embedding IS NULL THEN NULL ELSE to_tsvector(search_config, content) END",
+                persisted=True,
+            ),
+        ),
+    )
+    op.create_index(
+        "ix_document_chunks_content_tsv",
+        "document_chunks",
+        ["content_tsv"],
+        postgresql_using="gin",
+    )
+    op.execute(DROP_HYBRID_SEARCH)
+    op.execute(HYBRID_SEARCH)
+
+
+def downgrade() -> None:
+    # The hand-written hybrid_search this replaced is not recoverable; the
+    # function is dropped and must be recreated alongside the older schema
+    op.execute(DROP_HYBRID_SEARCH)
+    op.drop_index("ix_document_chunks_content_tsv", table_name="document_chunks")
+    op.drop_column("document_chunks", "content_tsv")
+    op.drop_column("document_chunks", "search_config")
@@ -0,0 +1,108 @@
+"""Reduced-dimension embeddings for two-stage vector search
+
+Adds embedding_reduced, filled by app.cli.fit_projection and at insert
+time once a projection exists. hybrid_search gains two optional
+arguments: given query_embedding_reduced, its vector leg takes the
+rescore_count nearest chunks by reduced vector and ranks only those by
+the full embedding. Without it the search is unchanged.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+from migrations.hybrid_search import DROP_HYBRID_SEARCH, defined_by
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+HYBRID_SEARCH = """
+CREATE FUNCTION hybrid_search(
+    query_text text,
+    query_embedding vector(1024),
+    match_count int,
+    text_search_config regconfig DEFAULT 'english',
+    full_text_weight float DEFAULT 1,
+    semantic_weight float DEFAULT 1,
+    rrf_k int DEFAULT 50,
+    query_embedding_reduced vector DEFAULT NULL,
+    rescore_count int DEFAULT 200
+)
+RETURNS TABLE (
+    id uuid,
+    document_id uuid,
+    content text,
+    chunk_index int,
+    metadata json,
+    similarity float,
+    score float
+)
+LANGUAGE sql STABLE
+AS $$
+WITH full_text AS (
+    SELECT c.id,
+           row_number() OVER (
+               ORDER BY ts_rank_cd(c.content_tsv, websearch_to_tsquery(text_search_config, query_text)) DESC
+           ) AS rank_ix
+    FROM document_chunks c
+    WHERE c.content_tsv @@ websearch_to_tsquery(text_search_config, query_text)
+    ORDER BY rank_ix
+    LIMIT match_count * 2
+),
+-- Two-stage mode: nearest neighbours by the reduced vector only
+reduced_candidates AS (
+    SELECT c.id, c.embedding
+    FROM document_chunks c
+    WHERE query_embedding_reduced IS NOT NULL
+      AND c.embedding_reduced IS NOT NULL
+    ORDER BY c.embedding_reduced <=> query_embedding_reduced
+    LIMIT rescore_count
+),
+candidates AS (
+    SELECT id, embedding FROM reduced_candidates
+    UNION ALL
+    SELECT c.id, c.embedding
+    FROM document_chunks c
+    WHERE query_embedding_reduced IS NULL
+      AND c.embedding IS NOT NULL
+),
+-- Ranked at full dimension either way
+semantic AS (
+    SELECT candidates.id,
+           row_number() OVER (ORDER BY candidates.embedding <=> query_embedding) AS rank_ix
+    FROM candidates
+    ORDER BY rank_ix
+    LIMIT match_count * 2
+)
+SELECT c.id,
+       c.document_id,
+       c.content,
+       c.chunk_index,
+       c.metadata,
+       1 - (c.embedding <=> query_embedding) AS similarity,
+       coalesce(1.0 / (rrf_k + full_text.rank_ix), 0.0) * full_text_weight
+         + coalesce(1.0 / (rrf_k + semantic.rank_ix), 0.0) * semantic_weight AS score
+FROM full_text
+FULL OUTER JOIN semantic ON full_text.id = semantic.id
+JOIN document_chunks c ON c.id = coalesce(full_text.id, semantic.id)
+ORDER BY score DESC
+LIMIT match_count
+$$
+"""
+
+
+def upgrade() -> None:
+    op.add_column("document_chunks", sa.Column("embedding_reduced", Vector()))
+    op.execute(DROP_HYBRID_SEARCH)
+    op.execute(HYBRID_SEARCH)
+
+
+def downgrade() -> None:
+    op.execute(DROP_HYBRID_SEARCH)
+    op.execute(defined_by(down_revision))
+    op.drop_column("document_chunks", "embedding_reduced")
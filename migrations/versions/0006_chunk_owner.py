@@ -0,0 +1,138 @@
+"""Carry the document owner down to chunks and scope hybrid_search by it
+
+Adds document_chunks.owner_id, set from documents.user_id at insert time;
+existing rows are backfilled in batches by app.cli.partition_chunks rather
+than in this migration, so it stays a metadata-only change. The same tool
+moves document_chunks to a table hash-partitioned on owner_id.
+
+hybrid_search gains filter_owner. Given one, every scan of document_chunks
+carries owner_id = filter_owner, which a partitioned table prunes to the
+owner's partition; the two variants are separate statements so each is
+planned with its own predicate. The full-dimension vector leg now takes
+its candidates with ORDER BY distance LIMIT, so an HNSW index on
+embedding can serve it.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from migrations.hybrid_search import DROP_HYBRID_SEARCH, defined_by
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+SEARCH_QUERY = """
+    WITH full_text AS (
+        SELECT c.id,
+               row_number() OVER (
+                   ORDER BY ts_rank_cd(c.content_tsv, websearch_to_tsquery(text_search_config, query_text)) DESC
+               ) AS rank_ix
+        FROM document_chunks c
+        WHERE c.content_tsv @@ websearch_to_tsquery(text_search_config, query_text){owner}
+        ORDER BY rank_ix
+        LIMIT match_count * 2
+    ),
+    -- Two-stage mode: nearest neighbours by the reduced vector only
+    reduced_candidates AS (
+        SELECT c.id, c.embedding
+        FROM document_chunks c
+        WHERE query_embedding_reduced IS NOT NULL
+          AND c.embedding_reduced IS NOT NULL{owner}
+        ORDER BY c.embedding_reduced <=> query_embedding_reduced
+        LIMIT rescore_count
+    ),
+    full_candidates AS (
+        SELECT c.id, c.embedding
+        FROM document_chunks c
+        WHERE query_embedding_reduced IS NULL
+          AND c.embedding IS NOT NULL{owner}
+        ORDER BY c.embedding <=> query_embedding
+        LIMIT match_count * 2
+    ),
+    candidates AS (
+        SELECT r.id, r.embedding FROM reduced_candidates r
+        UNION ALL
+        SELECT f.id, f.embedding FROM full_candidates f
+    ),
+    -- Ranked at full dimension either way
+    semantic AS (
+        SELECT candidates.id,
+               row_number() OVER (ORDER BY candidates.embedding <=> query_embedding) AS rank_ix
+        FROM candidates
+        ORDER BY rank_ix
+        LIMIT match_count * 2
+    )
+    SELECT c.id,
+           c.document_id,
+           c.content,
+           c.chunk_index,
+           c.metadata,
+           1 - (c.embedding <=> query_embedding) AS similarity,
+           coalesce(1.0 / (rrf_k + full_text.rank_ix), 0.0) * full_text_weight
+             + coalesce(1.0 / (rrf_k + semantic.rank_ix), 0.0) * semantic_weight AS score,
+           CASE WHEN include_embedding THEN c.embedding END AS embedding
+    FROM full_text
+    FULL OUTER JOIN semantic ON full_text.id = semantic.id
+    JOIN document_chunks c ON c.id = coalesce(full_text.id, semantic.id){owner}
+    ORDER BY score DESC
+    LIMIT match_count"""
+
+HYBRID_SEARCH = """
+CREATE FUNCTION hybrid_search(
+    query_text text,
+    query_embedding vector(1024),
+    match_count int,
+    text_search_config regconfig DEFAULT 'english',
+    full_text_weight float DEFAULT 1,
+    semantic_weight float DEFAULT 1,
+    rrf_k int DEFAULT 50,
+    query_embedding_reduced vector DEFAULT NULL,
+    rescore_count int DEFAULT 200,
+    include_embedding boolean DEFAULT false,
+    filter_owner uuid DEFAULT NULL
+)
+RETURNS TABLE (
+    id uuid,
+    document_id uuid,
+    content text,
+    chunk_index int,
+    metadata json,
+    similarity float,
+    score float,
+    embedding vector
+)
+LANGUAGE plpgsql STABLE
+AS $$
+#variable_conflict use_column
+BEGIN
+    IF filter_owner IS NULL THEN
+        RETURN QUERY{all_owners};
+    ELSE
+        RETURN QUERY{one_owner};
+    END IF;
+END
+$$
+""".format(
+    all_owners=SEARCH_QUERY.format(owner=""),
+    one_owner=SEARCH_QUERY.format(owner="\n          AND c.owner_id = filter_owner"),
+)
+
+
+def upgrade() -> None:
+    op.add_column("document_chunks", sa.Column("owner_id", postgresql.UUID(as_uuid=True), nullable=True))
+    op.create_index("ix_document_chunks_owner_id", "document_chunks", ["owner_id"])
+    op.execute(DROP_HYBRID_SEARCH)
+    op.execute(HYBRID_SEARCH)
+
+
+def downgrade() -> None:
+    op.execute(DROP_HYBRID_SEARCH)
+    op.execute(defined_by(down_revision))
+    op.drop_index("ix_document_chunks_owner_id", table_name="document_chunks")
+    op.drop_column("document_chunks", "owner_id")
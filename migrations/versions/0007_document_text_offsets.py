@@ -0,0 +1,25 @@
+"""Compressed document text for offset-referenced chunks
+
+Adds documents.content_compressed: the preprocessed text stored once,
+zlib-compressed, when chunk_text_storage is "offsets". Parent sections
+then keep only their span into it and an empty content.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("documents", sa.Column("content_compressed", sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("documents", "content_compressed")
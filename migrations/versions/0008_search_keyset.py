@@ -0,0 +1,139 @@
+"""Keyset pagination for hybrid_search
+
+hybrid_search gains candidate_count, after_score and after_id so
+retrieve-only results can be paged with a cursor. candidate_count fixes the
+size of each search leg independently of the page size, so every page is
+cut from the same ranking; both legs and the final order break ties on the
+chunk id, so that ranking is the same on every call. Given after_score and
+after_id, only rows ranked after that (score, id) are returned. Without the
+new arguments the function behaves as before.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+from migrations.hybrid_search import DROP_HYBRID_SEARCH, defined_by
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+SEARCH_QUERY = """
+    WITH full_text AS (
+        SELECT c.id,
+               row_number() OVER (
+                   ORDER BY ts_rank_cd(c.content_tsv, websearch_to_tsquery(text_search_config, query_text)) DESC, c.id
+               ) AS rank_ix
+        FROM document_chunks c
+        WHERE c.content_tsv @@ websearch_to_tsquery(text_search_config, query_text){owner}
+        ORDER BY rank_ix
+        LIMIT coalesce(candidate_count, match_count * 2)
+    ),
+    -- Two-stage mode: nearest neighbours by the reduced vector only
+    reduced_candidates AS (
+        SELECT c.id, c.embedding
+        FROM document_chunks c
+        WHERE query_embedding_reduced IS NOT NULL
+          AND c.embedding_reduced IS NOT NULL{owner}
+        ORDER BY c.embedding_reduced <=> query_embedding_reduced
+        LIMIT rescore_count
+    ),
+    full_candidates AS (
+        SELECT c.id, c.embedding
+        FROM document_chunks c
+        WHERE query_embedding_reduced IS NULL
+          AND c.embedding IS NOT NULL{owner}
+        ORDER BY c.embedding <=> query_embedding
+        LIMIT coalesce(candidate_count, match_count * 2)
+    ),
+    candidates AS (
+        SELECT r.id, r.embedding FROM reduced_candidates r
+        UNION ALL
+        SELECT f.id, f.embedding FROM full_candidates f
+    ),
+    -- Ranked at full dimension either way
+    semantic AS (
+        SELECT candidates.id,
+               row_number() OVER (ORDER BY candidates.embedding <=> query_embedding, candidates.id) AS rank_ix
+        FROM candidates
+        ORDER BY rank_ix
+        LIMIT coalesce(candidate_count, match_count * 2)
+    ),
+    ranked AS (
+        SELECT c.id,
+               c.document_id,
+               c.content,
+               c.chunk_index,
+               c.metadata,
+               1 - (c.embedding <=> query_embedding) AS similarity,
+               coalesce(1.0 / (rrf_k + full_text.rank_ix), 0.0) * full_text_weight
+                 + coalesce(1.0 / (rrf_k + semantic.rank_ix), 0.0) * semantic_weight AS score,
+               CASE WHEN include_embedding THEN c.embedding END AS embedding
+        FROM full_text
+        FULL OUTER JOIN semantic ON full_text.id = semantic.id
+        JOIN document_chunks c ON c.id = coalesce(full_text.id, semantic.id){owner}
+    )
+    SELECT ranked.id, ranked.document_id, ranked.content, ranked.chunk_index, ranked.metadata,
+           ranked.similarity, ranked.score, ranked.embedding
+    FROM ranked
+    -- Keyset: the page after the last (score, id) the caller received
+    WHERE after_score IS NULL
+       OR (ranked.score, ranked.id) < (after_score, after_id)
+    ORDER BY ranked.score DESC, ranked.id DESC
+    LIMIT match_count"""
+
+HYBRID_SEARCH = """
+CREATE FUNCTION hybrid_search(
+    query_text text,
+    query_embedding vector(1024),
+    match_count int,
+    text_search_config regconfig DEFAULT 'english',
+    full_text_weight float DEFAULT 1,
+    semantic_weight float DEFAULT 1,
+    rrf_k int DEFAULT 50,
+    query_embedding_reduced vector DEFAULT NULL,
+    rescore_count int DEFAULT 200,
+    include_embedding boolean DEFAULT false,
+    filter_owner uuid DEFAULT NULL,
+    candidate_count int DEFAULT NULL,
+    after_score float DEFAULT NULL,
+    after_id uuid DEFAULT NULL
+)
+RETURNS TABLE (
+    id uuid,
+    document_id uuid,
+    content text,
+    chunk_index int,
+    metadata json,
+    similarity float,
+    score float,
+    embedding vector
+)
+LANGUAGE plpgsql STABLE
+AS $$
+#variable_conflict use_column
+BEGIN
+    IF filter_owner IS NULL THEN
+        RETURN QUERY{all_owners};
+    ELSE
+        RETURN QUERY{one_owner};
+    END IF;
+END
+$$
+""".format(
+    all_owners=SEARCH_QUERY.format(owner=""),
+    one_owner=SEARCH_QUERY.format(owner="\n          AND c.owner_id = filter_owner"),
+)
+
+
+def upgrade() -> None:
+    op.execute(DROP_HYBRID_SEARCH)
+    op.execute(HYBRID_SEARCH)
+
+
+def downgrade() -> None:
+    op.execute(DROP_HYBRID_SEARCH)
+    op.execute(defined_by(down_revision))
@@ -0,0 +1,24 @@
+"""
+Startup budget of the API workers, as gated by python -m benchmarks.import_time:
+importing app.main stays under the budget and leaves every heavy dependency
+to first use. Both run in fresh interpreters.
+
+    python -m pytest tests
+"""
+import statistics
+
+from benchmarks.import_time import BUDGET_SECONDS, LAZY, import_profile, timed_import
+
+
+def test_import_leaves_heavy_dependencies_lazy():
+    # Every module `python -X importtime -c "import app.main"` reports
+    imported = {name.split(".")[0] for name, _, _ in import_profile()}
+    assert sorted(imported & set(LAZY)) == []
+
+
+def test_import_within_budget():
+    timed_import()  # Writes bytecode; not counted
+    runs = [timed_import() for _ in range(3)]
+    assert all(not run["lazy"] for run in runs)
+    seconds = statistics.median(run["seconds"] for run in runs)
+    assert seconds <= BUDGET_SECONDS, f"import app.main took {seconds:.3f}s (budget {BUDGET_SECONDS:.3f}s)"
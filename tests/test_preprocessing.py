@@ -0,0 +1,41 @@
+"""
+Repeated header and footer removal in preprocess_pages: running lines and
+page numbers go, body text on short pages stays.
+
+    python -m pytest tests
+"""
+from app.services.indexing.utils.preprocessing import PreprocessStats, line_signature, preprocess_pages
+
+
+def test_page_numbers_match_but_numbered_body_lines_do_not():
+    assert line_signature("Page 3 of 10") == line_signature("page 4 of 10")
+    assert line_signature(" 12 ") == line_signature("13")
+    assert line_signature("Section 1") != line_signature("Section 2")
+
+
+def test_short_pages_keep_their_body():
+    pages = [f"Section {n}\nItem {n}.\nShort body line {n}.\n{n}" for n in range(1, 8)]
+    stats = PreprocessStats()
+    text = preprocess_pages(pages, stats=stats)
+    for n in range(1, 8):
+        assert f"Section {n}" in text
+        assert f"Item {n}." in text
+        assert f"Short body line {n}." in text
+    # Only the bare page numbers went
+    assert stats.lines_removed == 7
+
+
+def test_running_header_and_footer_removed():
+    pages = [
+        f"ACME Annual Report\nChapter text {n} goes here.\nMore text {n}.\nConfidential - Page {n} of 5"
+        for n in range(1, 6)
+    ]
+    text = preprocess_pages(pages)
+    assert "ACME Annual Report" not in text
+    assert "Confidential" not in text
+    assert "Chapter text 3 goes here." in text
+
+
+def test_page_is_never_emptied():
+    pages = ["Same line\nSame line\nSame line"] * 5
+    assert preprocess_pages(pages)
@@ -0,0 +1,58 @@
+"""
+Stream sharing in BroadcastFlight: a stream runs while anyone is reading
+it and is cancelled once every subscriber has left.
+
+    python -m pytest tests
+"""
+import asyncio
+
+from app.core.singleflight import BroadcastFlight
+
+
+class Source:
+    def __init__(self):
+        self.produced = 0
+        self.closed = False
+
+    async def stream(self):
+        try:
+            while True:
+                self.produced += 1
+                yield self.produced
+                await asyncio.sleep(0.01)
+        finally:
+            self.closed = True
+
+
+def test_stream_cancelled_when_every_subscriber_leaves():
+    async def run():
+        flight = BroadcastFlight("test")
+        sources = []
+
+        async def open_stream():
+            sources.append(Source())
+            return sources[-1].stream()
+
+        first = await flight.subscribe("q", open_stream)
+        second = await flight.subscribe("q", open_stream)
+        assert len(sources) == 1
+        assert [await first.__anext__() for _ in range(3)] == [1, 2, 3]
+        await first.aclose()
+        # One subscriber is still reading
+        assert await second.__anext__() == 1
+        await asyncio.sleep(0.05)
+        assert not sources[0].closed
+        await second.aclose()
+        await asyncio.sleep(0.05)
+        assert sources[0].closed
+        produced = sources[0].produced
+        await asyncio.sleep(0.05)
+        assert sources[0].produced == produced
+
+        # The next caller gets a stream of its own
+        third = await flight.subscribe("q", open_stream)
+        assert len(sources) == 2
+        assert await third.__anext__() == 1
+        await third.aclose()
+
+    asyncio.run(run())